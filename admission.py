@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Contrôle d'admission des analyses
+Nombre borné d'analyses simultanées, courte file d'attente, et refus
+rapide avec Retry-After quand le serveur est saturé
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from upstream_scheduler import Deadline
+
+
+class OverloadedError(Exception):
+    """Requête refusée par le contrôle d'admission"""
+
+    def __init__(self, message: str, status: int, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 8, queue_timeout: float = 5):
+        """
+        Initialise le contrôle d'admission
+
+        Args:
+            max_concurrent: Nombre d'analyses exécutées simultanément
+            max_queue: Nombre de requêtes en attente au-delà (refus 429 ensuite)
+            queue_timeout: Attente maximale en file (refus 503 ensuite)
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._average_duration = None
+
+    @contextmanager
+    def admit(self, deadline: Optional[Deadline] = None):
+        """
+        Réserve une place d'exécution pour la durée du bloc
+
+        Args:
+            deadline: Échéance de la requête (borne aussi l'attente en file)
+
+        Raises:
+            OverloadedError: File pleine (429) ou attente trop longue (503)
+        """
+        self._enter(deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._leave(time.monotonic() - start)
+
+    def _enter(self, deadline: Optional[Deadline]):
+        with self._condition:
+            if self.active < self.max_concurrent and self.waiting == 0:
+                self.active += 1
+                self.admitted += 1
+                return
+
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise OverloadedError("Trop de requêtes en attente", 429, self._retry_after())
+
+            timeout = self.queue_timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline.remaining())
+            end = time.monotonic() + timeout
+            self.waiting += 1
+            try:
+                while self.active >= self.max_concurrent:
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        raise OverloadedError("Serveur saturé", 503, self._retry_after())
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+
+    def _leave(self, duration: float):
+        with self._condition:
+            self.active -= 1
+            # Moyenne glissante des durées, pour estimer Retry-After
+            if self._average_duration is None:
+                self._average_duration = duration
+            else:
+                self._average_duration = 0.8 * self._average_duration + 0.2 * duration
+            self._condition.notify()
+
+    def _retry_after(self) -> int:
+        """Délai estimé avant qu'une place se libère (secondes)"""
+        average = self._average_duration or 1.0
+        return max(1, math.ceil(average * (self.waiting + 1) / self.max_concurrent))
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'average_duration_seconds': round(self._average_duration or 0, 2)
+            }
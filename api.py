@@ -4,12 +4,27 @@ API Backend pour l'analyse de population et foyers
 Version optimisée pour le déploiement sur Fly.io
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
+from shapely import wkb
+from shapely.geometry import shape
 import os
+import hmac
+import json
 import logging
-from population_analyzer import PopulationAnalyzer
+import queue
+import threading
+from population_analyzer import PopulationAnalyzer, ANALYSIS_STAGES
 from household_estimator import HouseholdEstimator
+from tile_pyramid import TilePyramid, PyramidNotReadyError, TILE_FORMATS
+from response_cache import ResponseCache, analysis_cache_key
+from admission import AdmissionController, OverloadedError
+from jobs import JobManager, JobError
+from cell_export import stream_cell_batches, PYARROW_AVAILABLE, ARROW_STREAM_MIMETYPE
+from upstream_scheduler import Deadline, UpstreamUnavailableError
+from config import (
+    DATA_CONFIG, TILES_CONFIG, LIMITS_CONFIG, CACHE_CONFIG, ADMISSION_CONFIG, JOBS_CONFIG, ROUTER_CONFIG
+)
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -25,19 +40,164 @@ API_KEY = os.getenv('OPENROUTE_API_KEY', 'eyJvcmciOiI1YjNjZTM1OTc4NTExMTAwMDFjZj
 
 # Variables globales pour l'analyseur
 analyzer = None
+tile_pyramid = None
+
+# Cache des réponses d'analyse (disponible avant l'initialisation de l'analyseur)
+response_cache = ResponseCache(
+    max_entries=CACHE_CONFIG['memory_entries'],
+    disk_dir=CACHE_CONFIG['disk_dir'],
+    ttl_seconds=CACHE_CONFIG['ttl_seconds'],
+    max_disk_entries=CACHE_CONFIG['max_disk_entries']
+)
+
+# Contrôle d'admission des analyses (concurrence bornée, courte file d'attente)
+admission = AdmissionController(
+    max_concurrent=ADMISSION_CONFIG['max_concurrent'],
+    max_queue=ADMISSION_CONFIG['max_queue'],
+    queue_timeout=ADMISSION_CONFIG['queue_timeout_seconds']
+)
+
+# Analyses asynchrones (pool borné, résultats conservés JOBS_TTL secondes, JOBS_MAX_FINISHED au plus)
+job_manager = JobManager(
+    ANALYSIS_STAGES,
+    max_workers=JOBS_CONFIG['max_workers'],
+    max_pending=JOBS_CONFIG['max_pending'],
+    ttl_seconds=JOBS_CONFIG['ttl_seconds'],
+    max_finished=JOBS_CONFIG['max_finished']
+)
 
 def init_analyzer():
     """Initialise l'analyseur de population"""
-    global analyzer
+    global analyzer, tile_pyramid
     try:
         logger.info("🚀 Initialisation de l'analyseur de population...")
         analyzer = PopulationAnalyzer(SHAPEFILE_PATH, RASTER_PATH, API_KEY)
         logger.info("✅ Analyseur initialisé avec succès")
+
+        # Pyramide de tuiles construite en arrière-plan à partir du raster de l'analyseur
+        pyramid = TilePyramid(
+            analyzer.raster,
+            levels=TILES_CONFIG['pyramid_levels'],
+            cache_size=TILES_CONFIG['cache_size'],
+            dataset_version=DATA_CONFIG['dataset_version']
+        )
+        pyramid.build_async()
+        tile_pyramid = pyramid
+        logger.info("✅ Pyramide de tuiles en construction en arrière-plan")
         return True
     except Exception as e:
         logger.error(f"❌ Erreur initialisation: {e}")
         return False
 
+def validate_analysis_params(time_minutes, profile):
+    """Valide la durée et le profil d'une analyse (message d'erreur ou None)"""
+    if not isinstance(time_minutes, int) or time_minutes < 1 or time_minutes > 60:
+        return 'Temps doit être un entier entre 1 et 60 minutes'
+    
+    valid_profiles = ['driving-car', 'cycling-regular', 'foot-walking']
+    if profile not in valid_profiles:
+        return f'Profile invalide. Utilisez: {valid_profiles}'
+    return None
+
+def validate_dataset(dataset):
+    """Valide le jeu de données demandé (message d'erreur ou None)"""
+    if not isinstance(dataset, str) or not dataset:
+        return 'Jeu de données invalide'
+    if analyzer is not None and dataset not in analyzer.available_datasets():
+        return f'Jeu de données inconnu. Utilisez: {analyzer.available_datasets()}'
+    return None
+
+def dataset_version(dataset):
+    """Version des données d'un jeu de données (clés du cache des réponses)"""
+    return analyzer.dataset_version(dataset) if analyzer is not None else dataset
+
+def analysis_request_data():
+    """Corps JSON (POST) ou paramètres de requête (GET) d'une analyse"""
+    if request.method != 'GET':
+        return request.get_json()
+    data = request.args.to_dict()
+    if 'time_minutes' in data:
+        try:
+            data['time_minutes'] = int(data['time_minutes'])
+        except ValueError:
+            data['time_minutes'] = None  # Rejeté par validate_analysis_params
+    return data
+
+def parse_analysis_request(data):
+    """
+    Paramètres d'une analyse (adresse, temps, profil, jeu de données)
+    
+    Returns:
+        tuple: (paramètres, None) ou (None, message d'erreur)
+    """
+    if not data:
+        return None, 'Données JSON requises'
+    
+    address = data.get('address', '').strip()
+    time_minutes = data.get('time_minutes', 10)
+    profile = data.get('profile', 'driving-car')
+    dataset = data.get('dataset', DATA_CONFIG['dataset_version'])
+    
+    if not address:
+        return None, 'Adresse requise'
+    
+    params_error = validate_analysis_params(time_minutes, profile) or validate_dataset(dataset)
+    if params_error:
+        return None, params_error
+    return (address, time_minutes, profile, dataset), None
+
+def is_router_request():
+    """Vrai si la requête porte le secret partagé ROUTER_TOKEN (X-Router-Token)"""
+    token = ROUTER_CONFIG['token']
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Router-Token', ''), token)
+
+def router_coordinates():
+    """
+    Coordonnées (lon, lat) déjà géocodées par le routeur multi-nœuds
+    
+    L'en-tête X-Resolved-Coordinates n'est pris en compte qu'accompagné du
+    secret partagé ROUTER_TOKEN (X-Router-Token); sinon l'adresse est géocodée.
+    """
+    resolved = request.headers.get('X-Resolved-Coordinates')
+    if not resolved or not is_router_request():
+        return None
+    try:
+        lon, lat = map(float, resolved.split(','))
+    except ValueError:
+        return None
+    if validate_coordinates(lat, lon):
+        return None
+    return lon, lat
+
+def request_deadline():
+    """
+    Échéance de bout en bout de la requête
+    
+    Budget par défaut REQUEST_BUDGET, que le client peut réduire avec
+    l'en-tête X-Request-Timeout (secondes).
+    """
+    budget = ADMISSION_CONFIG['request_budget_seconds']
+    try:
+        requested = float(request.headers.get('X-Request-Timeout', budget))
+        if requested > 0:
+            budget = min(budget, requested)
+    except ValueError:
+        pass
+    return Deadline(budget)
+
+def overloaded_response(error):
+    """Refus du contrôle d'admission (429 ou 503 + Retry-After)"""
+    logger.warning(f"⚠️ Requête refusée ({error.status}): {error}")
+    return jsonify({'error': f'{error}, réessayez plus tard'}), error.status, {'Retry-After': str(error.retry_after)}
+
+def analysis_error_response(results):
+    """Réponse d'erreur d'une analyse (503 + Retry-After si service saturé)"""
+    status = results.get('status', 400)
+    headers = {}
+    if results.get('retry_after'):
+        headers['Retry-After'] = str(int(results['retry_after']) + 1)
+    return jsonify({'error': results['error']}), status, headers
+
 @app.route('/')
 def home():
     """Page d'accueil de l'API"""
@@ -46,8 +206,18 @@ def home():
         'version': '1.0.0',
         'endpoints': {
             'POST /analyze': 'Analyser une zone (adresse + temps)',
+            'GET /analyze': 'Analyse cacheable (address, time_minutes, profile en paramètres)',
+            'GET|POST /analyze/stream': 'Analyse progressive, un événement par étape (format=sse|ndjson)',
             'GET /health': 'Vérification de santé',
-            'GET /stats': 'Statistiques de l\'API'
+            'GET /stats': 'Statistiques de l\'API',
+            'GET /datasets': 'Jeux de données de population disponibles',
+            'GET /tiles/{z}/{x}/{y}': 'Tuile de densité de population (format=png|bin)',
+            'POST /catchments/overlap': 'Recouvrement des zones de plusieurs sites',
+            'POST /population/point': 'Analyser une zone à partir de coordonnées (lat, lon + temps)',
+            'POST /population/polygon': 'Population et foyers de zones fournies (GeoJSON ou WKB)',
+            'POST /jobs': 'Analyse asynchrone (même corps que /analyze)',
+            'GET /jobs/{id}': 'État, progression et résultat d\'une analyse asynchrone',
+            'GET /geocode': 'Géocodage d\'une adresse (réservé au routeur multi-nœuds)'
         },
         'usage': {
             'method': 'POST',
@@ -55,7 +225,8 @@ def home():
             'body': {
                 'address': 'string (ex: "Paris, France")',
                 'time_minutes': 'integer (1-60)',
-                'profile': 'string (driving-car, cycling-regular, foot-walking)'
+                'profile': 'string (driving-car, cycling-regular, foot-walking)',
+                'dataset': 'string (optionnel, voir /datasets)'
             }
         }
     })
@@ -77,95 +248,771 @@ def stats():
         return jsonify({'error': 'Analyseur non initialisé'}), 503
     
     return jsonify({
-        'total_cells': len(analyzer.gdf),
+        'total_cells': analyzer.total_cells,
+        'shards': analyzer.shards.stats() if analyzer.shards else None,
+        'routing': analyzer.router.stats() if analyzer.router else {'backend': 'ors'},
         'raster_size': f"{analyzer.raster.width}x{analyzer.raster.height}",
         'household_estimator_available': analyzer.household_estimator is not None,
-        'supported_countries': len(analyzer.household_estimator.household_ratios) if analyzer.household_estimator else 0
+        'supported_countries': len(analyzer.household_estimator.household_ratios) if analyzer.household_estimator else 0,
+        'tiles': tile_pyramid.stats() if tile_pyramid else None,
+        'upstreams': analyzer.scheduler.stats(),
+        'response_cache': response_cache.stats(),
+        'admission': admission.stats(),
+        'jobs': job_manager.stats(),
+        'node': {'node_id': ROUTER_CONFIG['node_id'] or None, 'nodes': len(ROUTER_CONFIG['nodes'])},
+        'datasets': {name: dataset.stats() for name, dataset in analyzer.datasets.items()},
+        'coalescing': {
+            'analyzer': analyzer.flights.stats(),
+            'overpass': analyzer.household_estimator.flights.stats() if analyzer.household_estimator else None
+        }
     })
 
-@app.route('/analyze', methods=['POST'])
+@app.route('/tiles/<int:z>/<int:x>/<int:y>')
+def tiles(z, x, y):
+    """
+    Tuile XYZ (Web Mercator) de densité de population
+    
+    Query:
+        format: 'png' (défaut) ou 'bin' (grille 256x256 float32 little-endian, hab/km²)
+    """
+    if tile_pyramid is None:
+        return jsonify({'error': 'Pyramide de tuiles non initialisée'}), 503
+    
+    fmt = request.args.get('format', 'png')
+    if fmt not in TILE_FORMATS:
+        return jsonify({'error': f'Format invalide. Utilisez: {list(TILE_FORMATS)}'}), 400
+    
+    if not TilePyramid.is_valid_tile(z, x, y, TILES_CONFIG['max_zoom']):
+        return jsonify({'error': f'Tuile invalide (zoom max: {TILES_CONFIG["max_zoom"]})'}), 400
+    
+    try:
+        data, etag = tile_pyramid.get_tile(z, x, y, fmt)
+    except PyramidNotReadyError:
+        return jsonify({'error': 'Pyramide de tuiles en construction, réessayez plus tard'}), 503, {'Retry-After': '10'}
+    except Exception as e:
+        logger.error(f"❌ Erreur tuile {z}/{x}/{y}: {e}")
+        return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
+    
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f"public, max-age={TILES_CONFIG['max_age_seconds']}"
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    
+    return Response(data, mimetype=TILE_FORMATS[fmt], headers=headers)
+
+@app.route('/datasets')
+def datasets():
+    """Jeux de données de population sélectionnables par requête"""
+    if analyzer is None:
+        return jsonify({'error': 'Analyseur non initialisé'}), 503
+    
+    available = [{
+        'name': analyzer.default_dataset,
+        'resolution_m': analyzer.cell_resolution,
+        'default': True
+    }]
+    for name in sorted(analyzer.datasets):
+        dataset = analyzer.datasets[name]
+        available.append({
+            'name': name,
+            'version': dataset.version,
+            'resolution_m': dataset.resolution,
+            'total_cells': dataset.manifest['total_cells'],
+            'default': False
+        })
+    return jsonify({'datasets': available})
+
+@app.route('/analyze', methods=['GET', 'POST'])
 def analyze():
     """
     Analyse une zone géographique
     
-    Body JSON:
+    Body JSON (POST) ou paramètres de requête (GET, cacheable par un CDN):
     {
         "address": "Paris, France",
         "time_minutes": 10,
-        "profile": "driving-car"
+        "profile": "driving-car",
+        "dataset": "JRC_GRID_2018"
+    }
+    
+    Les réponses sont mises en cache (mémoire et disque) avec un ETag fort:
+    un If-None-Match correspondant reçoit 304 sans relancer l'analyse.
+    Les analyses non cachées passent par le contrôle d'admission et sont
+    abandonnées au-delà de l'échéance de la requête (504).
+    """
+    deadline = request_deadline()
+    try:
+        # Validation des données d'entrée
+        params, params_error = parse_analysis_request(analysis_request_data())
+        if params_error:
+            return jsonify({'error': params_error}), 400
+        address, time_minutes, profile, dataset = params
+        
+        # Réponse en cache (une entrée par jeu de données)
+        cache_key = analysis_cache_key(time_minutes, profile, dataset_version(dataset), address=address)
+        cached = response_cache.get(cache_key)
+        if cached:
+            body, etag = cached
+            return cached_json_response(body, etag, 'HIT')
+        
+        if analyzer is None:
+            return jsonify({'error': 'Analyseur non initialisé'}), 503
+        
+        # Analyse
+        logger.info(f"🔍 Analyse: {address} ({time_minutes} min, {profile}, {dataset})")
+        try:
+            with admission.admit(deadline):
+                results = analyzer.analyze_location(
+                    address, time_minutes, profile, dataset, deadline, coordinates=router_coordinates()
+                )
+        except OverloadedError as e:
+            return overloaded_response(e)
+        
+        if 'error' in results:
+            return analysis_error_response(results)
+        
+        logger.info(f"✅ Analyse terminée: {results['population_stats']['total_population']:,} habitants, {results['household_stats']['total_households']:,} foyers")
+        return analysis_json_response(cache_key, results)
+        
+    except Exception as e:
+        logger.error(f"❌ Erreur analyse: {e}")
+        return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
+
+def format_analysis_response(results):
+    """Format de réponse optimisé d'une analyse"""
+    response = {
+        'success': True,
+        'data': {
+            'address': results['address'],
+            'coordinates': results['coordinates'],
+            'time_minutes': results['time_minutes'],
+            'profile': results['profile'],
+            'dataset': results['dataset'],
+            'country_code': results['country_code'],
+            'population': format_population(results['population_stats']),
+            'households': format_households(results['household_stats'])
+        }
+    }
+    
+    # Ajouter les données OSM si disponibles
+    osm = format_osm(results['household_stats'])
+    if osm:
+        response['data']['osm'] = osm
+    
+    # Étapes remplacées par leur repli (ex: foyers statistiques faute de bâtiments)
+    if results.get('degraded'):
+        response['data']['degraded'] = results['degraded']
+    
+    return response
+
+def cache_analysis(cache_key, response):
+    """
+    Met une réponse d'analyse en cache et retourne (corps, ETag)
+    
+    Un résultat dégradé n'est pas mis en cache (ETag None): la prochaine
+    requête refait l'analyse au lieu de servir le repli pendant tout le TTL.
+    """
+    body = (app.json.dumps(response) + '\n').encode('utf-8')
+    if response['data'].get('degraded'):
+        return body, None
+    return body, response_cache.put(cache_key, body)
+
+def analysis_json_response(cache_key, results):
+    """Réponse d'une analyse calculée: en cache avec ETag, ou non cacheable si dégradée"""
+    body, etag = cache_analysis(cache_key, format_analysis_response(results))
+    if etag is None:
+        return Response(body, mimetype='application/json',
+                        headers={'Cache-Control': 'no-store', 'X-Cache': 'BYPASS'})
+    return cached_json_response(body, etag, 'MISS')
+
+def format_population(population_stats):
+    """Bloc 'population' d'une réponse"""
+    return {
+        'total': population_stats['total_population'],
+        'density_per_km2': population_stats['population_density'],
+        'area_km2': population_stats['area_km2'],
+        'cells_count': population_stats['number_of_cells']
+    }
+
+def format_households(household_stats):
+    """Bloc 'households' d'une réponse"""
+    return {
+        'total': household_stats['total_households'],
+        'density_per_km2': household_stats['household_density'],
+        'ratio_persons_per_household': household_stats['household_ratio'],
+        'estimation_method': household_stats['method']
+    }
+
+def format_osm(household_stats):
+    """Bloc 'osm' d'une réponse (None sans données de bâtiments)"""
+    osm_data = household_stats.get('osm_data')
+    if not osm_data:
+        return None
+    return {
+        'residential_buildings': osm_data['residential_buildings'],
+        'total_buildings': osm_data['total_buildings'],
+        'residential_ratio': osm_data['residential_ratio'],
+        'source': osm_data.get('source', 'overpass')
+    }
+
+def cached_json_response(body, etag, cache_status):
+    """Réponse JSON avec ETag et en-têtes de cache (304 si If-None-Match correspond)"""
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f"public, max-age={CACHE_CONFIG['max_age_seconds']}",
+        'X-Cache': cache_status
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
+
+@app.route('/analyze/stream', methods=['GET', 'POST'])
+def analyze_stream():
+    """
+    Analyse progressive: un événement par étape, dès qu'elle est terminée
+    
+    Mêmes paramètres que /analyze. Événements: coordinates, isochrone,
+    population, households_statistical, households_hybrid, puis result
+    (champ data de la réponse de /analyze) ou error.
+    
+    Query:
+        format: 'sse' (défaut, text/event-stream) ou 'ndjson' (une ligne JSON par événement)
+    """
+    deadline = request_deadline()
+    fmt = request.args.get('format', 'sse')
+    if fmt not in STREAM_FORMATS:
+        return jsonify({'error': f'Format invalide. Utilisez: {list(STREAM_FORMATS)}'}), 400
+    
+    params, params_error = parse_analysis_request(analysis_request_data())
+    if params_error:
+        return jsonify({'error': params_error}), 400
+    address, time_minutes, profile, dataset = params
+    
+    cache_key = analysis_cache_key(time_minutes, profile, dataset_version(dataset), address=address)
+    cached = response_cache.get(cache_key)
+    if cached:
+        # Résultat déjà connu: un seul événement
+        events = [('result', json.loads(cached[0])['data'])]
+        return stream_response(iter(events), fmt, 'HIT')
+    
+    if analyzer is None:
+        return jsonify({'error': 'Analyseur non initialisé'}), 503
+    
+    logger.info(f"🔍 Analyse progressive: {address} ({time_minutes} min, {profile}, {dataset})")
+    coordinates = router_coordinates()
+    events = queue.Queue()
+    
+    def on_stage(stage, payload):
+        events.put((stage, format_stage_event(stage, payload)))
+    
+    def run():
+        try:
+            with admission.admit(deadline):
+                events.put(('admitted', None))
+                results = analyzer.analyze_location(
+                    address, time_minutes, profile, dataset, deadline, on_stage=on_stage, coordinates=coordinates
+                )
+        except OverloadedError as e:
+            events.put(('overloaded', e))
+            return
+        except Exception as e:
+            logger.error(f"❌ Erreur analyse progressive: {e}")
+            events.put(('error', {'error': f'Erreur serveur: {str(e)}', 'status': 500}))
+            return
+        
+        if 'error' in results:
+            events.put(('error', {'error': results['error'], 'status': results.get('status', 400)}))
+            return
+        response = format_analysis_response(results)
+        cache_analysis(cache_key, response)
+        events.put(('result', response['data']))
+    
+    threading.Thread(target=run, daemon=True).start()
+    
+    def next_event():
+        # L'analyse vérifie l'échéance entre ses étapes: au-delà (plus une marge), elle est abandonnée
+        try:
+            return events.get(timeout=deadline.remaining() + STREAM_GRACE_SECONDS)
+        except queue.Empty:
+            return 'error', {'error': 'Délai de traitement dépassé', 'status': 504}
+    
+    # Refus d'admission ou échec avant l'admission: réponse HTTP classique, avant le début du flux
+    event, data = next_event()
+    if event == 'overloaded':
+        return overloaded_response(data)
+    if event == 'error':
+        return jsonify({'error': data['error']}), data['status']
+    
+    def stage_events():
+        while True:
+            event, data = next_event()
+            yield event, data
+            if event in ('result', 'error'):
+                return
+    
+    return stream_response(stage_events(), fmt, 'MISS')
+
+# Formats du flux de /analyze/stream
+STREAM_FORMATS = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Attente au-delà de l'échéance avant de clore un flux sans nouvelle de l'analyse (secondes)
+STREAM_GRACE_SECONDS = 5
+
+def format_stage_event(stage, payload):
+    """Données d'un événement d'étape (mêmes blocs que la réponse de /analyze)"""
+    if stage == 'coordinates':
+        return payload['coordinates']
+    if stage == 'isochrone':
+        return {'type': 'Polygon', 'coordinates': [payload['isochrone_geometry']]}
+    if stage == 'population':
+        return format_population(payload['population_stats'])
+    
+    data = format_households(payload['household_stats'])
+    osm = format_osm(payload['household_stats'])
+    if osm:
+        data['osm'] = osm
+    if 'country_code' in payload:
+        data['country_code'] = payload['country_code']
+    return data
+
+def stream_response(events, fmt, cache_status):
+    """Réponse en flux d'événements (event, data) au format SSE ou NDJSON"""
+    def generate():
+        for event, data in events:
+            if fmt == 'sse':
+                yield f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+            else:
+                yield app.json.dumps({'event': event, 'data': data}) + '\n'
+    
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Pas de mise en tampon par un proxy
+        'X-Cache': cache_status
+    }
+    return Response(generate(), mimetype=STREAM_FORMATS[fmt], headers=headers)
+
+@app.route('/catchments/overlap', methods=['POST'])
+def catchments_overlap():
+    """
+    Recouvrement des zones de chalandise de plusieurs sites
+    
+    Body JSON:
+    {
+        "sites": [{"address": "Paris, France"}, {"lat": 48.8, "lon": 2.4}],
+        "time_minutes": 10,
+        "profile": "driving-car",
+        "dataset": "JRC_GRID_2018"
     }
     """
     if analyzer is None:
         return jsonify({'error': 'Analyseur non initialisé'}), 503
     
+    deadline = request_deadline()
     try:
-        # Validation des données d'entrée
         data = request.get_json()
         if not data:
             return jsonify({'error': 'Données JSON requises'}), 400
         
-        address = data.get('address', '').strip()
+        sites = data.get('sites')
         time_minutes = data.get('time_minutes', 10)
         profile = data.get('profile', 'driving-car')
+        dataset = data.get('dataset', DATA_CONFIG['dataset_version'])
+        max_sites = LIMITS_CONFIG['max_overlap_sites']
         
         # Validation
-        if not address:
-            return jsonify({'error': 'Adresse requise'}), 400
+        if not isinstance(sites, list) or not 2 <= len(sites) <= max_sites:
+            return jsonify({'error': f'Entre 2 et {max_sites} sites requis'}), 400
         
-        if not isinstance(time_minutes, int) or time_minutes < 1 or time_minutes > 60:
-            return jsonify({'error': 'Temps doit être un entier entre 1 et 60 minutes'}), 400
+        params_error = validate_analysis_params(time_minutes, profile) or validate_dataset(dataset)
+        if params_error:
+            return jsonify({'error': params_error}), 400
         
-        valid_profiles = ['driving-car', 'cycling-regular', 'foot-walking']
-        if profile not in valid_profiles:
-            return jsonify({'error': f'Profile invalide. Utilisez: {valid_profiles}'}), 400
+        for index, site in enumerate(sites, 1):
+            if not isinstance(site, dict):
+                return jsonify({'error': f'Site {index}: objet requis'}), 400
+            address = site.get('address')
+            if address is not None:
+                if not isinstance(address, str) or not address.strip():
+                    return jsonify({'error': f'Site {index}: adresse invalide'}), 400
+                site['address'] = address.strip()
+            elif not all(isinstance(site.get(key), (int, float)) for key in ('lat', 'lon')):
+                return jsonify({'error': f'Site {index}: adresse ou lat/lon requis'}), 400
+            params_error = validate_analysis_params(
+                site.get('time_minutes', time_minutes), site.get('profile', profile)
+            )
+            if params_error:
+                return jsonify({'error': f'Site {index}: {params_error}'}), 400
         
         # Analyse
-        logger.info(f"🔍 Analyse: {address} ({time_minutes} min, {profile})")
-        results = analyzer.analyze_location(address, time_minutes, profile)
+        logger.info(f"🔍 Recouvrement: {len(sites)} sites ({time_minutes} min, {profile})")
+        try:
+            with admission.admit(deadline):
+                results = analyzer.analyze_catchment_overlap(sites, time_minutes, profile, dataset, deadline)
+        except OverloadedError as e:
+            return overloaded_response(e)
         
         if 'error' in results:
-            return jsonify({'error': results['error']}), 400
-        
-        # Format de réponse optimisé
-        response = {
-            'success': True,
-            'data': {
-                'address': results['address'],
-                'coordinates': results['coordinates'],
-                'time_minutes': results['time_minutes'],
-                'profile': results['profile'],
-                'country_code': results['country_code'],
-                'population': {
-                    'total': results['population_stats']['total_population'],
-                    'density_per_km2': results['population_stats']['population_density'],
-                    'area_km2': results['population_stats']['area_km2'],
-                    'cells_count': results['population_stats']['number_of_cells']
-                },
-                'households': {
-                    'total': results['household_stats']['total_households'],
-                    'density_per_km2': results['household_stats']['household_density'],
-                    'ratio_persons_per_household': results['household_stats']['household_ratio'],
-                    'estimation_method': results['household_stats']['method']
-                }
-            }
-        }
+            return analysis_error_response(results)
         
-        # Ajouter les données OSM si disponibles
-        if results['household_stats'].get('osm_data'):
-            osm_data = results['household_stats']['osm_data']
-            response['data']['osm'] = {
-                'residential_buildings': osm_data['residential_buildings'],
-                'total_buildings': osm_data['total_buildings'],
-                'residential_ratio': osm_data['residential_ratio']
-            }
+        return jsonify({'success': True, 'data': results})
         
-        logger.info(f"✅ Analyse terminée: {results['population_stats']['total_population']:,} habitants, {results['household_stats']['total_households']:,} foyers")
-        return jsonify(response)
+    except Exception as e:
+        logger.error(f"❌ Erreur recouvrement: {e}")
+        return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Analyse asynchrone
+    
+    Body JSON identique à POST /analyze. Répond immédiatement 202 avec
+    l'identifiant de la tâche (déterministe: une même analyse, même
+    relancée par le client, est rattachée à la tâche existante), ou 200 si
+    le résultat est déjà disponible. Suivi via GET /jobs/{id}.
+    """
+    if analyzer is None:
+        return jsonify({'error': 'Analyseur non initialisé'}), 503
+    
+    try:
+        params, params_error = parse_analysis_request(request.get_json(silent=True))
+        if params_error:
+            return jsonify({'error': params_error}), 400
+        address, time_minutes, profile, dataset = params
+        
+        cache_key = analysis_cache_key(time_minutes, profile, dataset_version(dataset), address=address)
+        cached = response_cache.get(cache_key) if job_manager.get(cache_key) is None else None
+        if cached:
+            job = job_manager.add_finished(cache_key, json.loads(cached[0])['data'])
+        else:
+            try:
+                job, created = job_manager.submit(
+                    cache_key, run_analysis_job, address, time_minutes, profile, dataset, cache_key,
+                    coordinates=router_coordinates()
+                )
+            except OverloadedError as e:
+                return overloaded_response(e)
+            if created:
+                logger.info(f"🧾 Tâche {cache_key[:12]}: {address} ({time_minutes} min, {profile}, {dataset})")
+        
+        status = 200 if job.is_finished else 202
+        return jsonify(job.to_dict()), status, {'Location': f'/jobs/{job.id}'}
         
     except Exception as e:
-        logger.error(f"❌ Erreur analyse: {e}")
+        logger.error(f"❌ Erreur tâche: {e}")
+        return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """État, progression par étape et résultat d'une analyse asynchrone"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Tâche inconnue ou expirée'}), 404
+    return jsonify(job.to_dict())
+
+def run_analysis_job(address, time_minutes, profile, dataset, cache_key, on_stage, coordinates=None):
+    """Exécute une analyse pour le pool de tâches (résultat aussi mis en cache)"""
+    deadline = Deadline(JOBS_CONFIG['budget_seconds'])
+    results = analyzer.analyze_location(
+        address, time_minutes, profile, dataset, deadline, on_stage=on_stage, coordinates=coordinates
+    )
+    if 'error' in results:
+        raise JobError(results['error'], results.get('status', 400))
+    
+    response = format_analysis_response(results)
+    cache_analysis(cache_key, response)
+    return response['data']
+
+@app.route('/population/point', methods=['POST'])
+def population_point():
+    """
+    Analyse à partir de coordonnées, sans géocodage
+    
+    Body JSON:
+    {
+        "lat": 48.8566,
+        "lon": 2.3522,
+        "time_minutes": 10,
+        "profile": "driving-car",
+        "dataset": "JRC_GRID_2018"
+    }
+    
+    Même réponse (et même cache) que /analyze, sans adresse; le pays est
+    celui qui regroupe le plus d'habitants dans la zone.
+    
+    Query:
+        format: 'json' (défaut) ou 'arrow' (détail par cellule, flux Arrow IPC)
+    """
+    deadline = request_deadline()
+    fmt, format_error = response_format()
+    if format_error:
+        return format_error
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'Données JSON requises'}), 400
+        
+        lat, lon = data.get('lat'), data.get('lon')
+        time_minutes = data.get('time_minutes', 10)
+        profile = data.get('profile', 'driving-car')
+        dataset = data.get('dataset', DATA_CONFIG['dataset_version'])
+        
+        # Validation
+        params_error = (validate_coordinates(lat, lon) or validate_analysis_params(time_minutes, profile)
+                        or validate_dataset(dataset))
+        if params_error:
+            return jsonify({'error': params_error}), 400
+        
+        if fmt == 'arrow':
+            if analyzer is None:
+                return jsonify({'error': 'Analyseur non initialisé'}), 503
+            try:
+                with admission.admit(deadline):
+                    results = analyzer.point_cell_breakdown(lon, lat, time_minutes, profile, dataset, deadline)
+            except OverloadedError as e:
+                return overloaded_response(e)
+            if 'error' in results:
+                return analysis_error_response(results)
+            return cells_arrow_response([results['cells']], dataset)
+        
+        cache_key = analysis_cache_key(time_minutes, profile, dataset_version(dataset), coordinates=(lon, lat))
+        cached = response_cache.get(cache_key)
+        if cached:
+            body, etag = cached
+            return cached_json_response(body, etag, 'HIT')
+        
+        if analyzer is None:
+            return jsonify({'error': 'Analyseur non initialisé'}), 503
+        
+        try:
+            with admission.admit(deadline):
+                results = analyzer.analyze_point(lon, lat, time_minutes, profile, dataset, deadline)
+        except OverloadedError as e:
+            return overloaded_response(e)
+        
+        if 'error' in results:
+            return analysis_error_response(results)
+        
+        return analysis_json_response(cache_key, results)
+        
+    except Exception as e:
+        logger.error(f"❌ Erreur analyse point: {e}")
+        return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
+
+@app.route('/geocode')
+def geocode():
+    """
+    Géocodage d'une adresse pour le routeur multi-nœuds
+    
+    Query: address. Réservé au routeur (X-Router-Token): l'appel passe par
+    l'ordonnanceur du nœud, donc par son quota OpenRouteService.
+    """
+    if not is_router_request():
+        return jsonify({'error': 'Réservé au routeur multi-nœuds'}), 403
+    address = request.args.get('address', '').strip()
+    if not address:
+        return jsonify({'error': 'Adresse requise'}), 400
+    if analyzer is None:
+        return jsonify({'error': 'Analyseur non initialisé'}), 503
+    
+    try:
+        coordinates = analyzer.geocode_address(address, request_deadline())
+    except UpstreamUnavailableError as e:
+        headers = {'Retry-After': str(int(e.retry_after) + 1)} if e.retry_after else {}
+        return jsonify({'error': f"Service {e.upstream} momentanément saturé, réessayez plus tard"}), 503, headers
+    except TimeoutError:
+        return jsonify({'error': 'Délai de traitement dépassé'}), 504
+    if coordinates is None:
+        return jsonify({'error': 'Impossible de géocoder l\'adresse'}), 404
+    lon, lat = coordinates
+    return jsonify({'lon': lon, 'lat': lat})
+
+@app.route('/population/polygon', methods=['POST'])
+def population_polygon():
+    """
+    Population et foyers de zones fournies, sans appel de géocodage ni d'isochrone
+    
+    Body JSON:
+    {
+        "geometry": {"type": "Polygon", "coordinates": [...]},
+        "dataset": "JRC_GRID_2018",
+        "country_code": "FR"
+    }
+    
+    "geometry" accepte une géométrie ou une Feature GeoJSON (Polygon ou
+    MultiPolygon, trous compris), ou une chaîne WKB hexadécimale. Plusieurs
+    zones: "geometries" (liste), une liste JSON de zones (paramètres en
+    query) ou une FeatureCollection GeoJSON. Un corps
+    binaire (application/octet-stream) est lu comme une seule zone WKB.
+    
+    Query:
+        format: 'json' (défaut) ou 'arrow' (détail par cellule, flux Arrow IPC,
+            une record batch par zone)
+    """
+    if analyzer is None:
+        return jsonify({'error': 'Analyseur non initialisé'}), 503
+    
+    deadline = request_deadline()
+    fmt, format_error = response_format()
+    if format_error:
+        return format_error
+    try:
+        if request.mimetype in ('application/octet-stream', 'application/wkb'):
+            data = dict(request.args)
+            raw = [request.get_data()]
+            bulk = False
+        else:
+            data = request.get_json(silent=True)
+            if not data:
+                return jsonify({'error': 'Données JSON requises'}), 400
+            if isinstance(data, list):
+                # Liste de zones: forme "geometries", paramètres en query
+                data = {**request.args, 'geometries': data}
+            elif not isinstance(data, dict):
+                return jsonify({'error': 'Objet JSON ou liste de zones requis'}), 400
+            if data.get('type') == 'FeatureCollection':
+                raw, bulk = data.get('features'), True
+            elif 'geometries' in data:
+                raw, bulk = data['geometries'], True
+            else:
+                raw, bulk = [data.get('geometry')], False
+        
+        dataset = data.get('dataset', DATA_CONFIG['dataset_version'])
+        country_code = data.get('country_code')
+        max_polygons = LIMITS_CONFIG['max_polygons']
+        
+        # Validation
+        if not isinstance(raw, list) or not 1 <= len(raw) <= max_polygons:
+            return jsonify({'error': f'Entre 1 et {max_polygons} zones requises'}), 400
+        params_error = validate_dataset(dataset)
+        if country_code is not None and (not isinstance(country_code, str) or len(country_code) != 2):
+            params_error = params_error or 'Code pays invalide (2 lettres)'
+        if params_error:
+            return jsonify({'error': params_error}), 400
+        
+        polygons = []
+        for index, value in enumerate(raw, 1):
+            try:
+                polygons.append(parse_polygon(value))
+            except ValueError as e:
+                prefix = f'Zone {index}: ' if bulk else ''
+                return jsonify({'error': f'{prefix}{e}'}), 400
+        
+        if fmt == 'arrow':
+            try:
+                with admission.admit(deadline):
+                    breakdowns = [analyzer.cell_breakdown(polygon, dataset) for polygon in polygons]
+            except OverloadedError as e:
+                return overloaded_response(e)
+            return cells_arrow_response(breakdowns, dataset)
+        
+        # Analyse
+        logger.info(f"🔍 Population de {len(polygons)} zone(s) fournie(s) ({dataset})")
+        try:
+            with admission.admit(deadline):
+                results = [analyzer.analyze_polygon(polygon, dataset, country_code, deadline)
+                           for polygon in polygons]
+        except OverloadedError as e:
+            return overloaded_response(e)
+        
+        for result in results:
+            if 'error' in result:
+                return analysis_error_response(result)
+        
+        formatted = [format_polygon_result(result) for result in results]
+        return jsonify({'success': True, 'data': formatted if bulk else formatted[0]})
+        
+    except Exception as e:
+        logger.error(f"❌ Erreur analyse polygone: {e}")
         return jsonify({'error': f'Erreur serveur: {str(e)}'}), 500
 
+# Formats de réponse de /population/point et /population/polygon
+RESPONSE_FORMATS = ('json', 'arrow')
+
+def response_format():
+    """
+    Format de réponse demandé (paramètre format)
+    
+    Returns:
+        tuple: (format, None) ou (None, réponse d'erreur)
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in RESPONSE_FORMATS:
+        return None, (jsonify({'error': f'Format invalide. Utilisez: {list(RESPONSE_FORMATS)}'}), 400)
+    if fmt == 'arrow' and not PYARROW_AVAILABLE:
+        return None, (jsonify({'error': 'Format arrow indisponible (pyarrow non installé)'}), 501)
+    return fmt, None
+
+def cells_arrow_response(breakdowns, dataset):
+    """Détail par cellule en flux Arrow IPC (une record batch par zone)"""
+    metadata = {
+        'dataset': dataset,
+        'resolution_m': str(analyzer.dataset_resolution(dataset)),
+        'cell_id': '(floor(y / resolution) << 32) | floor(x / resolution), EPSG:3035'
+    }
+    return Response(stream_cell_batches(breakdowns, metadata), mimetype=ARROW_STREAM_MIMETYPE,
+                    headers={'Cache-Control': 'no-store'})
+
+def validate_coordinates(lat, lon):
+    """Valide des coordonnées WGS84 (message d'erreur ou None)"""
+    for value in (lat, lon):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return 'lat et lon numériques requis'
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return 'Coordonnées hors limites'
+    return None
+
+def parse_polygon(value):
+    """
+    Zone WGS84 d'une requête (GeoJSON ou WKB hexadécimal)
+    
+    Raises:
+        ValueError: Géométrie illisible, non surfacique, invalide ou trop grande
+    """
+    try:
+        if isinstance(value, str):
+            geometry = wkb.loads(bytes.fromhex(value))
+        elif isinstance(value, (bytes, bytearray)):
+            geometry = wkb.loads(bytes(value))
+        elif isinstance(value, dict):
+            if value.get('type') == 'Feature':
+                value = value.get('geometry') or {}
+            geometry = shape(value)
+        else:
+            raise ValueError
+    except Exception:
+        raise ValueError('Géométrie illisible (GeoJSON ou WKB hexadécimal attendu)')
+    
+    if geometry.geom_type not in ('Polygon', 'MultiPolygon') or geometry.is_empty:
+        raise ValueError('Polygon ou MultiPolygon requis')
+    if not geometry.is_valid:
+        raise ValueError('Géométrie invalide (auto-intersection ou anneau mal formé)')
+    min_lon, min_lat, max_lon, max_lat = geometry.bounds
+    if min_lon < -180 or max_lon > 180 or min_lat < -90 or max_lat > 90:
+        raise ValueError('Coordonnées hors limites (WGS84 lon/lat attendu)')
+    
+    area_km2 = analyzer.to_etrs(geometry).area / 1e6
+    if area_km2 > LIMITS_CONFIG['max_polygon_area_km2']:
+        raise ValueError(f"Zone trop grande ({area_km2:.0f} km², max {LIMITS_CONFIG['max_polygon_area_km2']})")
+    return geometry
+
+def format_polygon_result(results):
+    """Réponse d'une zone fournie"""
+    data = {
+        'dataset': results['dataset'],
+        'country_code': results['country_code'],
+        'population': format_population(results['population_stats']),
+        'households': format_households(results['household_stats'])
+    }
+    osm = format_osm(results['household_stats'])
+    if osm:
+        data['osm'] = osm
+    return data
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint non trouvé'}), 404
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Analyse en masse d'adresses hors ligne
+Lit un fichier JSONL ou CSV d'adresses (ou de coordonnées), enchaîne
+géocodage, isochrone et agrégation, et écrit les résultats au fil de
+l'eau en JSONL ou Parquet avec reprise sur point de contrôle
+
+Usage:
+    python batch_analyze.py adresses.jsonl resultats.jsonl --time-minutes 15
+    python batch_analyze.py adresses.csv resultats.parquet --cpu-workers 4
+
+Chaque enregistrement contient "address" ou "lat"/"lon", et
+éventuellement "id", "time_minutes", "profile" et "dataset".
+"""
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import shapely
+
+from population_analyzer import PopulationAnalyzer
+from household_estimator import HOUSEHOLD_METHODS
+from upstream_scheduler import UpstreamUnavailableError, upstream_priority, PRIORITY_BATCH
+from config import DATA_CONFIG, LIMITS_CONFIG
+
+# pyarrow n'est nécessaire que pour la sortie Parquet
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Colonnes des résultats (même ordre en JSONL et en Parquet)
+RESULT_COLUMNS = [
+    ('id', 'string'), ('address', 'string'), ('lat', 'float64'), ('lon', 'float64'),
+    ('time_minutes', 'int64'), ('profile', 'string'), ('dataset', 'string'),
+    ('country_code', 'string'), ('population', 'int64'), ('area_km2', 'float64'),
+    ('population_density', 'float64'), ('cells_count', 'int64'), ('households', 'int64'),
+    ('household_density', 'float64'), ('household_ratio', 'float64'),
+    ('household_method', 'string'), ('error', 'string')
+]
+
+# Bornes des entiers des colonnes int64
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def conform_row(row: Dict) -> Dict:
+    """
+    Ramène un résultat au schéma RESULT_COLUMNS
+
+    Les valeurs d'un autre type (ex: time_minutes "abc" d'un CSV) sont
+    remplacées par null et signalées dans 'error', pour qu'un enregistrement
+    mal formé ne puisse pas faire échouer l'écriture de tout le lot.
+    """
+    invalid = []
+    for name, kind in RESULT_COLUMNS:
+        value = row.get(name)
+        if value is None:
+            continue
+        if kind == 'string':
+            valid = isinstance(value, str)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            valid = False
+        elif kind == 'int64':
+            valid = isinstance(value, int) and _INT64_MIN <= value <= _INT64_MAX
+        else:
+            valid = True
+            row[name] = float(value)
+        if not valid:
+            row[name] = None
+            invalid.append(name)
+    if invalid and not row.get('error'):
+        row['error'] = f"Valeurs invalides: {', '.join(invalid)}"
+    return row
+
+
+# Analyseur partagé avec les processus d'agrégation (hérité par fork)
+_worker_analyzer = None
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """Lit les enregistrements d'un fichier JSONL ou CSV, un à la fois"""
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                record = {key: value for key, value in row.items() if value not in (None, '')}
+                for key, cast in (('time_minutes', int), ('lat', float), ('lon', float)):
+                    if key in record:
+                        try:
+                            record[key] = cast(record[key])
+                        except ValueError:
+                            pass
+                yield record
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {'_invalid': 'Ligne JSON invalide'}
+            yield record if isinstance(record, dict) else {'_invalid': 'Objet JSON attendu'}
+
+
+class JsonlWriter:
+    def __init__(self, path: str, state: Optional[Dict] = None):
+        """Sortie JSONL (tronquée à la dernière écriture validée lors d'une reprise)"""
+        self.path = path
+        offset = state['bytes'] if state else 0
+        self.file = open(path, 'r+b' if offset and os.path.exists(path) else 'wb')
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    def write(self, rows: List[Dict]):
+        for row in rows:
+            self.file.write((json.dumps(row, ensure_ascii=False) + '\n').encode('utf-8'))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def state(self) -> Dict:
+        return {'bytes': self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path: str, state: Optional[Dict] = None):
+        """Sortie Parquet: un répertoire de fichiers part-NNNNN.parquet"""
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow est requis pour la sortie Parquet (pip install pyarrow)")
+        self.path = path
+        self.parts = state['parts'] if state else 0
+        self.schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in RESULT_COLUMNS])
+        os.makedirs(path, exist_ok=True)
+
+        # Fichiers écrits après le dernier point de contrôle
+        for part_path in glob.glob(os.path.join(path, 'part-*.parquet')):
+            if int(os.path.basename(part_path)[5:10]) >= self.parts:
+                os.remove(part_path)
+
+    def write(self, rows: List[Dict]):
+        table = pa.Table.from_pylist(rows, schema=self.schema)
+        part_path = os.path.join(self.path, f'part-{self.parts:05d}.parquet')
+        tmp_path = part_path + '.tmp'
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, part_path)
+        self.parts += 1
+
+    def state(self) -> Dict:
+        return {'parts': self.parts}
+
+    def close(self):
+        pass
+
+
+def load_checkpoint(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(path: str, checkpoint: Dict):
+    """Écriture atomique du point de contrôle"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _aggregate(isochrone_wkb: bytes, dataset: str, address: Optional[str]) -> Tuple[Dict, Optional[Dict], str]:
+    """
+    Agrégation d'une isochrone (exécutée dans un processus du pool)
+
+    Returns:
+        tuple: (statistiques de population, bâtiments de la grille ou None, code pays)
+    """
+    return _worker_analyzer.summarize_area(shapely.from_wkb(isochrone_wkb), dataset, address)
+
+
+class BatchRunner:
+    def __init__(self, analyzer: PopulationAnalyzer, writer, checkpoint_path: str, checkpoint: Dict,
+                 io_workers: int = 8, cpu_workers: int = 0, flush_every: int = 100,
+                 max_retries: int = 5, defaults: Dict = None):
+        """
+        Exécute l'analyse en masse
+
+        Args:
+            analyzer: Analyseur de population
+            writer: JsonlWriter ou ParquetWriter
+            checkpoint_path: Fichier du point de contrôle
+            checkpoint: Point de contrôle courant (reprise)
+            io_workers: Enregistrements traités simultanément (géocodage, isochrone, Overpass)
+            cpu_workers: Processus d'agrégation (0: dans le processus courant)
+            flush_every: Nombre de résultats par écriture et point de contrôle
+            max_retries: Nouvelles tentatives si un service est saturé
+            defaults: Valeurs par défaut (time_minutes, profile, dataset)
+        """
+        global _worker_analyzer
+        self.analyzer = analyzer
+        self.writer = writer
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = checkpoint
+        self.io_workers = io_workers
+        self.flush_every = flush_every
+        self.max_retries = max_retries
+        self.defaults = defaults or {}
+        self.io_pool = None
+
+        # Les processus héritent de l'analyseur par fork (mémoire partagée en
+        # copie sur écriture); ils sont créés avant tout traitement
+        _worker_analyzer = analyzer
+        self.cpu_pool = None
+        if cpu_workers > 0:
+            if 'fork' in multiprocessing.get_all_start_methods():
+                self.cpu_pool = ProcessPoolExecutor(cpu_workers, mp_context=multiprocessing.get_context('fork'))
+                list(self.cpu_pool.map(abs, range(cpu_workers)))
+            else:
+                print("⚠️ fork indisponible: agrégation dans le processus courant")
+
+    def run(self, records: Iterator[Dict]) -> Dict:
+        """Traite les enregistrements non encore validés par le point de contrôle"""
+        skip = self.checkpoint['records_done']
+        if skip:
+            print(f"↩️  Reprise après {skip:,} enregistrements")
+
+        self.io_pool = ThreadPoolExecutor(self.io_workers, thread_name_prefix='batch')
+        in_flight = deque()
+        rows = []
+        start = time.time()
+        processed = 0
+        try:
+            for index, record in enumerate(records):
+                if index < skip:
+                    continue
+                # Fenêtre bornée: les résultats sont écrits dans l'ordre d'entrée
+                while len(in_flight) >= self.io_workers * 4:
+                    rows.append(in_flight.popleft().result())
+                    if len(rows) >= self.flush_every:
+                        batch, rows = rows, []
+                        processed += self._flush(batch, start, processed)
+                in_flight.append(self.io_pool.submit(self._process, index, record))
+
+            while in_flight:
+                rows.append(in_flight.popleft().result())
+                if len(rows) >= self.flush_every:
+                    batch, rows = rows, []
+                    processed += self._flush(batch, start, processed)
+        except KeyboardInterrupt:
+            print("\n⏹️  Interruption: écriture des résultats terminés...")
+            for future in in_flight:
+                future.cancel()
+            while in_flight and in_flight[0].done() and not in_flight[0].cancelled():
+                rows.append(in_flight.popleft().result())
+            raise
+        finally:
+            # Lot vidé avant l'écriture: un échec n'est pas rejoué ici
+            if rows:
+                batch, rows = rows, []
+                processed += self._flush(batch, start, processed)
+            self.io_pool.shutdown(wait=False, cancel_futures=True)
+            if self.cpu_pool:
+                self.cpu_pool.shutdown(wait=False, cancel_futures=True)
+            self.writer.close()
+
+        return self.checkpoint
+
+    def _flush(self, rows: List[Dict], start: float, processed: int) -> int:
+        """Écrit les résultats puis avance le point de contrôle"""
+        self._estimate_households(rows)
+        self.writer.write(rows)
+        self.checkpoint['records_done'] += len(rows)
+        self.checkpoint['errors'] += sum(1 for row in rows if row['error'])
+        self.checkpoint['output_state'] = self.writer.state()
+        self.checkpoint['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        save_checkpoint(self.checkpoint_path, self.checkpoint)
+
+        rate = (processed + len(rows)) / max(time.time() - start, 1e-6)
+        print(f"✓ {self.checkpoint['records_done']:,} enregistrements "
+              f"({rate:.1f}/s, {self.checkpoint['errors']:,} erreurs)")
+        return len(rows)
+
+    def _estimate_households(self, rows: List[Dict]):
+        """
+        Foyers de tous les enregistrements analysés, en un seul calcul vectorisé
+
+        _analyze laisse dans '_residential_buildings' le nombre de bâtiments
+        résidentiels (None: estimation statistique seule).
+        """
+        pending = [row for row in rows if '_residential_buildings' in row]
+        buildings = [row.pop('_residential_buildings') or 0 for row in pending]
+        if not pending:
+            return
+        estimator = self.analyzer.household_estimator
+        estimates = estimator.estimate_households_batch(
+            np.array([row['population'] for row in pending], dtype=np.float64),
+            estimator.encode_countries([row['country_code'] for row in pending]),
+            np.array(buildings, dtype=np.int64)
+        )
+        for row, households, ratio, method in zip(pending, estimates['households'].tolist(),
+                                                  estimates['ratio'].tolist(), estimates['method'].tolist()):
+            row['households'] = households
+            row['household_density'] = round(households / row['area_km2'], 2) if row['area_km2'] > 0 else 0
+            row['household_ratio'] = ratio
+            row['household_method'] = HOUSEHOLD_METHODS[method]
+
+    def _process(self, index: int, record: Dict) -> Dict:
+        """Analyse d'un enregistrement (priorité batch pour les appels externes)"""
+        row = {name: None for name, _ in RESULT_COLUMNS}
+        row['id'] = str(record.get('id', record.get('request_id', index)))
+        row['address'] = record.get('address')
+        row['time_minutes'] = record.get('time_minutes', self.defaults.get('time_minutes', 10))
+        row['profile'] = record.get('profile', self.defaults.get('profile', 'driving-car'))
+        row['dataset'] = record.get('dataset', self.defaults.get('dataset') or self.analyzer.default_dataset)
+
+        error = record.get('_invalid') or self._validate(record, row)
+        if error:
+            row['error'] = error
+            return conform_row(row)
+
+        try:
+            with upstream_priority(PRIORITY_BATCH):
+                self._analyze(record, row)
+        except UpstreamUnavailableError as e:
+            row['error'] = f"Service {e.upstream} saturé"
+        except Exception as e:
+            row['error'] = f"Erreur: {e}"
+        return conform_row(row)
+
+    def _validate(self, record: Dict, row: Dict) -> Optional[str]:
+        if not row['address']:
+            if not all(isinstance(record.get(key), (int, float)) for key in ('lat', 'lon')):
+                return 'Adresse ou lat/lon requis'
+        elif not isinstance(row['address'], str) or len(row['address']) > LIMITS_CONFIG['max_address_length']:
+            return 'Adresse invalide'
+        time_minutes = row['time_minutes']
+        if not isinstance(time_minutes, int) or not LIMITS_CONFIG['min_time_minutes'] <= time_minutes <= LIMITS_CONFIG['max_time_minutes']:
+            return 'Temps invalide'
+        if row['profile'] not in LIMITS_CONFIG['supported_profiles']:
+            return 'Profil invalide'
+        if row['dataset'] not in self.analyzer.available_datasets():
+            return 'Jeu de données inconnu'
+        return None
+
+    def _with_retries(self, fn, *args):
+        """Appel externe, rejoué avec attente si le service est saturé"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn(*args)
+            except UpstreamUnavailableError as e:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(max(e.retry_after or 0, min(2 ** attempt, 60)))
+
+    def _analyze(self, record: Dict, row: Dict):
+        analyzer = self.analyzer
+
+        # 1. Coordonnées
+        if row['address']:
+            coords = self._with_retries(analyzer.geocode_address, row['address'])
+            if not coords:
+                row['error'] = "Impossible de géocoder l'adresse"
+                return
+            lon, lat = coords
+        else:
+            lon, lat = record['lon'], record['lat']
+        row['lat'], row['lon'] = lat, lon
+
+        # 2. Isochrone
+        isochrone = self._with_retries(analyzer.get_isochrone, lon, lat, row['time_minutes'], row['profile'])
+        if not isochrone:
+            row['error'] = "Impossible d'obtenir l'isochrone"
+            return
+
+        # 3. Agrégation (pool de processus si disponible)
+        args = (shapely.to_wkb(isochrone), row['dataset'], row['address'])
+        if self.cpu_pool:
+            stats, building_data, country_code = self.cpu_pool.submit(_aggregate, *args).result()
+        else:
+            stats, building_data, country_code = _aggregate(*args)
+        row['country_code'] = country_code
+        row['population'] = stats['total_population']
+        row['area_km2'] = stats['area_km2']
+        row['population_density'] = stats['population_density']
+        row['cells_count'] = stats['number_of_cells']
+
+        # 4. Bâtiments (Overpass sur la bounding box si pas de grille de bâtiments);
+        # les foyers sont estimés pour tout le lot à l'écriture (_estimate_households)
+        estimator = analyzer.household_estimator
+        if estimator is None:
+            row['household_method'] = 'not_available'
+            return
+        if stats['total_population'] == 0:
+            row['households'] = 0
+            row['household_density'] = 0
+            row['household_ratio'] = 0
+            row['household_method'] = 'no_population'
+            return
+        if building_data is None:
+            print(f"🗺️ Récupération des données OSM pour la zone...")
+            building_data = estimator.get_buildings_from_osm(isochrone.bounds)
+        row['_residential_buildings'] = building_data['residential_buildings'] if building_data else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse en masse d'adresses (JSONL/CSV)")
+    parser.add_argument('input', help="Fichier d'entrée (.jsonl ou .csv)")
+    parser.add_argument('output', help="Fichier de sortie (.jsonl, ou répertoire .parquet)")
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], help="Format de sortie (défaut: selon l'extension)")
+    parser.add_argument('--time-minutes', type=int, default=10, help="Temps de trajet par défaut")
+    parser.add_argument('--profile', default='driving-car', help="Type de transport par défaut")
+    parser.add_argument('--dataset', help="Jeu de données par défaut")
+    parser.add_argument('--io-workers', type=int, default=8, help="Enregistrements traités simultanément")
+    parser.add_argument('--cpu-workers', type=int, default=os.cpu_count() or 1, help="Processus d'agrégation (0: aucun)")
+    parser.add_argument('--flush-every', type=int, default=100, help="Résultats par écriture et point de contrôle")
+    parser.add_argument('--checkpoint', help="Fichier du point de contrôle (défaut: <sortie>.checkpoint.json)")
+    parser.add_argument('--restart', action='store_true', help="Ignorer le point de contrôle et repartir de zéro")
+    args = parser.parse_args()
+
+    output_format = args.format or ('parquet' if args.output.lower().endswith('.parquet') else 'jsonl')
+    checkpoint_path = args.checkpoint or f'{args.output.rstrip(os.sep)}.checkpoint.json'
+
+    checkpoint = None if args.restart else load_checkpoint(checkpoint_path)
+    if checkpoint and (checkpoint.get('input') != os.path.abspath(args.input) or checkpoint.get('format') != output_format):
+        print(f"❌ Le point de contrôle {checkpoint_path} concerne une autre entrée ou un autre format (utilisez --restart)")
+        sys.exit(1)
+    if checkpoint is None:
+        checkpoint = {
+            'input': os.path.abspath(args.input),
+            'format': output_format,
+            'records_done': 0,
+            'errors': 0,
+            'output_state': None
+        }
+
+    try:
+        if output_format == 'parquet':
+            writer = ParquetWriter(args.output, checkpoint['output_state'])
+        else:
+            writer = JsonlWriter(args.output, checkpoint['output_state'])
+    except ImportError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    analyzer = PopulationAnalyzer(DATA_CONFIG['shapefile_path'], DATA_CONFIG['raster_path'], DATA_CONFIG['api_key'])
+    runner = BatchRunner(
+        analyzer, writer, checkpoint_path, checkpoint,
+        io_workers=args.io_workers,
+        cpu_workers=args.cpu_workers,
+        flush_every=args.flush_every,
+        defaults={'time_minutes': args.time_minutes, 'profile': args.profile, 'dataset': args.dataset}
+    )
+
+    print(f"🚀 Analyse en masse de {args.input} vers {args.output} ({output_format})")
+    try:
+        checkpoint = runner.run(read_records(args.input))
+    except KeyboardInterrupt:
+        print(f"💾 Point de contrôle: {runner.checkpoint['records_done']:,} enregistrements (relancer pour reprendre)")
+        sys.exit(130)
+
+    print(f"✅ Terminé: {checkpoint['records_done']:,} enregistrements, {checkpoint['errors']:,} erreurs")
+
+
+if __name__ == "__main__":
+    main()
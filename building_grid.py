@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Grille précalculée des bâtiments par cellule de 1 km
+Construit, à partir d'un extrait OSM local (.osm.pbf), le nombre de
+bâtiments résidentiels et total par cellule de la grille JRC, et le
+charge pour l'estimation des foyers sans appel Overpass
+
+Usage:
+    python building_grid.py france-latest.osm.pbf buildings_grid.npz
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pyproj
+import shapely
+
+from cell_aggregation import cell_ids_from_origins, cell_origins
+from household_estimator import RESIDENTIAL_BUILDING_TYPES, COUNTED_BUILDING_TYPES
+
+# pyosmium n'est nécessaire que pour la construction hors ligne
+try:
+    import osmium
+    OSMIUM_AVAILABLE = True
+except ImportError:
+    OSMIUM_AVAILABLE = False
+
+
+class BuildingGrid:
+    def __init__(self, path: str):
+        """
+        Charge une grille de bâtiments
+
+        Args:
+            path: Fichier .npz produit par build_building_grid
+        """
+        with np.load(path) as data:
+            self.cell_ids = data['cell_ids']
+            self.residential = data['residential']
+            self.total = data['total']
+            self.resolution = float(data['resolution'])
+            coverage = data['coverage'] if 'coverage' in data else None
+
+        # Emprise de l'extrait OSM (ETRS89 LAEA); à défaut, celle des cellules comptées
+        if coverage is not None:
+            self.coverage = shapely.Polygon(coverage)
+        elif len(self.cell_ids):
+            min_x, min_y = cell_origins(self.cell_ids, self.resolution)
+            self.coverage = shapely.box(min_x.min(), min_y.min(),
+                                        min_x.max() + self.resolution, min_y.max() + self.resolution)
+        else:
+            self.coverage = shapely.Polygon()
+        shapely.prepare(self.coverage)
+        print(f"✓ Grille de bâtiments chargée ({len(self.cell_ids):,} cellules)")
+
+    def covers(self, polygon_etrs) -> bool:
+        """Vrai si la zone (ETRS89 LAEA) est entièrement dans l'emprise de l'extrait OSM"""
+        return bool(self.coverage.covers(polygon_etrs))
+
+    def summarize(self, cell_ids: np.ndarray) -> Dict:
+        """
+        Comptages de bâtiments sur un ensemble de cellules
+
+        Args:
+            cell_ids: Identifiants des cellules (ex: CellSelection.cell_ids)
+
+        Returns:
+            dict: Même structure que HouseholdEstimator.get_buildings_from_osm
+        """
+        residential = 0
+        total = 0
+        if len(cell_ids) and len(self.cell_ids):
+            positions = np.searchsorted(self.cell_ids, cell_ids)
+            positions = np.minimum(positions, len(self.cell_ids) - 1)
+            found = self.cell_ids[positions] == cell_ids
+            residential = int(self.residential[positions[found]].sum())
+            total = int(self.total[positions[found]].sum())
+
+        return {
+            'residential_buildings': residential,
+            'total_buildings': total,
+            'building_types': {},
+            'residential_ratio': residential / total if total > 0 else 0,
+            'source': 'grid'
+        }
+
+
+def _extract_coverage(osm_path: str, transformer: pyproj.Transformer) -> Optional[np.ndarray]:
+    """Contour (ETRS89 LAEA) de l'emprise déclarée dans l'en-tête de l'extrait OSM, ou None"""
+    try:
+        reader = osmium.io.Reader(osm_path, osmium.osm.osm_entity_bits.NOTHING)
+        try:
+            bbox = reader.header().box()
+        finally:
+            reader.close()
+    except RuntimeError:
+        return None
+    if not bbox.valid():
+        return None
+
+    # Bords densifiés: une fois projetés, ils ne sont plus droits
+    area = shapely.box(bbox.bottom_left.lon, bbox.bottom_left.lat, bbox.top_right.lon, bbox.top_right.lat)
+    lons, lats = np.array(shapely.segmentize(area, 0.1).exterior.coords).T
+    x, y = transformer.transform(lons, lats)
+    return np.column_stack([x, y])
+
+
+class _BuildingHandler(osmium.SimpleHandler if OSMIUM_AVAILABLE else object):
+    """Collecte le centre et le type des bâtiments (ways) d'un extrait OSM"""
+
+    def __init__(self, chunk_size: int, on_chunk):
+        super().__init__()
+        self.chunk_size = chunk_size
+        self.on_chunk = on_chunk
+        self.lons = []
+        self.lats = []
+        self.residential = []
+        self.count = 0
+
+    def way(self, way):
+        building_type = way.tags.get('building')
+        if building_type not in COUNTED_BUILDING_TYPES:
+            return
+        try:
+            nodes = [node.location for node in way.nodes if node.location.valid()]
+        except osmium.InvalidLocationError:
+            return
+        if not nodes:
+            return
+        self.lons.append(sum(location.lon for location in nodes) / len(nodes))
+        self.lats.append(sum(location.lat for location in nodes) / len(nodes))
+        self.residential.append(building_type in RESIDENTIAL_BUILDING_TYPES)
+        self.count += 1
+        if len(self.lons) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.lons:
+            self.on_chunk(np.array(self.lons), np.array(self.lats), np.array(self.residential))
+        self.lons, self.lats, self.residential = [], [], []
+
+
+def build_building_grid(osm_path: str, output_path: str, resolution: float = 1000,
+                        chunk_size: int = 500_000) -> int:
+    """
+    Construit la grille de bâtiments d'un extrait OSM
+
+    Les bâtiments sont rattachés à la cellule contenant le centre de leurs
+    nœuds, par lots projetés en ETRS89 LAEA de façon vectorisée. L'emprise
+    de l'extrait (en-tête OSM) est conservée: hors de celle-ci, l'absence
+    de bâtiments ne signifie rien.
+
+    Args:
+        osm_path: Extrait OSM (.osm.pbf)
+        output_path: Fichier .npz de sortie
+        resolution: Taille des cellules en mètres (1000 pour JRC_GRID_2018)
+        chunk_size: Nombre de bâtiments projetés par lot
+
+    Returns:
+        int: Nombre de cellules contenant au moins un bâtiment
+    """
+    if not OSMIUM_AVAILABLE:
+        raise ImportError("pyosmium est requis pour construire la grille (pip install osmium)")
+
+    transformer = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3035", always_xy=True)
+    partial_counts = []
+
+    def on_chunk(lons, lats, residential):
+        x, y = transformer.transform(lons, lats)
+        cell_ids = cell_ids_from_origins(x, y, resolution)
+        ids, inverse = np.unique(cell_ids, return_inverse=True)
+        partial_counts.append((
+            ids,
+            np.bincount(inverse, weights=residential, minlength=len(ids)),
+            np.bincount(inverse, minlength=len(ids))
+        ))
+
+    start = time.time()
+    handler = _BuildingHandler(chunk_size, on_chunk)
+    handler.apply_file(osm_path, locations=True)
+    handler.flush()
+    print(f"✓ {handler.count:,} bâtiments lus en {time.time() - start:.0f}s")
+
+    if partial_counts:
+        ids = np.concatenate([part[0] for part in partial_counts])
+        residential = np.concatenate([part[1] for part in partial_counts])
+        total = np.concatenate([part[2] for part in partial_counts])
+        cell_ids, inverse = np.unique(ids, return_inverse=True)
+        residential = np.bincount(inverse, weights=residential, minlength=len(cell_ids))
+        total = np.bincount(inverse, weights=total, minlength=len(cell_ids))
+    else:
+        cell_ids = np.empty(0, dtype=np.int64)
+        residential = total = np.empty(0)
+
+    arrays = {}
+    coverage = _extract_coverage(osm_path, transformer)
+    if coverage is not None:
+        arrays['coverage'] = coverage
+    else:
+        print("⚠️ Emprise absente de l'en-tête de l'extrait: celle des cellules comptées sera utilisée")
+    np.savez_compressed(
+        output_path,
+        cell_ids=cell_ids.astype(np.int64),
+        residential=residential.astype(np.uint32),
+        total=total.astype(np.uint32),
+        resolution=np.float64(resolution),
+        source=np.str_(os.path.basename(osm_path)),
+        **arrays
+    )
+    print(f"✓ Grille écrite: {output_path} ({len(cell_ids):,} cellules)")
+    return len(cell_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit la grille des bâtiments par cellule depuis un extrait OSM")
+    parser.add_argument('osm_path', help="Extrait OSM (.osm.pbf)")
+    parser.add_argument('output_path', nargs='?', default='buildings_grid.npz', help="Fichier .npz de sortie")
+    parser.add_argument('--resolution', type=float, default=1000, help="Taille des cellules en mètres")
+    args = parser.parse_args()
+
+    try:
+        build_building_grid(args.osm_path, args.output_path, args.resolution)
+    except ImportError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
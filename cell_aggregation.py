@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Sélection des cellules de population intersectant une zone
+Découpe les grandes zones en tuiles alignées sur la grille, traitées en
+parallèle (les prédicats vectorisés de Shapely 2 libèrent le GIL), et
+garde le chemin simple pour les petites zones
+"""
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import shapely
+
+
+class CellSelection(NamedTuple):
+    """Cellules sélectionnées dans une zone (tableaux alignés)"""
+    cell_ids: np.ndarray     # Identifiants de grille (int64)
+    population: np.ndarray   # Population par cellule
+    countries: np.ndarray    # Code pays par cellule ('' si inconnu)
+
+
+def cell_ids_from_origins(min_x, min_y, resolution: float) -> np.ndarray:
+    """
+    Identifiants de grille des cellules à partir de leur coin inférieur gauche
+
+    L'identifiant encode (ligne, colonne) dans la grille ETRS89 LAEA de la
+    résolution donnée: (floor(y / res) << 32) | floor(x / res). Il est
+    stable quel que soit l'ordre de chargement des cellules.
+    """
+    rows = np.floor(np.asarray(min_y, dtype=np.float64) / resolution + 1e-6).astype(np.int64)
+    cols = np.floor(np.asarray(min_x, dtype=np.float64) / resolution + 1e-6).astype(np.int64)
+    return (rows << 32) | cols
+
+
+def cell_origins(cell_ids: np.ndarray, resolution: float):
+    """Coin inférieur gauche (x, y) des cellules à partir de leurs identifiants"""
+    cell_ids = np.asarray(cell_ids, dtype=np.int64)
+    rows = cell_ids >> 32
+    cols = cell_ids & 0xFFFFFFFF
+    return cols * resolution, rows * resolution
+
+
+def cell_boxes(cell_ids: np.ndarray, resolution: float) -> np.ndarray:
+    """Géométries carrées des cellules à partir de leurs identifiants"""
+    min_x, min_y = cell_origins(cell_ids, resolution)
+    return shapely.box(min_x, min_y, min_x + resolution, min_y + resolution)
+
+
+def cell_coverage(cell_ids: np.ndarray, resolution: float, polygon) -> np.ndarray:
+    """
+    Part de la surface de chaque cellule couverte par une zone (0 à 1)
+
+    Les cellules entièrement intérieures valent 1 sans calcul
+    d'intersection; seules les cellules du bord sont découpées.
+    """
+    coverage = np.ones(len(cell_ids), dtype=np.float32)
+    if len(cell_ids) == 0:
+        return coverage
+    boxes = cell_boxes(cell_ids, resolution)
+    # Copie préparée: la zone peut être partagée entre threads
+    polygon = shapely.from_wkb(shapely.to_wkb(polygon))
+    shapely.prepare(polygon)
+    edge = ~shapely.contains(polygon, boxes)
+    if edge.any():
+        coverage[edge] = shapely.area(shapely.intersection(boxes[edge], polygon)) / (resolution * resolution)
+    return coverage
+
+
+class TiledAggregator:
+    def __init__(self, geometries: np.ndarray, cell_ids: np.ndarray, resolution: float = 1000,
+                 tile_size_m: float = 25000, max_workers: int = None,
+                 min_parallel_km2: float = 2500):
+        """
+        Initialise le moteur de sélection
+
+        Args:
+            geometries: Géométries des cellules (EPSG:3035)
+            cell_ids: Identifiants de grille des cellules (même ordre)
+            resolution: Taille d'une cellule en mètres
+            tile_size_m: Taille des tuiles de découpage (multiple de la résolution)
+            max_workers: Nombre de threads (défaut: nombre de cœurs)
+            min_parallel_km2: Emprise minimale d'une zone pour le découpage parallèle
+        """
+        self.geometries = np.asarray(geometries)
+        self.cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        self.resolution = resolution
+        self.tile_size = max(resolution, round(tile_size_m / resolution) * resolution)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_parallel_km2 = min_parallel_km2
+        self.tree = shapely.STRtree(self.geometries)
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='aggregation'
+            )
+        return self._executor
+
+    def select(self, polygon) -> np.ndarray:
+        """
+        Indices (triés) des cellules qui intersectent la zone
+
+        Args:
+            polygon: Polygon ou MultiPolygon en EPSG:3035
+
+        Returns:
+            np.ndarray: Positions des cellules dans les tableaux d'origine
+        """
+        min_x, min_y, max_x, max_y = polygon.bounds
+        extent_km2 = (max_x - min_x) * (max_y - min_y) / 1_000_000
+        if self.max_workers <= 1 or extent_km2 < self.min_parallel_km2:
+            return np.sort(self.tree.query(polygon, predicate='intersects'))
+
+        # Tuiles alignées sur la grille couvrant l'emprise (élargie d'une cellule:
+        # le centre d'une cellule touchant la zone peut tomber hors de l'emprise)
+        res = self.resolution
+        tx_start = math.floor((min_x - res) / self.tile_size)
+        tx_end = math.floor((max_x + res) / self.tile_size)
+        ty_start = math.floor((min_y - res) / self.tile_size)
+        ty_end = math.floor((max_y + res) / self.tile_size)
+        tiles = [
+            (tx * self.tile_size, ty * self.tile_size,
+             (tx + 1) * self.tile_size, (ty + 1) * self.tile_size)
+            for tx in range(tx_start, tx_end + 1)
+            for ty in range(ty_start, ty_end + 1)
+        ]
+        if len(tiles) == 1:
+            return np.sort(self.tree.query(polygon, predicate='intersects'))
+
+        parts = list(self.executor.map(lambda tile: self._select_tile(polygon, tile), tiles))
+        return np.sort(np.concatenate(parts))
+
+    def _select_tile(self, polygon, tile) -> np.ndarray:
+        """
+        Cellules d'une tuile qui intersectent la zone
+
+        Chaque cellule appartient à la tuile contenant son centre, si bien
+        qu'aucune cellule n'est comptée deux fois. Le test est fait contre
+        la zone découpée à la tuile élargie d'une cellule, qui contient
+        entièrement les cellules de la tuile; les cellules au ras du bord de
+        la zone sont testées contre la zone entière, si bien que le résultat
+        est identique à celui du test contre la zone entière.
+        """
+        min_x, min_y, max_x, max_y = tile
+        res = self.resolution
+        expanded = shapely.box(min_x - res, min_y - res, max_x + res, max_y + res)
+        piece = shapely.intersection(polygon, expanded)
+        if piece.is_empty:
+            return np.empty(0, dtype=np.int64)
+
+        candidates = self.tree.query(shapely.box(min_x, min_y, max_x, max_y))
+        if len(candidates) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        origin_x, origin_y = cell_origins(self.cell_ids[candidates], res)
+        center_x = origin_x + res / 2
+        center_y = origin_y + res / 2
+        owned = (center_x >= min_x) & (center_x < max_x) & (center_y >= min_y) & (center_y < max_y)
+        candidates = candidates[owned]
+        if len(candidates) == 0:
+            return candidates.astype(np.int64)
+
+        # Tuile entièrement couverte: toutes ses cellules intersectent la zone
+        if shapely.contains(piece, shapely.box(min_x, min_y, max_x, max_y)):
+            return candidates.astype(np.int64)
+
+        geometries = self.geometries[candidates]
+        shapely.prepare(piece)
+        hits = shapely.intersects(geometries, piece)
+        # Le découpage peut décaler d'un epsilon un contact en un point ou le
+        # long d'un bord de la zone: les cellules au ras de ce bord sont
+        # testées contre la zone entière
+        edge = shapely.intersection(polygon.boundary, expanded)
+        shapely.prepare(edge)
+        near = shapely.dwithin(geometries, edge, res * 1e-6)
+        if near.any():
+            hits[near] = shapely.intersects(geometries[near], polygon)
+        return candidates[hits].astype(np.int64)
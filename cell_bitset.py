@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Ensembles compressés d'identifiants de cellules
+Bitset par blocs de 256x256 cellules de la grille (tableau trié pour les
+blocs peu remplis, bitmap pour les blocs denses) et algèbre associée
+"""
+
+from typing import Dict
+
+import numpy as np
+
+# Au-delà de ce nombre d'éléments, un bloc est stocké en bitmap (8 Ko)
+ARRAY_MAX_SIZE = 4096
+BITMAP_WORDS = 1 << 10  # 65536 bits
+
+# Côté d'un bloc en cellules (2^8): une zone compacte remplit peu de blocs
+BLOCK_SHIFT = 8
+BLOCK_MASK = (1 << BLOCK_SHIFT) - 1
+COLUMN_MASK = 0xFFFFFFFF
+
+
+def _split_ids(cell_ids: np.ndarray):
+    """
+    Clé de bloc et position dans le bloc d'identifiants row<<32|col
+
+    La clé suit le même format que les identifiants, sur la grille des
+    blocs: (row >> 8) << 32 | (col >> 8). La position concatène les 8 bits
+    de poids faible de la ligne et de la colonne ((row & 255) << 8 | col & 255).
+    """
+    rows = cell_ids >> 32
+    cols = cell_ids & COLUMN_MASK
+    keys = ((rows >> BLOCK_SHIFT) << 32) | (cols >> BLOCK_SHIFT)
+    positions = (((rows & BLOCK_MASK) << BLOCK_SHIFT) | (cols & BLOCK_MASK)).astype(np.uint16)
+    return keys, positions
+
+
+def _join_ids(key: int, positions: np.ndarray) -> np.ndarray:
+    """Identifiants row<<32|col d'un bloc (inverse de _split_ids)"""
+    positions = positions.astype(np.int64)
+    rows = ((key >> 32) << BLOCK_SHIFT) + (positions >> BLOCK_SHIFT)
+    cols = ((key & COLUMN_MASK) << BLOCK_SHIFT) + (positions & BLOCK_MASK)
+    return (rows << 32) | cols
+
+
+def _to_bitmap(container: np.ndarray) -> np.ndarray:
+    """Convertit un bloc en bitmap de 1024 mots de 64 bits"""
+    if container.dtype == np.uint64:
+        return container
+    bitmap = np.zeros(BITMAP_WORDS, dtype=np.uint64)
+    values = container.astype(np.uint64)
+    np.bitwise_or.at(bitmap, values >> np.uint64(6), np.uint64(1) << (values & np.uint64(63)))
+    return bitmap
+
+
+def _to_array(container: np.ndarray) -> np.ndarray:
+    """Convertit un bloc en tableau trié d'entiers sur 16 bits"""
+    if container.dtype == np.uint16:
+        return container
+    bits = np.unpackbits(container.view(np.uint8), bitorder='little')
+    return np.flatnonzero(bits).astype(np.uint16)
+
+
+def _cardinality(container: np.ndarray) -> int:
+    if container.dtype == np.uint16:
+        return len(container)
+    return int(np.bitwise_count(container).sum())
+
+
+def _normalize(container: np.ndarray):
+    """Choisit la représentation la plus compacte d'un bloc (None si vide)"""
+    count = _cardinality(container)
+    if count == 0:
+        return None
+    if container.dtype == np.uint64 and count <= ARRAY_MAX_SIZE:
+        return _to_array(container)
+    if container.dtype == np.uint16 and count > ARRAY_MAX_SIZE:
+        return _to_bitmap(container)
+    return container
+
+
+class CellBitset:
+    def __init__(self, containers: Dict[int, np.ndarray] = None):
+        """
+        Ensemble d'identifiants de cellules (int64, row<<32|col)
+
+        Args:
+            containers: Blocs de 256x256 cellules indexés par leur clé (voir _split_ids)
+        """
+        self.containers = containers or {}
+
+    @classmethod
+    def from_ids(cls, cell_ids) -> 'CellBitset':
+        """Construit un ensemble à partir d'identifiants (doublons ignorés)"""
+        cell_ids = np.unique(np.asarray(cell_ids, dtype=np.int64))
+        if len(cell_ids) == 0:
+            return cls()
+        high, low = _split_ids(cell_ids)
+        order = np.lexsort((low, high))
+        high, low = high[order], low[order]
+        keys, starts = np.unique(high, return_index=True)
+        ends = np.append(starts[1:], len(cell_ids))
+        containers = {}
+        for key, start, end in zip(keys.tolist(), starts, ends):
+            containers[key] = _normalize(low[start:end])
+        return cls(containers)
+
+    def to_ids(self) -> np.ndarray:
+        """Identifiants triés de l'ensemble"""
+        if not self.containers:
+            return np.empty(0, dtype=np.int64)
+        parts = [_join_ids(key, _to_array(container)) for key, container in self.containers.items()]
+        return np.sort(np.concatenate(parts))
+
+    def _combine(self, other: 'CellBitset', operation: str) -> 'CellBitset':
+        if operation == 'and':
+            keys = self.containers.keys() & other.containers.keys()
+        elif operation == 'or':
+            keys = self.containers.keys() | other.containers.keys()
+        else:
+            keys = self.containers.keys()
+
+        containers = {}
+        for key in keys:
+            left = self.containers.get(key)
+            right = other.containers.get(key)
+            if right is None:
+                if operation != 'and':
+                    containers[key] = left
+                continue
+            if left is None:
+                containers[key] = right
+                continue
+
+            if left.dtype == np.uint16 and right.dtype == np.uint16:
+                if operation == 'and':
+                    result = np.intersect1d(left, right, assume_unique=True)
+                elif operation == 'or':
+                    result = np.union1d(left, right)
+                else:
+                    result = np.setdiff1d(left, right, assume_unique=True)
+                result = result.astype(np.uint16)
+            else:
+                left_bits, right_bits = _to_bitmap(left), _to_bitmap(right)
+                if operation == 'and':
+                    result = left_bits & right_bits
+                elif operation == 'or':
+                    result = left_bits | right_bits
+                else:
+                    result = left_bits & ~right_bits
+
+            result = _normalize(result)
+            if result is not None:
+                containers[key] = result
+        return CellBitset(containers)
+
+    def __and__(self, other: 'CellBitset') -> 'CellBitset':
+        return self._combine(other, 'and')
+
+    def __or__(self, other: 'CellBitset') -> 'CellBitset':
+        return self._combine(other, 'or')
+
+    def __sub__(self, other: 'CellBitset') -> 'CellBitset':
+        return self._combine(other, 'andnot')
+
+    def __len__(self) -> int:
+        return sum(_cardinality(container) for container in self.containers.values())
+
+    @property
+    def nbytes(self) -> int:
+        """Taille mémoire des blocs"""
+        return sum(container.nbytes for container in self.containers.values())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Export du détail par cellule au format Arrow IPC (flux)
+Les colonnes sont construites directement à partir des tableaux NumPy de
+l'agrégation, une record batch par zone
+"""
+
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+# pyarrow est optionnel (format=arrow indisponible sans lui)
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+def cell_schema(metadata: Optional[Dict[str, str]] = None) -> 'pa.Schema':
+    """Schéma du détail par cellule (zone = indice de la zone dans la requête)"""
+    return pa.schema([
+        ('zone', pa.int32()),
+        ('cell_id', pa.int64()),
+        ('population', pa.float32()),
+        ('country', pa.dictionary(pa.int16(), pa.string())),
+        ('coverage', pa.float32()),
+        ('households', pa.float32())
+    ], metadata=metadata)
+
+
+def cell_batch(cells: Dict[str, np.ndarray], zone: int, schema: 'pa.Schema') -> 'pa.RecordBatch':
+    """
+    Record batch d'une zone à partir des tableaux de cell_breakdown
+
+    Les codes pays sont encodés en dictionnaire (un code par pays distinct).
+    """
+    countries, codes = np.unique(cells['country'], return_inverse=True)
+    count = len(cells['cell_id'])
+    return pa.RecordBatch.from_arrays([
+        pa.array(np.full(count, zone, dtype=np.int32)),
+        pa.array(np.asarray(cells['cell_id'], dtype=np.int64)),
+        pa.array(np.asarray(cells['population'], dtype=np.float32)),
+        pa.DictionaryArray.from_arrays(
+            pa.array(codes.astype(np.int16)), pa.array(countries.astype(object), type=pa.string())
+        ),
+        pa.array(np.asarray(cells['coverage'], dtype=np.float32)),
+        pa.array(np.asarray(cells['households'], dtype=np.float32))
+    ], schema=schema)
+
+
+class _ChunkSink:
+    """Sortie du writer IPC: garde les octets écrits jusqu'au prochain envoi"""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_cell_batches(breakdowns: Iterable[Dict[str, np.ndarray]],
+                        metadata: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+    """
+    Flux Arrow IPC du détail par cellule, morceau par morceau
+
+    Args:
+        breakdowns: Détails par cellule (cell_breakdown), un par zone
+        metadata: Métadonnées du schéma (jeu de données, résolution, CRS)
+
+    Yields:
+        bytes: Schéma, puis une record batch par zone, puis la fin de flux
+    """
+    schema = cell_schema(metadata)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    yield sink.take()
+    for zone, cells in enumerate(breakdowns):
+        writer.write_batch(cell_batch(cells, zone, schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
@@ -24,7 +24,18 @@ SERVER_CONFIG = {
 DATA_CONFIG = {
     'shapefile_path': os.getenv('SHAPEFILE_PATH', 'JRC_POPULATION_2018.shp'),
     'raster_path': os.getenv('RASTER_PATH', 'JRC_1K_POP_2018.tif'),
-    'api_key': os.getenv('OPENROUTE_API_KEY', 'eyJvcmciOiI1YjNjZTM1OTc4NTExMTAwMDFjZjYyNDgiLCJpZCI6IjIwZmRkNDlhNWQzZTQwNjM5YWEwMTA5MGIxNWQ5MzE2IiwiaCI6Im11cm11cjY0In0=')
+    'api_key': os.getenv('OPENROUTE_API_KEY', 'eyJvcmciOiI1YjNjZTM1OTc4NTExMTAwMDFjZjYyNDgiLCJpZCI6IjIwZmRkNDlhNWQzZTQwNjM5YWEwMTA5MGIxNWQ5MzE2IiwiaCI6Im11cm11cjY0In0='),
+    'dataset_version': os.getenv('DATASET_VERSION', 'JRC_GRID_2018'),
+    'building_grid_path': os.getenv('BUILDING_GRID_PATH', 'buildings_grid.npz'),
+    # Jeux de données tuilés (un sous-répertoire par jeu, voir dataset_store.py)
+    'datasets_dir': os.getenv('DATASETS_DIR', 'datasets'),
+    'dataset_cache_mb': int(os.getenv('DATASET_CACHE_MB', 256)),
+    # Grille par défaut découpée en blocs régionaux (remplace le shapefile si présente)
+    'shard_dir': os.getenv('SHARD_DIR', 'shards/jrc_2018'),
+    'shard_memory_mb': int(os.getenv('SHARD_MEMORY_MB', 512)),
+    # Blocs chargés au démarrage: codes pays et/ou emprises WGS84, séparés par ';'
+    # (ex: "FR,BE,DE;2.0,48.5,2.8,49.1")
+    'shard_preload': os.getenv('SHARD_PRELOAD', '')
 }
 
 # Configuration des limites
@@ -32,9 +43,110 @@ LIMITS_CONFIG = {
     'max_time_minutes': 60,
     'min_time_minutes': 1,
     'max_address_length': 200,
+    'max_overlap_sites': 10,
+    'max_polygons': 50,  # Zones par requête de /population/polygon
+    'max_polygon_area_km2': 50000,
     'supported_profiles': ['driving-car', 'cycling-regular', 'foot-walking']
 }
 
+# Configuration des quotas des services externes
+UPSTREAM_CONFIG = {
+    'default_timeout': int(os.getenv('UPSTREAM_TIMEOUT', 30)),
+    'max_queue': int(os.getenv('UPSTREAM_MAX_QUEUE', 50)),
+    'ors_geocode': {
+        'per_minute': int(os.getenv('ORS_GEOCODE_PER_MINUTE', 100)),
+        'per_day': int(os.getenv('ORS_GEOCODE_PER_DAY', 1000)),
+        'concurrency': 2,
+        'max_batch': 1
+    },
+    'ors_isochrones': {
+        'per_minute': int(os.getenv('ORS_ISOCHRONES_PER_MINUTE', 20)),
+        'per_day': int(os.getenv('ORS_ISOCHRONES_PER_DAY', 500)),
+        'concurrency': 2,
+        'max_batch': 5  # Nombre maximal de locations par appel ORS
+    },
+    'overpass': {
+        'per_minute': int(os.getenv('OVERPASS_PER_MINUTE', 10)),
+        'per_day': int(os.getenv('OVERPASS_PER_DAY', 10000)),
+        'concurrency': 2,
+        'max_batch': 1
+    }
+}
+
+# Configuration du contrôle d'admission des analyses
+ADMISSION_CONFIG = {
+    'max_concurrent': int(os.getenv('ADMISSION_MAX_CONCURRENT', 4)),
+    'max_queue': int(os.getenv('ADMISSION_MAX_QUEUE', 8)),
+    'queue_timeout_seconds': float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 5)),
+    'request_budget_seconds': float(os.getenv('REQUEST_BUDGET', 45))
+}
+
+# Configuration de l'exécution des étapes d'une analyse
+ANALYSIS_CONFIG = {
+    # Étapes exécutées simultanément, toutes analyses confondues
+    'stage_workers': int(os.getenv('ANALYSIS_STAGE_WORKERS', 16))
+}
+
+# Configuration des analyses asynchrones (POST /jobs)
+JOBS_CONFIG = {
+    'max_workers': int(os.getenv('JOBS_WORKERS', 2)),
+    'max_pending': int(os.getenv('JOBS_MAX_PENDING', 32)),
+    'ttl_seconds': int(os.getenv('JOBS_TTL', 3600)),
+    'max_finished': int(os.getenv('JOBS_MAX_FINISHED', 1000)),
+    'budget_seconds': float(os.getenv('JOBS_BUDGET', 300))
+}
+
+# Configuration du calcul des isochrones
+ROUTING_CONFIG = {
+    # 'ors': OpenRouteService; 'local': graphe routier local (voir local_routing.py),
+    # avec repli sur ORS si le graphe est absent ou le point hors du graphe
+    'backend': os.getenv('ROUTING_BACKEND', 'ors'),
+    'graph_path': os.getenv('ROAD_GRAPH_PATH', 'road_graph.npz'),
+    'concave_ratio': float(os.getenv('ROUTING_CONCAVE_RATIO', 0.2)),
+    'buffer_m': float(os.getenv('ROUTING_BUFFER_M', 150)),
+    'max_snap_m': float(os.getenv('ROUTING_MAX_SNAP_M', 2000)),
+    # Sans scipy: nœuds atteints au-delà desquels on repasse sur ORS
+    'max_python_nodes': int(os.getenv('ROUTING_MAX_PYTHON_NODES', 200000))
+}
+
+# Configuration du mode multi-nœuds (voir router.py)
+ROUTER_CONFIG = {
+    # URL des nœuds API, séparées par des virgules (ordre indifférent)
+    'nodes': [node.strip() for node in os.getenv('ROUTER_NODES', '').split(',') if node.strip()],
+    # URL de ce nœud telle que listée dans ROUTER_NODES (vide: nœud unique)
+    'node_id': os.getenv('NODE_ID', ''),
+    'vnodes': int(os.getenv('ROUTER_VNODES', 64)),
+    # Taille des régions d'affinité (m), alignée sur les blocs régionaux (dataset_store.py)
+    'region_size_m': int(os.getenv('ROUTER_REGION_SIZE_M', 100000)),
+    # Secret partagé: les nœuds n'acceptent les coordonnées géocodées par le routeur qu'avec lui
+    'token': os.getenv('ROUTER_TOKEN', ''),
+    'timeout_seconds': float(os.getenv('ROUTER_TIMEOUT', 60))
+}
+
+# Configuration de l'agrégation des cellules
+AGGREGATION_CONFIG = {
+    'max_workers': int(os.getenv('AGGREGATION_WORKERS', os.cpu_count() or 1)),
+    'tile_size_m': int(os.getenv('AGGREGATION_TILE_SIZE_M', 25000)),
+    'min_parallel_km2': float(os.getenv('AGGREGATION_MIN_PARALLEL_KM2', 2500))
+}
+
+# Configuration du cache des réponses d'analyse
+CACHE_CONFIG = {
+    'memory_entries': int(os.getenv('CACHE_MEMORY_ENTRIES', 1024)),
+    'disk_dir': os.getenv('CACHE_DIR', 'cache/analyze') or None,
+    'ttl_seconds': int(os.getenv('CACHE_TTL', 7 * 86400)),
+    'max_disk_entries': int(os.getenv('CACHE_MAX_DISK_ENTRIES', 20000)),
+    'max_age_seconds': int(os.getenv('CACHE_MAX_AGE', 3600))
+}
+
+# Configuration des tuiles de densité
+TILES_CONFIG = {
+    'max_zoom': int(os.getenv('TILES_MAX_ZOOM', 14)),
+    'pyramid_levels': int(os.getenv('TILES_PYRAMID_LEVELS', 8)),
+    'cache_size': int(os.getenv('TILES_CACHE_SIZE', 2048)),
+    'max_age_seconds': int(os.getenv('TILES_MAX_AGE', 86400))
+}
+
 # Configuration des logs
 LOG_CONFIG = {
     'level': os.getenv('LOG_LEVEL', 'INFO'),
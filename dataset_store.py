@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Stockage tuilé des grilles de population
+Ingestion par blocs (raster ou grille vectorielle) vers un répertoire de
+tuiles .npz avec résumés par tuile, et lecture des seules tuiles
+intersectant une zone sous un budget mémoire borné
+
+Usage:
+    python dataset_store.py ingest-raster GHS_POP_2020_100m.tif datasets/ghs_2020 --name GHS_POP_2020
+    python dataset_store.py ingest-vector JRC_POPULATION_2018.shp datasets/jrc_2018 --name JRC_GRID_2018 --field TOT_P_2018
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pyproj
+import shapely
+from shapely.ops import transform
+
+from cell_aggregation import CellSelection, cell_ids_from_origins, cell_boxes, cell_coverage
+
+MANIFEST_NAME = 'manifest.json'
+TILES_DIR = 'tiles'
+
+# Mémoire estimée par cellule chargée pour sa géométrie et l'index spatial
+GEOMETRY_BYTES_PER_CELL = 500
+
+# Mémoire estimée par cellule chargée: identifiant, population, pays et géométrie
+BYTES_PER_CELL = 8 + 4 + 8 + GEOMETRY_BYTES_PER_CELL
+
+# Côté des tuiles par défaut (m): ~100 km au plus, moins si le cache ne peut en garder assez
+DEFAULT_TILE_SPAN_M = 100_000
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Nombre de tuiles pleines qui doivent tenir ensemble dans le cache
+TILES_PER_CACHE = 4
+
+
+def _tile_key(tile_x: int, tile_y: int) -> str:
+    return f'{tile_x}_{tile_y}'
+
+
+def _tile_indices(cell_ids: np.ndarray, tile_size_cells: int):
+    """Indices de tuile (colonne, ligne) des cellules"""
+    rows = cell_ids >> 32
+    cols = cell_ids & 0xFFFFFFFF
+    return cols // tile_size_cells, rows // tile_size_cells
+
+
+def default_tile_size(resolution: float, cache_bytes: int = DEFAULT_CACHE_BYTES) -> int:
+    """
+    Taille de tuile (cellules) par défaut
+
+    ~DEFAULT_TILE_SPAN_M à cette résolution, réduite pour que TILES_PER_CACHE
+    tuiles pleines tiennent dans le cache (ex: 100 à 1 km, 359 à 100 m avec 256 Mo).
+    """
+    span_cells = int(round(DEFAULT_TILE_SPAN_M / resolution))
+    budget_cells = math.isqrt(int(cache_bytes // (TILES_PER_CACHE * BYTES_PER_CELL)))
+    return max(1, min(span_cells, budget_cells))
+
+
+def _write_tile(store_dir: str, key: str, cell_ids, population, countries) -> int:
+    """Écrit une tuile triée par identifiant et retourne sa taille en octets"""
+    order = np.argsort(cell_ids, kind='stable')
+    path = os.path.join(store_dir, TILES_DIR, f'{key}.npz')
+    np.savez(
+        path,
+        cell_ids=cell_ids[order].astype(np.int64),
+        population=population[order].astype(np.float32),
+        countries=countries[order].astype('<U2')
+    )
+    return os.path.getsize(path)
+
+
+def _tile_entry(key: str, tile_x: int, tile_y: int, tile_span: float,
+                population: np.ndarray, countries: np.ndarray, size: int) -> Dict:
+    return {
+        'key': key,
+        'bounds': [tile_x * tile_span, tile_y * tile_span,
+                   (tile_x + 1) * tile_span, (tile_y + 1) * tile_span],
+        'cells': int(len(population)),
+        'population': float(population.sum()),
+        'countries': sorted(set(countries.tolist()) - {''}),
+        'bytes': size
+    }
+
+
+def _write_manifest(store_dir: str, name: str, version: str, crs: str,
+                    resolution: float, tile_size_cells: int, source: str, tiles: List[Dict]):
+    manifest = {
+        'name': name,
+        'version': version,
+        'crs': crs,
+        'resolution': resolution,
+        'tile_size_cells': tile_size_cells,
+        'source': os.path.basename(source),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'total_cells': sum(tile['cells'] for tile in tiles),
+        'total_population': sum(tile['population'] for tile in tiles),
+        'tiles': sorted(tiles, key=lambda tile: tile['key'])
+    }
+    with open(os.path.join(store_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def ingest_raster(raster_path: str, store_dir: str, name: str, version: Optional[str] = None,
+                  tile_size_cells: Optional[int] = None, cache_bytes: int = DEFAULT_CACHE_BYTES) -> Dict:
+    """
+    Découpe un raster de population en tuiles alignées sur la grille
+
+    Le raster est lu fenêtre par fenêtre (une tuile à la fois): la mémoire
+    utilisée dépend de la taille des tuiles, pas de celle du raster. Seules
+    les cellules peuplées sont stockées.
+
+    Args:
+        raster_path: Raster de population (pixels carrés, nord en haut)
+        store_dir: Répertoire de sortie
+        name: Nom du jeu de données (sélectionnable par requête)
+        version: Version ou année des données
+        tile_size_cells: Taille d'une tuile en cellules (défaut: default_tile_size)
+        cache_bytes: Budget du cache des tuiles à la lecture (borne la taille par défaut)
+
+    Returns:
+        dict: Manifeste du jeu de données
+    """
+    import rasterio
+    from rasterio.windows import Window
+
+    os.makedirs(os.path.join(store_dir, TILES_DIR), exist_ok=True)
+    tiles = []
+    with rasterio.open(raster_path) as src:
+        transform_ = src.transform
+        resolution = transform_.a
+        if transform_.b != 0 or transform_.d != 0 or abs(transform_.e) != resolution:
+            raise ValueError("Le raster doit avoir des pixels carrés, nord en haut")
+        tile_size_cells = tile_size_cells or default_tile_size(resolution, cache_bytes)
+
+        # Position du raster dans la grille globale (colonne à gauche, ligne en haut)
+        col_origin = int(round(transform_.c / resolution))
+        row_top = int(round(transform_.f / resolution)) - 1
+        tile_span = resolution * tile_size_cells
+
+        tx_start = math.floor(col_origin / tile_size_cells)
+        tx_end = math.floor((col_origin + src.width - 1) / tile_size_cells)
+        ty_start = math.floor((row_top - src.height + 1) / tile_size_cells)
+        ty_end = math.floor(row_top / tile_size_cells)
+
+        total = (tx_end - tx_start + 1) * (ty_end - ty_start + 1)
+        done = 0
+        for tile_y in range(ty_end, ty_start - 1, -1):
+            for tile_x in range(tx_start, tx_end + 1):
+                done += 1
+                # Fenêtre du raster correspondant à la tuile (bornée au raster)
+                col_min = max(tile_x * tile_size_cells, col_origin)
+                col_max = min((tile_x + 1) * tile_size_cells, col_origin + src.width)
+                row_max = min((tile_y + 1) * tile_size_cells - 1, row_top)
+                row_min = max(tile_y * tile_size_cells, row_top - src.height + 1)
+                window = Window(col_min - col_origin, row_top - row_max,
+                                col_max - col_min, row_max - row_min + 1)
+                values = src.read(1, window=window, masked=True)
+                values = np.ma.filled(values.astype(np.float64), 0)
+                rows_in, cols_in = np.nonzero(np.isfinite(values) & (values > 0))
+                if len(rows_in) == 0:
+                    continue
+
+                global_rows = (row_max - rows_in).astype(np.int64)
+                global_cols = (col_min + cols_in).astype(np.int64)
+                cell_ids = (global_rows << 32) | global_cols
+                population = values[rows_in, cols_in]
+                countries = np.full(len(cell_ids), '', dtype='<U2')
+                key = _tile_key(tile_x, tile_y)
+                size = _write_tile(store_dir, key, cell_ids, population, countries)
+                tiles.append(_tile_entry(key, tile_x, tile_y, tile_span, population, countries, size))
+                if done % 50 == 0:
+                    print(f"  {done}/{total} tuiles traitées")
+
+        crs = src.crs.to_string() if src.crs else 'EPSG:3035'
+
+    manifest = _write_manifest(store_dir, name, version or name, crs, resolution,
+                               tile_size_cells, raster_path, tiles)
+    print(f"✓ {len(tiles)} tuiles écrites ({manifest['total_cells']:,} cellules) dans {store_dir}")
+    return manifest
+
+
+def ingest_vector(vector_path: str, store_dir: str, name: str, population_field: str,
+                  version: Optional[str] = None, country_field: Optional[str] = 'CNTR_ID',
+                  resolution: Optional[float] = None, tile_size_cells: Optional[int] = None,
+                  chunk_rows: int = 200_000, cache_bytes: int = DEFAULT_CACHE_BYTES) -> Dict:
+    """
+    Découpe une grille vectorielle (cellules carrées) en tuiles
+
+    Le fichier est lu par tranches de chunk_rows entités; chaque tranche
+    est répartie en fragments par tuile sur disque, puis les fragments de
+    chaque tuile sont fusionnés. Aucune étape ne charge tout le fichier.
+
+    Args:
+        vector_path: Shapefile/GeoPackage de cellules carrées
+        store_dir: Répertoire de sortie
+        name: Nom du jeu de données
+        population_field: Colonne de population (ex: TOT_P_2018)
+        version: Version ou année des données
+        country_field: Colonne du code pays (optionnelle)
+        resolution: Taille des cellules (déduite de la première tranche si absente)
+        tile_size_cells: Taille d'une tuile en cellules (défaut: default_tile_size)
+        chunk_rows: Nombre d'entités lues par tranche
+        cache_bytes: Budget du cache des tuiles à la lecture (borne la taille par défaut)
+
+    Returns:
+        dict: Manifeste du jeu de données
+    """
+    import geopandas as gpd
+
+    tiles_dir = os.path.join(store_dir, TILES_DIR)
+    os.makedirs(tiles_dir, exist_ok=True)
+    # Fragments laissés par une ingestion interrompue
+    for path in glob.glob(os.path.join(tiles_dir, '*.part*.npz')):
+        os.remove(path)
+
+    crs = None
+    start = 0
+    chunk_index = 0
+    while True:
+        chunk = gpd.read_file(vector_path, rows=slice(start, start + chunk_rows))
+        if len(chunk) == 0:
+            break
+        if crs is None:
+            crs = chunk.crs.to_string() if chunk.crs else 'EPSG:3035'
+
+        bounds = chunk.geometry.bounds
+        if resolution is None:
+            resolution = float(round((bounds['maxx'] - bounds['minx']).median(), 6))
+        tile_size_cells = tile_size_cells or default_tile_size(resolution, cache_bytes)
+        cell_ids = cell_ids_from_origins(bounds['minx'], bounds['miny'], resolution)
+        population = chunk[population_field].fillna(0).to_numpy(dtype=np.float64)
+        if country_field and country_field in chunk.columns:
+            countries = chunk[country_field].fillna('').astype(str).str[:2].to_numpy(dtype='<U2')
+        else:
+            countries = np.full(len(chunk), '', dtype='<U2')
+
+        # Fragments par tuile
+        tile_x, tile_y = _tile_indices(cell_ids, tile_size_cells)
+        keys = (tile_x << 32) | (tile_y & 0xFFFFFFFF)
+        order = np.argsort(keys, kind='stable')
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for key, first, last in zip(unique_keys.tolist(), starts, ends):
+            members = order[first:last]
+            tx, ty = tile_x[members[0]], tile_y[members[0]]
+            np.savez(
+                os.path.join(tiles_dir, f'{_tile_key(tx, ty)}.part{chunk_index}.npz'),
+                cell_ids=cell_ids[members], population=population[members], countries=countries[members]
+            )
+
+        print(f"  {start + len(chunk):,} entités lues")
+        start += len(chunk)
+        chunk_index += 1
+        del chunk, bounds
+
+    if resolution is None:
+        raise ValueError(f"Aucune cellule dans {vector_path}")
+
+    # Fusion des fragments de chaque tuile
+    tile_span = resolution * tile_size_cells
+    parts_by_key = {}
+    for path in glob.glob(os.path.join(tiles_dir, '*.part*.npz')):
+        key = os.path.basename(path).split('.part')[0]
+        parts_by_key.setdefault(key, []).append(path)
+
+    tiles = []
+    for key, paths in parts_by_key.items():
+        arrays = []
+        for path in paths:
+            with np.load(path) as part:
+                arrays.append((part['cell_ids'], part['population'], part['countries']))
+            os.remove(path)
+        cell_ids = np.concatenate([part[0] for part in arrays])
+        population = np.concatenate([part[1] for part in arrays])
+        countries = np.concatenate([part[2] for part in arrays])
+        size = _write_tile(store_dir, key, cell_ids, population, countries)
+        tile_x, tile_y = (int(value) for value in key.split('_'))
+        tiles.append(_tile_entry(key, tile_x, tile_y, tile_span, population, countries, size))
+
+    manifest = _write_manifest(store_dir, name, version or name, crs, resolution,
+                               tile_size_cells, vector_path, tiles)
+    print(f"✓ {len(tiles)} tuiles écrites ({manifest['total_cells']:,} cellules) dans {store_dir}")
+    return manifest
+
+
+class _Tile:
+    """Tuile chargée en mémoire; l'index spatial n'est construit qu'à la première zone partielle"""
+
+    def __init__(self, cell_ids: np.ndarray, population: np.ndarray, countries: np.ndarray,
+                 resolution: float, nbytes: int):
+        self.cell_ids = cell_ids
+        self.population = population
+        self.countries = countries
+        self.resolution = resolution
+        self.nbytes = nbytes
+        self._tree = None
+        self._lock = threading.Lock()
+
+    @property
+    def tree(self) -> shapely.STRtree:
+        with self._lock:
+            if self._tree is None:
+                self._tree = shapely.STRtree(cell_boxes(self.cell_ids, self.resolution))
+            return self._tree
+
+
+class TiledDataset:
+    def __init__(self, store_dir: str, cache_bytes: int = DEFAULT_CACHE_BYTES, max_workers: int = 1):
+        """
+        Ouvre un jeu de données tuilé (seul le manifeste est chargé)
+
+        Args:
+            store_dir: Répertoire produit par ingest_raster/ingest_vector
+            cache_bytes: Budget mémoire des tuiles gardées en cache
+            max_workers: Threads pour traiter en parallèle les tuiles d'une zone (bornés
+                par le nombre de plus grandes tuiles qui tiennent dans le budget)
+        """
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.name = self.manifest['name']
+        self.version = self.manifest['version']
+        self.crs = self.manifest['crs']
+        self.resolution = float(self.manifest['resolution'])
+        self.tiles = self.manifest['tiles']
+        self.cache_bytes = cache_bytes
+        self._executor = None
+
+        # Chargements simultanés bornés par le budget: chaque thread peut tenir une tuile pleine
+        largest = max((tile['cells'] for tile in self.tiles), default=0) * BYTES_PER_CELL
+        self.max_workers = max(1, min(max_workers, cache_bytes // largest if largest else max_workers))
+        self._load_slots = threading.BoundedSemaphore(self.max_workers)
+
+        # Index spatial des emprises de tuiles
+        self.tile_boxes = shapely.box(*np.array([tile['bounds'] for tile in self.tiles]).T) \
+            if self.tiles else np.empty(0, dtype=object)
+        self.tile_tree = shapely.STRtree(self.tile_boxes)
+
+        # Les zones arrivent en ETRS89 LAEA
+        if pyproj.CRS.from_user_input(self.crs) == pyproj.CRS.from_epsg(3035):
+            self._from_etrs = None
+        else:
+            self._from_etrs = pyproj.Transformer.from_crs("EPSG:3035", self.crs, always_xy=True)
+
+        self._cache = OrderedDict()
+        self._cache_size = 0
+        self._lock = threading.Lock()
+        self.tile_loads = 0
+        self.evictions = 0
+        self.uncached_loads = 0
+
+    @property
+    def data_version(self) -> str:
+        """Version des données (nom, version et date d'ingestion du manifeste), pour les clés de cache"""
+        return f"{self.name}:{self.version}:{self.manifest.get('created', '')}"
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='dataset')
+        return self._executor
+
+    def _load_tile(self, index: int) -> _Tile:
+        """
+        Charge une tuile (cache LRU borné en octets)
+
+        Une tuile plus grande que le budget entier est utilisée pour la
+        requête en cours sans être gardée en cache.
+        """
+        key = self.tiles[index]['key']
+        with self._lock:
+            tile = self._cache.get(key)
+            if tile is not None:
+                self._cache.move_to_end(key)
+                return tile
+
+        with self._load_slots, np.load(os.path.join(self.store_dir, TILES_DIR, f'{key}.npz')) as data:
+            cell_ids, population, countries = data['cell_ids'], data['population'], data['countries']
+        nbytes = cell_ids.nbytes + population.nbytes + countries.nbytes + len(cell_ids) * GEOMETRY_BYTES_PER_CELL
+        tile = _Tile(cell_ids, population, countries, self.resolution, nbytes)
+
+        with self._lock:
+            self.tile_loads += 1
+            if nbytes > self.cache_bytes:
+                self.uncached_loads += 1
+                print(f"⚠️ Tuile {key} ({nbytes / 1024 / 1024:.0f} Mo) plus grande que le budget du cache: non gardée")
+                return tile
+            if key not in self._cache:
+                self._cache[key] = tile
+                self._cache_size += nbytes
+            while self._cache_size > self.cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_size -= evicted.nbytes
+                self.evictions += 1
+        return tile
+
+    def preload(self, countries=(), bboxes_etrs=()) -> int:
+        """
+        Charge à l'avance les tuiles de certains pays ou emprises
+
+        Le chargement s'arrête au budget mémoire, pour ne pas évincer les
+        tuiles préchargées elles-mêmes.
+
+        Args:
+            countries: Codes pays (d'après le résumé des tuiles)
+            bboxes_etrs: Emprises (min_x, min_y, max_x, max_y) en ETRS89 LAEA
+
+        Returns:
+            int: Nombre de tuiles chargées
+        """
+        wanted = set(countries)
+        indices = {index for index, tile in enumerate(self.tiles) if wanted & set(tile['countries'])}
+        for bbox in bboxes_etrs:
+            area = self._to_store_crs(shapely.box(*bbox))
+            indices.update(self.tile_tree.query(area, predicate='intersects').tolist())
+
+        loaded = 0
+        for index in sorted(indices, key=lambda index: -self.tiles[index]['population']):
+            estimated = self.tiles[index]['cells'] * BYTES_PER_CELL
+            with self._lock:
+                if self._cache_size + estimated > self.cache_bytes:
+                    break
+            self._load_tile(index)
+            loaded += 1
+        return loaded
+
+    def uses_grid(self, resolution: float) -> bool:
+        """Indique si les cellules suivent la grille ETRS89 LAEA de cette résolution"""
+        return self._from_etrs is None and self.resolution == resolution
+
+    def coverage(self, cell_ids: np.ndarray, polygon_etrs) -> np.ndarray:
+        """Part de la surface de chaque cellule couverte par une zone ETRS89 LAEA"""
+        return cell_coverage(cell_ids, self.resolution, self._to_store_crs(polygon_etrs))
+
+    def _to_store_crs(self, polygon_etrs):
+        if self._from_etrs is None:
+            return polygon_etrs
+        return transform(self._from_etrs.transform, polygon_etrs)
+
+    def _select_tile(self, index: int, polygon) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Cellules d'une tuile qui intersectent la zone (sans index spatial si la tuile est couverte)"""
+        tile = self._load_tile(index)
+        if shapely.contains(polygon, self.tile_boxes[index]):
+            return tile.cell_ids, tile.population, tile.countries
+        hits = np.sort(tile.tree.query(polygon, predicate='intersects'))
+        return tile.cell_ids[hits], tile.population[hits], tile.countries[hits]
+
+    def select(self, polygon_etrs) -> CellSelection:
+        """
+        Cellules qui intersectent la zone, en ne lisant que les tuiles concernées
+
+        Args:
+            polygon_etrs: Polygon en ETRS89 LAEA (EPSG:3035)
+
+        Returns:
+            CellSelection: Identifiants, populations et pays des cellules
+        """
+        polygon = self._to_store_crs(polygon_etrs)
+        indices = np.sort(self.tile_tree.query(polygon, predicate='intersects'))
+        if len(indices) > 1 and self.max_workers > 1:
+            parts = list(self.executor.map(lambda index: self._select_tile(index, polygon), indices))
+        else:
+            parts = [self._select_tile(index, polygon) for index in indices]
+
+        if not parts:
+            return CellSelection(
+                cell_ids=np.empty(0, dtype=np.int64),
+                population=np.empty(0, dtype=np.float64),
+                countries=np.empty(0, dtype='<U2')
+            )
+        return CellSelection(
+            cell_ids=np.concatenate([part[0] for part in parts]),
+            population=np.concatenate([part[1] for part in parts]).astype(np.float64),
+            countries=np.concatenate([part[2] for part in parts])
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'version': self.version,
+                'resolution_m': self.resolution,
+                'tiles': len(self.tiles),
+                'total_cells': self.manifest['total_cells'],
+                'cached_tiles': len(self._cache),
+                'cache_mb': round(self._cache_size / 1024 / 1024, 1),
+                'cache_budget_mb': round(self.cache_bytes / 1024 / 1024, 1),
+                'tile_loads': self.tile_loads,
+                'evictions': self.evictions,
+                'uncached_loads': self.uncached_loads
+            }
+
+
+def discover_datasets(datasets_dir: str, cache_bytes: int, max_workers: int = 1) -> Dict[str, TiledDataset]:
+    """Ouvre les jeux de données tuilés présents dans un répertoire (un par sous-répertoire)"""
+    datasets = {}
+    if not datasets_dir or not os.path.isdir(datasets_dir):
+        return datasets
+    for entry in sorted(os.listdir(datasets_dir)):
+        store_dir = os.path.join(datasets_dir, entry)
+        if os.path.exists(os.path.join(store_dir, MANIFEST_NAME)):
+            dataset = TiledDataset(store_dir, cache_bytes, max_workers)
+            datasets[dataset.name] = dataset
+            print(f"✓ Jeu de données {dataset.name} ({len(dataset.tiles)} tuiles, {dataset.resolution:g} m)")
+    return datasets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion de grilles de population en tuiles")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    raster_parser = subparsers.add_parser('ingest-raster', help="Raster de population")
+    raster_parser.add_argument('source')
+    raster_parser.add_argument('store_dir')
+    raster_parser.add_argument('--name', required=True)
+    raster_parser.add_argument('--version')
+    raster_parser.add_argument('--tile-size', type=int, help="Taille des tuiles en cellules (défaut: ~100 km bornés par --cache-mb)")
+    raster_parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES // 1024 // 1024,
+                               help="Budget du cache de lecture (DATASET_CACHE_MB)")
+
+    vector_parser = subparsers.add_parser('ingest-vector', help="Grille vectorielle (cellules carrées)")
+    vector_parser.add_argument('source')
+    vector_parser.add_argument('store_dir')
+    vector_parser.add_argument('--name', required=True)
+    vector_parser.add_argument('--version')
+    vector_parser.add_argument('--field', required=True, help="Colonne de population")
+    vector_parser.add_argument('--country-field', default='CNTR_ID')
+    vector_parser.add_argument('--resolution', type=float)
+    vector_parser.add_argument('--tile-size', type=int, help="Taille des tuiles en cellules (défaut: ~100 km bornés par --cache-mb)")
+    vector_parser.add_argument('--chunk-rows', type=int, default=200_000)
+    vector_parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES // 1024 // 1024,
+                               help="Budget du cache de lecture (DATASET_CACHE_MB)")
+
+    args = parser.parse_args()
+    print(f"📦 Ingestion de {args.source} vers {args.store_dir}")
+    try:
+        if args.command == 'ingest-raster':
+            ingest_raster(args.source, args.store_dir, args.name, args.version, args.tile_size,
+                          args.cache_mb * 1024 * 1024)
+        else:
+            ingest_vector(args.source, args.store_dir, args.name, args.field, args.version,
+                          args.country_field, args.resolution, args.tile_size, args.chunk_rows,
+                          args.cache_mb * 1024 * 1024)
+    except (OSError, ValueError) as e:
+        print(f"❌ Erreur ingestion: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
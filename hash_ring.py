@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Anneau de hachage cohérent et régions d'affinité du mode multi-nœuds
+Une région est un carré ETRS89 LAEA aligné sur les blocs régionaux; son
+nœud propriétaire est donné par l'anneau (nœuds virtuels), si bien que
+l'ajout d'un nœud ne déplace que les régions qu'il reprend
+"""
+
+import bisect
+import hashlib
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyproj
+
+_transformer_to_etrs = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3035", always_xy=True)
+
+
+class HashRing:
+    def __init__(self, nodes: List[str] = (), vnodes: int = 64):
+        """
+        Anneau de hachage cohérent
+
+        Chaque nœud occupe vnodes positions; l'ajout d'un nœud ne déplace
+        que les clés des positions qu'il reprend (~1/N des clés).
+
+        Args:
+            nodes: Identifiants des nœuds (URL)
+            vnodes: Nombre de positions par nœud
+        """
+        self.vnodes = vnodes
+        self._hashes = []
+        self._nodes = []
+        self.nodes = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.vnodes):
+            position = self._hash(f"{node}#{replica}")
+            index = bisect.bisect(self._hashes, position)
+            self._hashes.insert(index, position)
+            self._nodes.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(position, owner) for position, owner in zip(self._hashes, self._nodes) if owner != node]
+        self._hashes = [position for position, _ in kept]
+        self._nodes = [owner for _, owner in kept]
+
+    def nodes_for(self, key: str) -> Iterator[str]:
+        """Nœuds distincts dans l'ordre de l'anneau à partir de la clé (propriétaire d'abord)"""
+        if not self._hashes:
+            return
+        start = bisect.bisect(self._hashes, self._hash(key))
+        seen = set()
+        for offset in range(len(self._hashes)):
+            node = self._nodes[(start + offset) % len(self._hashes)]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self.nodes):
+                    return
+
+    def node_for(self, key: str) -> Optional[str]:
+        """Nœud propriétaire d'une clé"""
+        return next(self.nodes_for(key), None)
+
+
+def region_key(x: float, y: float, region_size_m: float) -> str:
+    """Clé de la région (carré ETRS89 LAEA de region_size_m) contenant un point"""
+    return f"{math.floor(x / region_size_m)}_{math.floor(y / region_size_m)}"
+
+
+def region_of(lon: float, lat: float, region_size_m: float) -> str:
+    """Clé de la région contenant un point WGS84"""
+    x, y = _transformer_to_etrs.transform(lon, lat)
+    return region_key(x, y, region_size_m)
+
+
+def owned_tile_bboxes(tiles: List[Dict], ring: HashRing, node: str, region_size_m: float) -> List[Tuple]:
+    """
+    Emprises (ETRS89 LAEA) des blocs régionaux dont le centre appartient au nœud
+
+    Les emprises sont réduites au voisinage du centre, pour ne pas
+    sélectionner les blocs voisins qui touchent le bord.
+    """
+    bboxes = []
+    for tile in tiles:
+        min_x, min_y, max_x, max_y = tile['bounds']
+        center_x, center_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+        if ring.node_for(region_key(center_x, center_y, region_size_m)) == node:
+            bboxes.append((center_x - 1, center_y - 1, center_x + 1, center_y + 1))
+    return bboxes
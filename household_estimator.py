@@ -9,10 +9,37 @@ import json
 import numpy as np
 from typing import Dict, Tuple, Optional
 import time
+from singleflight import SingleFlight
+from upstream_scheduler import (
+    UpstreamScheduler, UpstreamError, RateLimitedError, Deadline, limits_from_config,
+    parse_retry_after, deadline_at, deadline_remaining
+)
+from config import UPSTREAM_CONFIG
+
+# Types de bâtiments OSM comptés comme résidentiels
+RESIDENTIAL_BUILDING_TYPES = {'residential', 'house', 'apartments', 'detached', 'semi',
+                              'terrace', 'bungalow', 'villa', 'farm'}
+
+# Types de bâtiments OSM pris en compte (résidentiels et activités)
+COUNTED_BUILDING_TYPES = RESIDENTIAL_BUILDING_TYPES | {'commercial', 'industrial', 'retail', 'office'}
+
+# Estimation hybride: foyers par bâtiment résidentiel, poids des estimations statistique et OSM
+HOUSEHOLDS_PER_BUILDING = 1.5
+STATISTICAL_WEIGHT = 0.7
+OSM_WEIGHT = 0.3
+
+# Méthodes d'estimation, indexées par les indicateurs d'estimate_households_batch
+HOUSEHOLD_METHODS = ('statistical_ratio', 'hybrid_statistical_osm')
+METHOD_STATISTICAL, METHOD_HYBRID = range(len(HOUSEHOLD_METHODS))
 
 class HouseholdEstimator:
-    def __init__(self):
-        """Initialise l'estimateur de foyers"""
+    def __init__(self, scheduler: Optional[UpstreamScheduler] = None):
+        """
+        Initialise l'estimateur de foyers
+        
+        Args:
+            scheduler: Ordonnanceur des appels externes (créé si absent)
+        """
         
         # Ratios foyers/habitants par pays (sources: Eurostat, INSEE)
         self.household_ratios = {
@@ -59,8 +86,27 @@ class HouseholdEstimator:
         # Ratio par défaut si pays non trouvé
         self.default_ratio = 2.3
         
+        # Table des ratios pour les calculs vectorisés: le code entier d'un pays
+        # est son rang dans household_ratios, len(household_ratios) pour un pays inconnu
+        self.country_codes = tuple(self.household_ratios)
+        self._code_index = {code: index for index, code in enumerate(self.country_codes)}
+        self.ratio_table = np.array(list(self.household_ratios.values()) + [self.default_ratio])
+        
         # URL de l'API Overpass
         self.overpass_url = 'http://overpass-api.de/api/interpreter'
+        
+        # Regroupement des requêtes Overpass identiques en cours
+        self.flights = SingleFlight()
+        
+        # Quotas et file des appels Overpass
+        self.scheduler = scheduler or UpstreamScheduler(UPSTREAM_CONFIG['default_timeout'])
+        overpass_config = UPSTREAM_CONFIG['overpass']
+        self.scheduler.register(
+            'overpass', self._overpass_handler,
+            limits=limits_from_config(overpass_config),
+            concurrency=overpass_config['concurrency'],
+            max_queue=UPSTREAM_CONFIG['max_queue']
+        )
     
     def get_household_ratio(self, country_code: str) -> float:
         """
@@ -92,23 +138,102 @@ class HouseholdEstimator:
         households = population / ratio
         return int(round(households))
     
+    def encode_countries(self, countries) -> np.ndarray:
+        """
+        Codes entiers des pays (index dans ratio_table) pour estimate_households_batch
+        
+        Args:
+            countries: Codes pays (ex: tableau '<U2' des cellules)
+            
+        Returns:
+            np.ndarray: Codes int16 (pays inconnus: len(country_codes))
+        """
+        codes, inverse = np.unique(np.asarray(countries, dtype=str), return_inverse=True)
+        unknown = len(self.country_codes)
+        table = np.array([self._code_index.get(code, unknown) for code in codes.tolist()], dtype=np.int16)
+        return table[inverse.reshape(-1)]
+    
+    def estimate_households_batch(self, population: np.ndarray, country_codes: np.ndarray,
+                                  residential_buildings: Optional[np.ndarray] = None,
+                                  rounded: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Estimation vectorisée des foyers (mêmes règles qu'estimate_households_advanced)
+        
+        Args:
+            population: Habitants par élément
+            country_codes: Codes entiers des pays (encode_countries)
+            residential_buildings: Bâtiments résidentiels par élément (optionnel;
+                0: estimation statistique seule)
+            rounded: Foyers arrondis comme l'estimation scalaire; sinon
+                population / ratio non arrondi (ex: cellules sommées ensuite)
+            
+        Returns:
+            dict: Tableaux 'households', 'ratio' (ratio du pays) et 'method'
+                (indice dans HOUSEHOLD_METHODS)
+        """
+        population = np.asarray(population, dtype=np.float64)
+        ratio = self.ratio_table[np.asarray(country_codes)]
+        # Sans population, l'estimation statistique vaut 0 (estimate_households_from_population)
+        households = np.where(population > 0, population / ratio, 0.0)
+        method = np.full(len(population), METHOD_STATISTICAL, dtype=np.uint8)
+        if not rounded:
+            return {'households': households, 'ratio': ratio, 'method': method}
+        
+        households = np.rint(households)
+        if residential_buildings is not None:
+            buildings = np.asarray(residential_buildings)
+            hybrid = buildings > 0
+            osm_households = np.floor(buildings * HOUSEHOLDS_PER_BUILDING)
+            adjusted = np.floor(STATISTICAL_WEIGHT * households + OSM_WEIGHT * osm_households)
+            households = np.where(hybrid, adjusted, households)
+            method[hybrid] = METHOD_HYBRID
+        return {'households': households.astype(np.int64), 'ratio': ratio, 'method': method}
+    
     def get_buildings_from_osm(self, bbox: Tuple[float, float, float, float], 
-                              timeout: int = 30) -> Dict:
+                              timeout: int = 30, deadline: Optional[Deadline] = None) -> Dict:
         """
         Récupère les données de bâtiments depuis OpenStreetMap
         
         Args:
             bbox: Bounding box (min_lon, min_lat, max_lon, max_lat)
             timeout: Timeout en secondes
+            deadline: Échéance de la requête (l'appel est abandonné au-delà)
             
         Returns:
             dict: Données des bâtiments
         """
+        key = ('osm_buildings', tuple(round(value, 6) for value in bbox), timeout)
+        try:
+            buildings, _ = self.flights.do(
+                key, self._fetch_buildings_from_osm, bbox, timeout, deadline,
+                wait_timeout=deadline_remaining(deadline)
+            )
+        except TimeoutError as e:
+            return self._empty_buildings(str(e))
+        return buildings
+    
+    def _fetch_buildings_from_osm(self, bbox: Tuple[float, float, float, float], timeout: int,
+                                  deadline: Optional[Deadline] = None) -> Dict:
+        """Bâtiments via l'ordonnanceur (échec, saturation ou échéance: données vides)"""
+        try:
+            return self.scheduler.call('overpass', (bbox, timeout), deadline=deadline_at(deadline))
+        except UpstreamError as e:
+            print(f"Erreur lors de la récupération des bâtiments: {e}")
+            return self._empty_buildings(str(e))
+    
+    @staticmethod
+    def _empty_buildings(error: str) -> Dict:
+        return {'residential_buildings': 0, 'total_buildings': 0, 'building_types': {},
+                'residential_ratio': 0, 'error': error}
+    
+    def _overpass_handler(self, merge_key, payloads: list, timeout: float) -> list:
+        """Appel Overpass pour les bâtiments d'une bounding box"""
+        bbox, query_timeout = payloads[0]
         min_lon, min_lat, max_lon, max_lat = bbox
         
         # Requête Overpass pour récupérer les bâtiments résidentiels
         query = f'''
-        [out:json][timeout:{timeout}];
+        [out:json][timeout:{query_timeout}];
         (
           way["building"="residential"]({min_lat},{min_lon},{max_lat},{max_lon});
           way["building"="house"]({min_lat},{min_lon},{max_lat},{max_lon});
@@ -128,16 +253,17 @@ class HouseholdEstimator:
         '''
         
         try:
-            response = requests.post(self.overpass_url, data=query, timeout=timeout)
-            if response.status_code == 200:
-                data = response.json()
-                return self._analyze_buildings(data.get('elements', []))
-            else:
-                print(f"Erreur API Overpass: {response.status_code}")
-                return {'residential_buildings': 0, 'total_buildings': 0, 'building_types': {}}
-        except Exception as e:
-            print(f"Erreur lors de la récupération des bâtiments: {e}")
-            return {'residential_buildings': 0, 'total_buildings': 0, 'building_types': {}}
+            response = requests.post(self.overpass_url, data=query, timeout=min(query_timeout, timeout))
+        except requests.RequestException as e:
+            raise UpstreamError(f"Erreur API Overpass: {e}")
+        
+        if response.status_code == 429:
+            raise RateLimitedError("Quota Overpass atteint", retry_after=parse_retry_after(response.headers))
+        if response.status_code != 200:
+            raise UpstreamError(f"Erreur API Overpass: {response.status_code}")
+        
+        data = response.json()
+        return [self._analyze_buildings(data.get('elements', []))]
     
     def _analyze_buildings(self, elements: list) -> Dict:
         """
@@ -149,9 +275,6 @@ class HouseholdEstimator:
         Returns:
             dict: Statistiques des bâtiments
         """
-        residential_types = {'residential', 'house', 'apartments', 'detached', 'semi', 
-                           'terrace', 'bungalow', 'villa', 'farm'}
-        
         building_types = {}
         residential_count = 0
         total_count = len(elements)
@@ -160,7 +283,7 @@ class HouseholdEstimator:
             building_type = element.get('tags', {}).get('building', 'unknown')
             building_types[building_type] = building_types.get(building_type, 0) + 1
             
-            if building_type in residential_types:
+            if building_type in RESIDENTIAL_BUILDING_TYPES:
                 residential_count += 1
         
         return {
@@ -171,7 +294,9 @@ class HouseholdEstimator:
         }
     
     def estimate_households_advanced(self, population: int, country_code: str, 
-                                   bbox: Optional[Tuple[float, float, float, float]] = None) -> Dict:
+                                   bbox: Optional[Tuple[float, float, float, float]] = None,
+                                   building_data: Optional[Dict] = None,
+                                   deadline: Optional[Deadline] = None) -> Dict:
         """
         Estimation avancée du nombre de foyers
         
@@ -179,6 +304,9 @@ class HouseholdEstimator:
             population: Nombre d'habitants
             country_code: Code pays
             bbox: Bounding box pour récupérer les données OSM (optionnel)
+            building_data: Comptages de bâtiments déjà connus (ex: grille
+                précalculée), utilisés à la place d'un appel Overpass
+            deadline: Échéance de la requête (au-delà, estimation statistique seule)
             
         Returns:
             dict: Estimation détaillée des foyers
@@ -196,10 +324,13 @@ class HouseholdEstimator:
             'osm_data': None
         }
         
-        # Si bbox fournie, essayer d'obtenir des données OSM
-        if bbox:
+        # Comptages fournis, sinon données OSM via Overpass si bbox fournie
+        osm_data = building_data
+        if osm_data is None and bbox:
             print(f"🗺️ Récupération des données OSM pour la zone...")
-            osm_data = self.get_buildings_from_osm(bbox)
+            osm_data = self.get_buildings_from_osm(bbox, deadline=deadline)
+        
+        if osm_data is not None:
             result['osm_data'] = osm_data
             
             # Ajuster l'estimation si on a des données OSM
@@ -208,14 +339,12 @@ class HouseholdEstimator:
                 # Hypothèse: 1-3 foyers par bâtiment résidentiel selon le type
                 residential_buildings = osm_data['residential_buildings']
                 
-                # Estimation du nombre de foyers par bâtiment selon le type
-                households_per_building = 1.5  # Moyenne conservatrice
-                
-                osm_households = int(residential_buildings * households_per_building)
+                osm_households = int(residential_buildings * HOUSEHOLDS_PER_BUILDING)
                 
                 # Prendre la moyenne pondérée entre estimation statistique et OSM
                 # 70% statistique, 30% OSM
-                adjusted_households = int(0.7 * base_households + 0.3 * osm_households)
+                adjusted_households = int(STATISTICAL_WEIGHT * base_households
+                                          + OSM_WEIGHT * osm_households)
                 
                 result['total_households'] = adjusted_households
                 result['osm_households'] = osm_households
@@ -250,6 +379,13 @@ def test_household_estimator():
         print(f"  Densité foyers: {households/1000:.1f} foyers/km² (si 1km²)")
         print()
     
+    # Estimation vectorisée (un seul calcul pour tous les cas)
+    populations = np.array([population for population, _, _ in test_cases])
+    codes = estimator.encode_countries([country for _, country, _ in test_cases])
+    batch = estimator.estimate_households_batch(populations, codes)
+    print(f"Foyers (vectorisé): {batch['households'].tolist()}")
+    print()
+    
     # Test avec données OSM (zone de Paris)
     print("🗺️ Test avec données OSM (Paris):")
     bbox_paris = (2.34, 48.85, 2.36, 48.87)  # Petite zone de Paris
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Analyses asynchrones (tâches)
+Les tâches sont exécutées par un pool borné de workers; leur état, la
+progression par étape et le résultat sont conservés en mémoire pendant
+une durée limitée, dans la limite d'un nombre de tâches terminées (LRU)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from admission import OverloadedError
+
+
+class JobError(Exception):
+    """Échec d'une tâche, avec le code HTTP correspondant"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    """État d'une tâche et de ses étapes"""
+
+    def __init__(self, job_id: str, stages: Sequence[str]):
+        self.id = job_id
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.stages = OrderedDict((stage, {'status': 'pending'}) for stage in stages)
+        self.result = None
+        self.error = None
+        self.error_status = None
+        self._lock = threading.Lock()
+        self._stage_start = None
+
+    def on_stage(self, stage: str, payload: Optional[Dict] = None):
+        """Marque une étape terminée et la suivante en cours (rappel de l'analyse)"""
+        now = time.monotonic()
+        with self._lock:
+            if stage not in self.stages:
+                return
+            self.stages[stage] = {'status': 'done', 'seconds': round(now - self._stage_start, 3)}
+            self._stage_start = now
+            for name, state in self.stages.items():
+                if state['status'] == 'pending':
+                    state['status'] = 'running'
+                    break
+
+    def _start(self):
+        with self._lock:
+            self.status = 'running'
+            self.started = time.time()
+            self._stage_start = time.monotonic()
+            first = next(iter(self.stages), None)
+            if first is not None:
+                self.stages[first]['status'] = 'running'
+
+    def _finish(self, result=None, error: Optional[JobError] = None):
+        with self._lock:
+            self.finished = time.time()
+            if error is None:
+                self.status = 'done'
+                self.result = result
+            else:
+                self.status = 'failed'
+                self.error = str(error)
+                self.error_status = error.status
+                for state in self.stages.values():
+                    if state['status'] == 'running':
+                        state['status'] = 'failed'
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def to_dict(self) -> Dict:
+        """Représentation JSON (statut, progression, résultat ou erreur)"""
+        with self._lock:
+            done = sum(1 for state in self.stages.values() if state['status'] == 'done')
+            data = {
+                'job_id': self.id,
+                'status': self.status,
+                'progress': round(done / len(self.stages), 2) if self.stages else 1.0,
+                'stages': {name: dict(state) for name, state in self.stages.items()},
+                'created': self.created,
+                'started': self.started,
+                'finished': self.finished
+            }
+            if self.status == 'done':
+                data['result'] = self.result
+            elif self.status == 'failed':
+                data['error'] = self.error
+            return data
+
+
+class JobManager:
+    def __init__(self, stages: Sequence[str], max_workers: int = 2, max_pending: int = 32,
+                 ttl_seconds: int = 3600, max_finished: int = 1000):
+        """
+        Initialise le gestionnaire de tâches
+
+        Args:
+            stages: Étapes suivies pour chaque tâche
+            max_workers: Nombre de tâches exécutées simultanément
+            max_pending: Nombre de tâches en attente ou en cours (refus 429 au-delà)
+            ttl_seconds: Durée de conservation d'une tâche terminée
+            max_finished: Nombre de tâches terminées conservées (les moins
+                récemment consultées sont supprimées au-delà)
+        """
+        self.stages = tuple(stages)
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.max_workers = max_workers
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.attached = 0
+        self.rejected = 0
+
+    def submit(self, job_id: str, fn: Callable, *args, **kwargs) -> Tuple[Job, bool]:
+        """
+        Soumet une tâche, ou rattache l'appelant à la tâche de même identifiant
+
+        fn reçoit en plus on_stage (rappel de progression); elle retourne le
+        résultat ou lève JobError. Une tâche échouée est relancée.
+
+        Returns:
+            tuple: (tâche, créée)
+
+        Raises:
+            OverloadedError: Trop de tâches en attente (429)
+        """
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+            if job is not None and job.status != 'failed':
+                self.attached += 1
+                return job, False
+
+            pending = sum(1 for existing in self._jobs.values() if not existing.is_finished)
+            if pending >= self.max_pending:
+                self.rejected += 1
+                raise OverloadedError("Trop de tâches en attente", 429, self._retry_after(pending))
+
+            job = Job(job_id, self.stages)
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            self.submitted += 1
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job, True
+
+    def add_finished(self, job_id: str, result) -> Job:
+        """Enregistre une tâche déjà terminée (résultat disponible en cache)"""
+        job = Job(job_id, self.stages)
+        for state in job.stages.values():
+            state['status'] = 'done'
+        job.started = job.created
+        job._finish(result)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            self._purge()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Tâche par identifiant (None si inconnue ou expirée)"""
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.move_to_end(job_id)
+            return job
+
+    def _run(self, job: Job, fn: Callable, args, kwargs):
+        job._start()
+        try:
+            result = fn(*args, on_stage=job.on_stage, **kwargs)
+        except JobError as e:
+            job._finish(error=e)
+        except Exception as e:
+            job._finish(error=JobError(f"Erreur serveur: {e}", 500))
+        else:
+            job._finish(result)
+        with self._lock:
+            self._purge()
+        print(f"✓ Tâche {job.id[:12]} {job.status} en {job.finished - job.started:.1f}s")
+
+    def _purge(self):
+        """
+        Supprime les tâches terminées depuis plus de ttl_seconds, puis les
+        moins récemment consultées au-delà de max_finished (verrou tenu)
+        """
+        limit = time.time() - self.ttl_seconds
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        expired = [job_id for job_id in finished if self._jobs[job_id].finished < limit]
+        for job_id in expired:
+            del self._jobs[job_id]
+        finished = [job_id for job_id in finished if job_id in self._jobs]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def _retry_after(self, pending: int) -> int:
+        """Délai estimé avant qu'une place se libère (secondes)"""
+        durations = [job.finished - job.started for job in self._jobs.values()
+                     if job.status == 'done' and job.started is not None]
+        average = sum(durations) / len(durations) if durations else 10.0
+        return max(1, int(average * pending / self.max_workers))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {
+                'jobs': len(self._jobs),
+                'by_status': statuses,
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'max_finished': self.max_finished,
+                'submitted': self.submitted,
+                'attached': self.attached,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Calcul local des isochrones sur un graphe routier hors ligne
+Construit, à partir d'un extrait OSM local (.osm.pbf), un graphe routier
+compact (tableaux CSR) et calcule les isochrones par Dijkstra borné,
+sans appel à OpenRouteService
+
+Usage:
+    python local_routing.py france-latest.osm.pbf road_graph.npz
+"""
+
+import argparse
+import heapq
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, Optional
+
+import numpy as np
+import pyproj
+import shapely
+from shapely.geometry import Polygon
+from shapely.ops import transform
+
+from cell_aggregation import cell_ids_from_origins, cell_origins
+
+# pyosmium n'est nécessaire que pour la construction hors ligne
+try:
+    import osmium
+    OSMIUM_AVAILABLE = True
+except ImportError:
+    OSMIUM_AVAILABLE = False
+
+# scipy est optionnel: il calcule le Dijkstra sans limite de taille; le repli
+# en Python pur est borné en nœuds (sinon ORS) et vérifie l'échéance
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# Classes de routes OSM retenues (l'indice est stocké par arête)
+ROAD_CLASSES = [
+    'motorway', 'motorway_link', 'trunk', 'trunk_link', 'primary', 'primary_link',
+    'secondary', 'secondary_link', 'tertiary', 'tertiary_link', 'unclassified',
+    'residential', 'living_street', 'service', 'road', 'track', 'cycleway',
+    'path', 'footway', 'pedestrian', 'steps'
+]
+
+# Vitesses par profil et classe de route (km/h, absente: interdite)
+PROFILE_SPEEDS = {
+    'driving-car': {
+        'motorway': 110, 'motorway_link': 60, 'trunk': 90, 'trunk_link': 50,
+        'primary': 65, 'primary_link': 40, 'secondary': 55, 'secondary_link': 35,
+        'tertiary': 45, 'tertiary_link': 30, 'unclassified': 35, 'residential': 25,
+        'living_street': 10, 'service': 15, 'road': 30
+    },
+    'cycling-regular': {
+        'primary': 18, 'primary_link': 18, 'secondary': 18, 'secondary_link': 18,
+        'tertiary': 18, 'tertiary_link': 18, 'unclassified': 18, 'residential': 18,
+        'living_street': 12, 'service': 15, 'road': 15, 'track': 12, 'cycleway': 20,
+        'path': 12, 'pedestrian': 8
+    },
+    'foot-walking': {
+        'primary': 5, 'primary_link': 5, 'secondary': 5, 'secondary_link': 5,
+        'tertiary': 5, 'tertiary_link': 5, 'unclassified': 5, 'residential': 5,
+        'living_street': 5, 'service': 5, 'road': 5, 'track': 5, 'cycleway': 5,
+        'path': 5, 'footway': 5, 'pedestrian': 5, 'steps': 3
+    }
+}
+
+# Profils qui respectent les sens uniques
+ONEWAY_PROFILES = {'driving-car'}
+
+# Taille de la grille d'index des nœuds (accrochage de l'origine)
+SNAP_CELL_SIZE = 1000
+
+
+class _RoadHandler(osmium.SimpleHandler if OSMIUM_AVAILABLE else object):
+    """Collecte les nœuds des routes (ways highway=*) d'un extrait OSM"""
+
+    def __init__(self):
+        super().__init__()
+        self.class_index = {name: index for index, name in enumerate(ROAD_CLASSES)}
+        self.node_ids = array('q')
+        self.lons = array('d')
+        self.lats = array('d')
+        self.way_sizes = array('q')
+        self.way_classes = array('B')
+        self.way_oneway = array('b')
+
+    def way(self, way):
+        road_class = self.class_index.get(way.tags.get('highway'))
+        if road_class is None:
+            return
+        nodes = [(node.ref, node.location.lon, node.location.lat)
+                 for node in way.nodes if node.location.valid()]
+        if len(nodes) < 2:
+            return
+
+        oneway = way.tags.get('oneway')
+        if oneway == '-1':
+            nodes.reverse()
+        is_oneway = oneway in ('yes', '1', 'true', '-1') or way.tags.get('junction') == 'roundabout' \
+            or (ROAD_CLASSES[road_class] == 'motorway' and oneway != 'no')
+
+        for ref, lon, lat in nodes:
+            self.node_ids.append(ref)
+            self.lons.append(lon)
+            self.lats.append(lat)
+        self.way_sizes.append(len(nodes))
+        self.way_classes.append(road_class)
+        self.way_oneway.append(1 if is_oneway else 0)
+
+
+def build_road_graph(osm_path: str, output_path: str) -> Dict:
+    """
+    Construit le graphe routier d'un extrait OSM
+
+    Les nœuds sont projetés en ETRS89 LAEA; chaque tronçon de route donne
+    une arête dans chaque sens, celle à contresens d'un sens unique étant
+    marquée (interdite aux profils qui respectent les sens uniques).
+
+    Args:
+        osm_path: Extrait OSM (.osm.pbf)
+        output_path: Fichier .npz de sortie
+
+    Returns:
+        dict: Nombre de nœuds et d'arêtes
+    """
+    if not OSMIUM_AVAILABLE:
+        raise ImportError("pyosmium est requis pour construire le graphe (pip install osmium)")
+
+    start = time.time()
+    handler = _RoadHandler()
+    handler.apply_file(osm_path, locations=True)
+    print(f"✓ {len(handler.way_sizes):,} routes lues en {time.time() - start:.0f}s")
+
+    # Nœuds uniques (un nœud partagé par plusieurs routes devient une intersection)
+    occurrence_ids = np.frombuffer(handler.node_ids, dtype=np.int64)
+    node_ids, first, occurrence_nodes = np.unique(occurrence_ids, return_index=True, return_inverse=True)
+    transformer = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3035", always_xy=True)
+    x, y = transformer.transform(
+        np.frombuffer(handler.lons, dtype=np.float64)[first],
+        np.frombuffer(handler.lats, dtype=np.float64)[first]
+    )
+    del handler.node_ids, handler.lons, handler.lats
+
+    # Tronçons entre nœuds consécutifs d'une même route
+    way_sizes = np.frombuffer(handler.way_sizes, dtype=np.int64)
+    way_ends = np.cumsum(way_sizes) - 1
+    consecutive = np.ones(len(occurrence_nodes), dtype=bool)
+    consecutive[way_ends] = False
+    source_occurrences = np.flatnonzero(consecutive)
+    sources = occurrence_nodes[source_occurrences]
+    targets = occurrence_nodes[source_occurrences + 1]
+    classes = np.repeat(np.frombuffer(handler.way_classes, dtype=np.uint8), way_sizes)[source_occurrences]
+    oneway = np.repeat(np.frombuffer(handler.way_oneway, dtype=np.int8), way_sizes)[source_occurrences] > 0
+
+    keep = sources != targets
+    sources, targets, classes, oneway = sources[keep], targets[keep], classes[keep], oneway[keep]
+    lengths = np.hypot(x[targets] - x[sources], y[targets] - y[sources])
+
+    # Arêtes dans les deux sens, triées par nœud de départ (CSR)
+    edge_sources = np.concatenate([sources, targets])
+    edge_targets = np.concatenate([targets, sources])
+    order = np.argsort(edge_sources, kind='stable')
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_sources, minlength=len(node_ids)), out=indptr[1:])
+
+    np.savez_compressed(
+        output_path,
+        indptr=indptr,
+        indices=edge_targets[order].astype(np.int32),
+        length=np.concatenate([lengths, lengths])[order].astype(np.float32),
+        road_class=np.concatenate([classes, classes])[order],
+        against_oneway=np.concatenate([np.zeros(len(oneway), dtype=bool), oneway])[order],
+        x=np.asarray(x, dtype=np.float32),
+        y=np.asarray(y, dtype=np.float32),
+        road_classes=np.array(ROAD_CLASSES)
+    )
+    summary = {'nodes': len(node_ids), 'edges': int(indptr[-1])}
+    print(f"✓ Graphe écrit: {output_path} ({summary['nodes']:,} nœuds, {summary['edges']:,} arêtes)")
+    return summary
+
+
+class RoutingBudgetError(Exception):
+    """Le Dijkstra en Python pur dépasse son budget de nœuds (repli sur ORS)"""
+
+
+class LocalRouter:
+    def __init__(self, path: str, concave_ratio: float = 0.2, buffer_m: float = 150,
+                 max_snap_m: float = 2000, max_python_nodes: int = 200_000):
+        """
+        Charge un graphe routier
+
+        Args:
+            path: Fichier .npz produit par build_road_graph
+            concave_ratio: Finesse de l'enveloppe concave (0: la plus fine, 1: convexe)
+            buffer_m: Marge autour des nœuds atteints (m)
+            max_snap_m: Distance maximale entre l'origine et le graphe (m)
+            max_python_nodes: Nœuds atteints au-delà desquels le Dijkstra en
+                Python pur (sans scipy) abandonne
+        """
+        with np.load(path) as data:
+            self.indptr = data['indptr']
+            self.indices = data['indices']
+            self.length = data['length']
+            self.road_class = data['road_class']
+            self.against_oneway = data['against_oneway']
+            self.x = data['x'].astype(np.float64)
+            self.y = data['y'].astype(np.float64)
+            road_classes = [str(name) for name in data['road_classes']]
+        self.concave_ratio = concave_ratio
+        self.buffer_m = buffer_m
+        self.max_snap_m = max_snap_m
+        self.max_python_nodes = max_python_nodes
+
+        # Vitesses (m/s) par profil, indexées par classe de route
+        self.speeds = {
+            profile: np.array([speeds.get(name, 0) / 3.6 for name in road_classes])
+            for profile, speeds in PROFILE_SPEEDS.items()
+        }
+
+        # Index des nœuds par cellule pour l'accrochage de l'origine
+        node_cells = cell_ids_from_origins(self.x, self.y, SNAP_CELL_SIZE)
+        self._snap_order = np.argsort(node_cells, kind='stable')
+        self._snap_cells = node_cells[self._snap_order]
+
+        self.transformer_to_etrs = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3035", always_xy=True)
+        self.transformer_to_wgs = pyproj.Transformer.from_crs("EPSG:3035", "EPSG:4326", always_xy=True)
+
+        # Poids par profil calculés à la première utilisation
+        self._weights = {}
+        self._matrices = {}
+        self._usable = {}
+        self._lock = threading.Lock()
+        self.computed = 0
+        print(f"✓ Graphe routier chargé ({len(self.x):,} nœuds, {len(self.indices):,} arêtes)")
+
+    def _profile_weights(self, profile: str):
+        """Temps de parcours (s) des arêtes pour un profil (inf si interdite)"""
+        with self._lock:
+            if profile in self._weights:
+                return self._weights[profile]
+            speeds = self.speeds[profile][self.road_class]
+            with np.errstate(divide='ignore'):
+                weights = np.where(speeds > 0, self.length / speeds, np.inf)
+            if profile in ONEWAY_PROFILES:
+                weights[self.against_oneway] = np.inf
+            weights = np.maximum(weights, 1e-3).astype(np.float32)
+
+            allowed = np.isfinite(weights)
+            edge_sources = np.repeat(np.arange(len(self.x), dtype=np.int32), np.diff(self.indptr))
+            usable = np.zeros(len(self.x), dtype=bool)
+            usable[edge_sources[allowed]] = True
+
+            if SCIPY_AVAILABLE:
+                # Matrice creuse des seules arêtes autorisées; csr_matrix additionne les
+                # arêtes parallèles (même origine et destination): seule la plus rapide est gardée
+                sources, targets, times = edge_sources[allowed], self.indices[allowed], weights[allowed]
+                order = np.lexsort((times, targets, sources))
+                sources, targets, times = sources[order], targets[order], times[order]
+                fastest = np.ones(len(order), dtype=bool)
+                fastest[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+                self._matrices[profile] = csr_matrix(
+                    (times[fastest], (sources[fastest], targets[fastest])),
+                    shape=(len(self.x), len(self.x))
+                )
+            self._weights[profile] = weights
+            self._usable[profile] = usable
+            return weights
+
+    def snap(self, x: float, y: float, profile: str) -> Optional[int]:
+        """Nœud praticable le plus proche d'un point (ETRS89 LAEA), ou None"""
+        self._profile_weights(profile)
+        usable = self._usable[profile]
+        row = int(np.floor(y / SNAP_CELL_SIZE))
+        col = int(np.floor(x / SNAP_CELL_SIZE))
+        reach = int(np.ceil(self.max_snap_m / SNAP_CELL_SIZE))
+
+        candidates = []
+        for d_row in range(-reach, reach + 1):
+            for d_col in range(-reach, reach + 1):
+                cell = ((row + d_row) << 32) | (col + d_col)
+                first = np.searchsorted(self._snap_cells, cell, side='left')
+                last = np.searchsorted(self._snap_cells, cell, side='right')
+                candidates.append(self._snap_order[first:last])
+        candidates = np.concatenate(candidates)
+        candidates = candidates[usable[candidates]]
+        if len(candidates) == 0:
+            return None
+
+        distances = np.hypot(self.x[candidates] - x, self.y[candidates] - y)
+        nearest = int(np.argmin(distances))
+        if distances[nearest] > self.max_snap_m:
+            return None
+        return int(candidates[nearest])
+
+    def reachable_nodes(self, lon: float, lat: float, time_minutes: int, profile: str,
+                        deadline=None) -> Optional[np.ndarray]:
+        """
+        Nœuds atteignables depuis un point en un temps donné (Dijkstra borné)
+
+        Args:
+            deadline: Échéance de la requête (Deadline), vérifiée pendant le
+                Dijkstra en Python pur
+
+        Returns:
+            np.ndarray: Indices des nœuds atteints, ou None si le point est
+            trop loin du graphe
+
+        Raises:
+            RoutingBudgetError: Sans scipy, plus de max_python_nodes nœuds atteints
+            RequestTimeoutError: Échéance dépassée pendant le calcul
+        """
+        if profile not in self.speeds:
+            raise ValueError(f"Profil non supporté: {profile}")
+        x, y = self.transformer_to_etrs.transform(lon, lat)
+        origin = self.snap(x, y, profile)
+        if origin is None:
+            return None
+
+        limit = time_minutes * 60
+        with self._lock:
+            self.computed += 1
+        if SCIPY_AVAILABLE:
+            times = dijkstra(self._matrices[profile], directed=True, indices=origin, limit=limit)
+            return np.flatnonzero(np.isfinite(times))
+        return self._bounded_dijkstra(origin, self._weights[profile], limit, deadline)
+
+    def _bounded_dijkstra(self, origin: int, weights: np.ndarray, limit: float, deadline=None) -> np.ndarray:
+        """Dijkstra limité au temps imparti, au budget de nœuds et à l'échéance, sur les tableaux CSR"""
+        indptr, indices = self.indptr, self.indices
+        best = {origin: 0.0}
+        heap = [(0.0, origin)]
+        settled = 0
+        while heap:
+            elapsed, node = heapq.heappop(heap)
+            if elapsed > best[node]:
+                continue
+            settled += 1
+            if settled > self.max_python_nodes:
+                raise RoutingBudgetError(f"Plus de {self.max_python_nodes:,} nœuds atteints sans scipy")
+            if deadline is not None and settled % 4096 == 0:
+                deadline.check('isochrone')
+            start, end = indptr[node], indptr[node + 1]
+            for target, weight in zip(indices[start:end].tolist(), weights[start:end].tolist()):
+                arrival = elapsed + weight
+                if arrival <= limit and arrival < best.get(target, np.inf):
+                    best[target] = arrival
+                    heapq.heappush(heap, (arrival, target))
+        return np.fromiter(best.keys(), dtype=np.int64, count=len(best))
+
+    def isochrone(self, lon: float, lat: float, time_minutes: int, profile: str = 'driving-car',
+                  deadline=None) -> Optional[Polygon]:
+        """
+        Isochrone locale (même contrat que PopulationAnalyzer.get_isochrone)
+
+        Les nœuds atteints sont regroupés sur une grille de 100 m puis
+        entourés d'une enveloppe concave élargie de buffer_m.
+
+        Returns:
+            Polygon: Zone atteignable en WGS84, ou None si le point est hors du graphe
+        """
+        nodes = self.reachable_nodes(lon, lat, time_minutes, profile, deadline)
+        if nodes is None:
+            return None
+
+        # Réduction des points: un par cellule de 100 m
+        cells = np.unique(cell_ids_from_origins(self.x[nodes], self.y[nodes], 100))
+        min_x, min_y = cell_origins(cells, 100)
+        points = shapely.multipoints(np.column_stack([min_x + 50, min_y + 50]))
+        hull = shapely.concave_hull(points, ratio=self.concave_ratio).buffer(self.buffer_m)
+        if hull.geom_type == 'MultiPolygon':
+            hull = max(hull.geoms, key=lambda part: part.area)
+        return Polygon(transform(self.transformer_to_wgs.transform, hull).exterior)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': 'local',
+                'nodes': len(self.x),
+                'edges': len(self.indices),
+                'profiles_loaded': sorted(self._weights),
+                'engine': 'scipy' if SCIPY_AVAILABLE else 'python',
+                'computed': self.computed
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit le graphe routier d'un extrait OSM")
+    parser.add_argument('osm_path', help="Extrait OSM (.osm.pbf)")
+    parser.add_argument('output_path', nargs='?', default='road_graph.npz', help="Fichier .npz de sortie")
+    args = parser.parse_args()
+
+    try:
+        build_road_graph(args.osm_path, args.output_path)
+    except ImportError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,30 @@ import geopandas as gpd
 import rasterio
 import requests
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from shapely.geometry import Point, Polygon
+from shapely.geometry import Point, Polygon, box
 from shapely.ops import transform
 import pyproj
 from functools import partial
 import warnings
+from singleflight import SingleFlight, normalize_address, normalize_coordinates
+from upstream_scheduler import (
+    UpstreamScheduler, UpstreamError, UpstreamUnavailableError, RateLimitedError,
+    Deadline, limits_from_config, parse_retry_after, deadline_at, deadline_remaining
+)
+from cell_aggregation import TiledAggregator, CellSelection, cell_ids_from_origins, cell_coverage
+from cell_bitset import CellBitset
+from building_grid import BuildingGrid
+from dataset_store import TiledDataset, discover_datasets, MANIFEST_NAME
+from stage_graph import StageGraph
+from local_routing import LocalRouter, RoutingBudgetError
+from hash_ring import HashRing, owned_tile_bboxes
+from config import (
+    UPSTREAM_CONFIG, AGGREGATION_CONFIG, DATA_CONFIG, ROUTING_CONFIG, ANALYSIS_CONFIG, ROUTER_CONFIG,
+    ADMISSION_CONFIG
+)
 warnings.filterwarnings('ignore')
 
 # Import de l'estimateur de foyers
@@ -23,8 +41,14 @@ try:
 except ImportError:
     HOUSEHOLD_ESTIMATOR_AVAILABLE = False
 
+class _StageError(Exception):
+    """Échec d'une étape de l'analyse (réponse d'erreur 400)"""
+
+# Étapes d'une analyse signalées au rappel on_stage d'analyze_location
+ANALYSIS_STAGES = ('coordinates', 'isochrone', 'population', 'households_statistical', 'households_hybrid')
+
 class PopulationAnalyzer:
-    def __init__(self, shapefile_path, raster_path, api_key):
+    def __init__(self, shapefile_path, raster_path, api_key, scheduler=None):
         """
         Initialise l'analyseur de population
         
@@ -32,14 +56,93 @@ class PopulationAnalyzer:
             shapefile_path: Chemin vers le shapefile JRC_POPULATION_2018.shp
             raster_path: Chemin vers le raster JRC_1K_POP_2018.tif
             api_key: Clé API OpenRouteService
+            scheduler: Ordonnanceur des appels externes (créé si absent)
         """
         self.api_key = api_key
         self.base_url = "https://api.openrouteservice.org"
         
+        # Quotas et files des appels OpenRouteService
+        self.scheduler = scheduler or UpstreamScheduler(UPSTREAM_CONFIG['default_timeout'])
+        for name, handler in (('ors_geocode', self._geocode_handler),
+                              ('ors_isochrones', self._isochrones_handler)):
+            upstream_config = UPSTREAM_CONFIG[name]
+            self.scheduler.register(
+                name, handler,
+                limits=limits_from_config(upstream_config),
+                concurrency=upstream_config['concurrency'],
+                max_batch=upstream_config['max_batch'],
+                max_queue=UPSTREAM_CONFIG['max_queue']
+            )
+        
         print("Chargement des données de population...")
-        # Charger le shapefile
-        self.gdf = gpd.read_file(shapefile_path)
-        print(f"✓ {len(self.gdf)} cellules de population chargées")
+        self.cell_resolution = 1000
+        shard_dir = DATA_CONFIG['shard_dir']
+        if shard_dir and os.path.exists(os.path.join(shard_dir, MANIFEST_NAME)):
+            # Grille découpée en blocs régionaux: seul l'index des blocs est
+            # chargé, les blocs le sont à la demande (LRU sous budget mémoire)
+            self.gdf = None
+            self.aggregator = None
+            self.shards = TiledDataset(
+                shard_dir,
+                cache_bytes=DATA_CONFIG['shard_memory_mb'] * 1024 * 1024,
+                max_workers=AGGREGATION_CONFIG['max_workers']
+            )
+            self.cell_resolution = self.shards.resolution
+            self.total_cells = self.shards.manifest['total_cells']
+            print(f"✓ Index de {len(self.shards.tiles)} blocs régionaux chargé ({self.total_cells} cellules)")
+        else:
+            self.shards = None
+            # Charger le shapefile
+            self.gdf = gpd.read_file(shapefile_path)
+            self.total_cells = len(self.gdf)
+            print(f"✓ {len(self.gdf)} cellules de population chargées")
+            
+            # Tableaux des cellules pour l'agrégation (identifiant de grille, population, pays)
+            cell_bounds = self.gdf.geometry.bounds
+            self.cell_ids = cell_ids_from_origins(cell_bounds['minx'], cell_bounds['miny'], self.cell_resolution)
+            del cell_bounds
+            self.cell_population = self.gdf['TOT_P_2018'].to_numpy(dtype=np.float64)
+            if 'CNTR_ID' in self.gdf.columns:
+                # Les cellules frontalières portent plusieurs codes (ex: 'BE-FR'): garder le premier
+                self.cell_countries = self.gdf['CNTR_ID'].fillna('').astype(str).str[:2].to_numpy(dtype='<U2')
+            else:
+                self.cell_countries = np.full(len(self.gdf), '', dtype='<U2')
+            self.aggregator = TiledAggregator(
+                np.asarray(self.gdf.geometry.array),
+                self.cell_ids,
+                resolution=self.cell_resolution,
+                tile_size_m=AGGREGATION_CONFIG['tile_size_m'],
+                max_workers=AGGREGATION_CONFIG['max_workers'],
+                min_parallel_km2=AGGREGATION_CONFIG['min_parallel_km2']
+            )
+        
+        # Jeux de données tuilés sélectionnables par requête (lus tuile par tuile)
+        self.default_dataset = DATA_CONFIG['dataset_version']
+        self.datasets = discover_datasets(
+            DATA_CONFIG['datasets_dir'], DATA_CONFIG['dataset_cache_mb'] * 1024 * 1024,
+            AGGREGATION_CONFIG['max_workers']
+        )
+        self.datasets.pop(self.default_dataset, None)
+        
+        # Grille précalculée des bâtiments (remplace l'appel Overpass si présente)
+        building_grid_path = DATA_CONFIG['building_grid_path']
+        if building_grid_path and os.path.exists(building_grid_path):
+            self.building_grid = BuildingGrid(building_grid_path)
+        else:
+            self.building_grid = None
+        
+        # Graphe routier local (isochrones sans appel ORS)
+        graph_path = ROUTING_CONFIG['graph_path']
+        if ROUTING_CONFIG['backend'] == 'local' and graph_path and os.path.exists(graph_path):
+            self.router = LocalRouter(
+                graph_path,
+                concave_ratio=ROUTING_CONFIG['concave_ratio'],
+                buffer_m=ROUTING_CONFIG['buffer_m'],
+                max_snap_m=ROUTING_CONFIG['max_snap_m'],
+                max_python_nodes=ROUTING_CONFIG['max_python_nodes']
+            )
+        else:
+            self.router = None
         
         # Charger le raster pour les métadonnées
         self.raster = rasterio.open(raster_path)
@@ -53,45 +156,99 @@ class PopulationAnalyzer:
             "EPSG:3035", "EPSG:4326", always_xy=True
         )
         
+        # Blocs régionaux chargés dès le démarrage
+        if self.shards is not None and DATA_CONFIG['shard_preload']:
+            self.preload_shards(DATA_CONFIG['shard_preload'])
+        if self.shards is not None and ROUTER_CONFIG['node_id'] in ROUTER_CONFIG['nodes']:
+            self.preload_owned_regions(ROUTER_CONFIG['nodes'], ROUTER_CONFIG['node_id'])
+        
+        # Regroupement des requêtes identiques en cours (géocodage, isochrone, analyse)
+        self.flights = SingleFlight()
+        
+        # Pool partagé des étapes d'analyse exécutées en parallèle
+        self.stage_pool = ThreadPoolExecutor(
+            max_workers=ANALYSIS_CONFIG['stage_workers'], thread_name_prefix='stage'
+        )
+        
         # Initialiser l'estimateur de foyers si disponible
         if HOUSEHOLD_ESTIMATOR_AVAILABLE:
-            self.household_estimator = HouseholdEstimator()
+            self.household_estimator = HouseholdEstimator(scheduler=self.scheduler)
             print("✓ Estimateur de foyers initialisé")
         else:
             self.household_estimator = None
             print("⚠️ Estimateur de foyers non disponible")
         
-    def geocode_address(self, address):
+    def geocode_address(self, address, deadline=None):
         """
         Convertit une adresse en coordonnées géographiques
         
+        Les géocodages concurrents d'une même adresse normalisée partagent
+        un seul appel à l'API, mené sous le budget du serveur: l'échéance
+        de chaque appelant ne borne que son attente.
+        
         Args:
             address: Adresse à géocoder
+            deadline: Échéance de la requête (Deadline, optionnelle)
             
         Returns:
             tuple: (longitude, latitude) ou None si erreur
         """
+        key = ('geocode', normalize_address(address))
+        coords, _ = self.flights.do(
+            key, self._fetch_geocode, address, self._shared_deadline(deadline),
+            wait_timeout=deadline_remaining(deadline), detach=deadline is not None
+        )
+        return coords
+    
+    @staticmethod
+    def _shared_deadline(deadline):
+        """
+        Échéance d'un calcul regroupé: budget du serveur (REQUEST_BUDGET)
+        
+        L'échéance du premier appelant (réductible par le client) ne doit pas
+        écourter le calcul attendu par les autres; seul un budget plus long
+        (tâches de fond) est conservé.
+        """
+        if deadline is None:
+            return None
+        return Deadline(max(ADMISSION_CONFIG['request_budget_seconds'], deadline.remaining()))
+    
+    def _fetch_geocode(self, address, deadline=None):
+        """Géocodage via l'ordonnanceur (les saturations sont propagées)"""
+        try:
+            return self.scheduler.call('ors_geocode', address, deadline=deadline_at(deadline))
+        except UpstreamUnavailableError:
+            raise
+        except UpstreamError as e:
+            print(f"Erreur géocodage: {e}")
+            return None
+    
+    def _geocode_handler(self, merge_key, addresses, timeout):
+        """Appel OpenRouteService de géocodage (une adresse par appel)"""
         url = f"{self.base_url}/geocode/search"
         params = {
             'api_key': self.api_key,
-            'text': address,
+            'text': addresses[0],
             'size': 1
         }
         
         try:
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                if data['features']:
-                    coords = data['features'][0]['geometry']['coordinates']
-                    return coords[0], coords[1]  # lon, lat
-            print(f"Erreur géocodage: {response.status_code}")
-            return None
-        except Exception as e:
-            print(f"Erreur géocodage: {e}")
-            return None
+            response = requests.get(url, params=params, timeout=timeout)
+        except requests.RequestException as e:
+            raise UpstreamError(f"Erreur géocodage: {e}")
+        
+        if response.status_code == 429:
+            raise RateLimitedError("Quota géocodage atteint", retry_after=parse_retry_after(response.headers))
+        if response.status_code != 200:
+            raise UpstreamError(f"Erreur géocodage: {response.status_code}")
+        
+        data = response.json()
+        if data['features']:
+            coords = data['features'][0]['geometry']['coordinates']
+            return [(coords[0], coords[1])]  # lon, lat
+        return [None]
     
-    def get_isochrone(self, lon, lat, time_minutes, profile="driving-car"):
+    def get_isochrone(self, lon, lat, time_minutes, profile="driving-car", deadline=None):
         """
         Obtient une isochrone (zone accessible en X minutes)
         
@@ -100,10 +257,50 @@ class PopulationAnalyzer:
             lat: Latitude
             time_minutes: Temps en minutes
             profile: Type de transport (driving-car, cycling-regular, etc.)
+            deadline: Échéance de la requête (Deadline, optionnelle)
             
         Returns:
             Polygon: Zone de l'isochrone ou None si erreur
         """
+        key = ('isochrone',) + normalize_coordinates(lon, lat) + (time_minutes, profile)
+        polygon, _ = self.flights.do(
+            key, self._fetch_isochrone, lon, lat, time_minutes, profile, self._shared_deadline(deadline),
+            wait_timeout=deadline_remaining(deadline), detach=deadline is not None
+        )
+        return polygon
+    
+    def _fetch_isochrone(self, lon, lat, time_minutes, profile, deadline=None):
+        """
+        Isochrone via le graphe routier local, sinon via l'ordonnanceur
+        
+        Les demandes en attente de même profil et même durée sont regroupées
+        en un seul appel ORS multi-locations.
+        """
+        if self.router is not None and profile in self.router.speeds:
+            try:
+                polygon = self.router.isochrone(lon, lat, time_minutes, profile, deadline)
+            except RoutingBudgetError as e:
+                print(f"{e}, repli sur ORS")
+            else:
+                if polygon is not None:
+                    return polygon
+                print(f"Point ({lon:.5f}, {lat:.5f}) hors du graphe routier local, repli sur ORS")
+        
+        try:
+            return self.scheduler.call(
+                'ors_isochrones', (lon, lat),
+                merge_key=(profile, time_minutes * 60),  # Convertir en secondes
+                deadline=deadline_at(deadline)
+            )
+        except UpstreamUnavailableError:
+            raise
+        except UpstreamError as e:
+            print(f"Erreur isochrone: {e}")
+            return None
+    
+    def _isochrones_handler(self, merge_key, locations, timeout):
+        """Appel OpenRouteService d'isochrones pour une ou plusieurs locations"""
+        profile, range_seconds = merge_key
         url = f"{self.base_url}/v2/isochrones/{profile}"
         headers = {
             'Authorization': self.api_key,
@@ -111,46 +308,173 @@ class PopulationAnalyzer:
         }
         
         body = {
-            'locations': [[lon, lat]],
-            'range': [time_minutes * 60],  # Convertir en secondes
+            'locations': [[lon, lat] for lon, lat in locations],
+            'range': [range_seconds],
             'range_type': 'time'
         }
         
         try:
-            response = requests.post(url, json=body, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                if data['features']:
-                    # Convertir les coordonnées en Polygon
-                    coords = data['features'][0]['geometry']['coordinates'][0]
-                    polygon = Polygon(coords)
-                    return polygon
-            print(f"Erreur isochrone: {response.status_code}")
-            return None
-        except Exception as e:
-            print(f"Erreur isochrone: {e}")
-            return None
+            response = requests.post(url, json=body, headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            raise UpstreamError(f"Erreur isochrone: {e}")
+        
+        if response.status_code == 429:
+            raise RateLimitedError("Quota isochrones atteint", retry_after=parse_retry_after(response.headers))
+        if response.status_code != 200:
+            raise UpstreamError(f"Erreur isochrone: {response.status_code}")
+        
+        # Chaque feature indique la location d'origine dans group_index
+        polygons = [None] * len(locations)
+        for feature in response.json().get('features', []):
+            index = feature.get('properties', {}).get('group_index', 0)
+            if index < len(polygons) and polygons[index] is None:
+                # Convertir les coordonnées en Polygon
+                coords = feature['geometry']['coordinates'][0]
+                polygons[index] = Polygon(coords)
+        return polygons
+    
+    def to_etrs(self, polygon_wgs84):
+        """Convertit une géométrie WGS84 vers ETRS89 LAEA (EPSG:3035)"""
+        return transform(self.transformer_to_etrs.transform, polygon_wgs84)
+    
+    def preload_shards(self, spec):
+        """
+        Charge à l'avance des blocs régionaux
+        
+        Args:
+            spec: Codes pays et/ou emprises WGS84 séparés par ';'
+                (ex: "FR,BE,DE;2.0,48.5,2.8,49.1")
+        """
+        countries = []
+        bboxes = []
+        for item in filter(None, (part.strip() for part in spec.split(';'))):
+            values = [value.strip() for value in item.split(',')]
+            try:
+                min_lon, min_lat, max_lon, max_lat = map(float, values)
+            except ValueError:
+                countries.extend(value.upper() for value in values if value)
+                continue
+            bboxes.append(self.to_etrs(box(min_lon, min_lat, max_lon, max_lat)).bounds)
+        
+        loaded = self.shards.preload(countries, bboxes)
+        print(f"✓ {loaded} blocs régionaux préchargés ({self.shards.stats()['cache_mb']} Mo)")
+        return loaded
+    
+    def preload_owned_regions(self, nodes, node_id):
+        """
+        Charge à l'avance les blocs régionaux des régions de ce nœud (mode multi-nœuds)
+        
+        Le routeur (router.py) envoie à chaque nœud les requêtes dont l'origine
+        est dans ses régions: les autres blocs ne sont chargés qu'en cas de
+        zone débordant sur une région voisine ou de nœud en panne.
+        
+        Args:
+            nodes: URL de tous les nœuds (ROUTER_NODES)
+            node_id: URL de ce nœud
+        """
+        if not self.shards.uses_grid(self.shards.resolution):
+            print("⚠️ Blocs hors grille ETRS89 LAEA: préchargement par région ignoré")
+            return 0
+        ring = HashRing(nodes, ROUTER_CONFIG['vnodes'])
+        bboxes = owned_tile_bboxes(self.shards.tiles, ring, node_id, ROUTER_CONFIG['region_size_m'])
+        loaded = self.shards.preload([], bboxes)
+        print(f"✓ {loaded}/{len(bboxes)} blocs des régions du nœud {node_id} préchargés")
+        return loaded
+    
+    def available_datasets(self):
+        """Noms des jeux de données disponibles (celui par défaut en premier)"""
+        return [self.default_dataset] + sorted(self.datasets)
+    
+    def _tiled_dataset(self, dataset):
+        """Jeu de données tuilé demandé, ou None pour la grille chargée en mémoire"""
+        if dataset is None or dataset == self.default_dataset:
+            return self.shards
+        if dataset not in self.datasets:
+            raise ValueError(f"Jeu de données inconnu: {dataset}")
+        return self.datasets[dataset]
+    
+    def dataset_version(self, dataset=None):
+        """
+        Version des données d'un jeu de données, pour les clés de cache
+        
+        Manifeste des tuiles (nom, version, date d'ingestion), ou
+        DATASET_VERSION pour la grille chargée en mémoire.
+        """
+        tiled = self._tiled_dataset(dataset)
+        return tiled.data_version if tiled is not None else self.default_dataset
+    
+    def dataset_resolution(self, dataset=None):
+        """Taille des cellules (m) d'un jeu de données"""
+        tiled = self._tiled_dataset(dataset)
+        return tiled.resolution if tiled is not None else self.cell_resolution
+    
+    def select_cells(self, polygon_etrs, dataset=None):
+        """
+        Sélectionne les cellules qui intersectent une zone
+        
+        Les grandes zones sont découpées en tuiles traitées en parallèle,
+        les petites restent sur le chemin direct de l'index spatial. Pour
+        un jeu de données tuilé, seules les tuiles intersectant la zone
+        sont lues.
+        
+        Args:
+            polygon_etrs: Polygon en ETRS89 LAEA (EPSG:3035)
+            dataset: Nom du jeu de données (défaut: grille JRC en mémoire)
+            
+        Returns:
+            CellSelection: Identifiants, populations et pays des cellules
+        """
+        tiled = self._tiled_dataset(dataset)
+        if tiled is not None:
+            return tiled.select(polygon_etrs)
+        
+        indices = self.aggregator.select(polygon_etrs)
+        return CellSelection(
+            cell_ids=self.cell_ids[indices],
+            population=self.cell_population[indices],
+            countries=self.cell_countries[indices]
+        )
     
-    def calculate_population_in_area(self, polygon_wgs84):
+    def calculate_population_in_area(self, polygon_wgs84, dataset=None):
         """
         Calcule la population dans une zone donnée
         
         Args:
             polygon_wgs84: Polygon en WGS84 (EPSG:4326)
+            dataset: Nom du jeu de données (défaut: grille JRC en mémoire)
             
         Returns:
             dict: Statistiques de population
         """
         # Convertir le polygon vers ETRS89 LAEA
-        polygon_etrs = transform(
-            self.transformer_to_etrs.transform,
-            polygon_wgs84
-        )
+        polygon_etrs = self.to_etrs(polygon_wgs84)
         
         # Trouver les cellules qui intersectent avec la zone
-        intersecting_cells = self.gdf[self.gdf.geometry.intersects(polygon_etrs)]
+        selection = self.select_cells(polygon_etrs, dataset)
         
-        if len(intersecting_cells) == 0:
+        return self._population_stats(selection, polygon_etrs)
+    
+    def summarize_area(self, polygon_wgs84, dataset=None, address=None):
+        """
+        Population, bâtiments de la grille et pays d'une zone (une seule sélection de cellules)
+        
+        Args:
+            polygon_wgs84: Polygon en WGS84 (EPSG:4326)
+            dataset: Nom du jeu de données (défaut: grille JRC en mémoire)
+            address: Adresse d'origine; sans adresse, pays dominant de la zone
+            
+        Returns:
+            tuple: (statistiques de population, bâtiments de la grille ou None, code pays)
+        """
+        polygon_etrs = self.to_etrs(polygon_wgs84)
+        selection = self.select_cells(polygon_etrs, dataset)
+        country_code = self._guess_country_code(address) if address else self.dominant_country(selection)
+        building_data = self.grid_building_data(selection, polygon_etrs, dataset)
+        return self._population_stats(selection, polygon_etrs), building_data, country_code
+    
+    def _population_stats(self, selection, polygon_etrs):
+        """Statistiques de population d'une sélection de cellules"""
+        if len(selection.cell_ids) == 0:
             return {
                 'total_population': 0,
                 'number_of_cells': 0,
@@ -159,7 +483,7 @@ class PopulationAnalyzer:
             }
         
         # Calculer la population totale
-        total_population = intersecting_cells['TOT_P_2018'].sum()
+        total_population = selection.population.sum()
         
         # Calculer l'aire de la zone en km²
         area_km2 = polygon_etrs.area / 1_000_000  # m² vers km²
@@ -169,22 +493,54 @@ class PopulationAnalyzer:
         
         return {
             'total_population': int(total_population),
-            'number_of_cells': len(intersecting_cells),
+            'number_of_cells': len(selection.cell_ids),
             'area_km2': round(area_km2, 2),
             'population_density': round(population_density, 2)
         }
     
-    def estimate_households_in_area(self, polygon_wgs84, country_code='FR'):
+    def estimate_households_in_area(self, polygon_wgs84, country_code='FR', selection=None, dataset=None,
+                                    deadline=None, on_stage=None):
         """
         Estime le nombre de foyers dans une zone donnée
         
+        Avec la grille précalculée des bâtiments, les comptages sont lus sur
+        les mêmes cellules que la population, sans appel réseau; sinon ils
+        proviennent d'Overpass sur la bounding box de la zone.
+        
         Args:
             polygon_wgs84: Polygon en WGS84 (EPSG:4326)
             country_code: Code pays pour le ratio foyers/habitants
+            selection: Cellules déjà sélectionnées pour cette zone (optionnel)
+            dataset: Nom du jeu de données (défaut: grille JRC en mémoire)
+            deadline: Échéance de la requête (au-delà, pas d'appel Overpass)
+            on_stage: Rappel recevant l'estimation statistique
+                ('households_statistical') avant l'ajustement par les bâtiments
             
         Returns:
             dict: Estimation des foyers
         """
+        on_stage = on_stage or (lambda stage, payload: None)
+        
+        # Obtenir les statistiques de population
+        polygon_etrs = self.to_etrs(polygon_wgs84)
+        if selection is None:
+            selection = self.select_cells(polygon_etrs, dataset)
+        pop_stats = self._population_stats(selection, polygon_etrs)
+        
+        # Estimation statistique, disponible avant le comptage des bâtiments
+        statistical = self._statistical_households(pop_stats, country_code)
+        on_stage('households_statistical', {'household_stats': statistical})
+        if statistical['method'] in ('not_available', 'no_population'):
+            return statistical
+        
+        # Bâtiments: grille précalculée si elle couvre la zone, sinon Overpass sur la bounding box
+        building_data = self.grid_building_data(selection, polygon_etrs, dataset)
+        if building_data is None:
+            building_data = self.household_estimator.get_buildings_from_osm(polygon_wgs84.bounds, deadline=deadline)
+        return self._hybrid_households(pop_stats, country_code, building_data)
+    
+    def _statistical_households(self, pop_stats, country_code):
+        """Estimation des foyers par le seul ratio statistique du pays"""
         if not self.household_estimator:
             return {
                 'total_households': 0,
@@ -194,15 +550,6 @@ class PopulationAnalyzer:
                 'error': 'Estimateur de foyers non disponible'
             }
         
-        # Calculer le bounding box pour OSM
-        coords = list(polygon_wgs84.exterior.coords)
-        lons = [coord[0] for coord in coords]
-        lats = [coord[1] for coord in coords]
-        bbox = (min(lons), min(lats), max(lons), max(lats))
-        
-        # Obtenir les statistiques de population
-        pop_stats = self.calculate_population_in_area(polygon_wgs84)
-        
         if pop_stats['total_population'] == 0:
             return {
                 'total_households': 0,
@@ -212,11 +559,23 @@ class PopulationAnalyzer:
                 'population_stats': pop_stats
             }
         
-        # Estimation des foyers
+        households = self.household_estimator.estimate_households_from_population(
+            pop_stats['total_population'], country_code
+        )
+        return {
+            'total_households': households,
+            'household_density': round(households / pop_stats['area_km2'], 2) if pop_stats['area_km2'] > 0 else 0,
+            'household_ratio': self.household_estimator.get_household_ratio(country_code),
+            'method': 'statistical_ratio',
+            'population_stats': pop_stats
+        }
+    
+    def _hybrid_households(self, pop_stats, country_code, building_data):
+        """Estimation des foyers ajustée par les comptages de bâtiments (None: statistique seule)"""
         household_result = self.household_estimator.estimate_households_advanced(
             pop_stats['total_population'], 
             country_code,
-            bbox
+            building_data=building_data
         )
         
         # Calculer la densité de foyers
@@ -231,54 +590,143 @@ class PopulationAnalyzer:
             'osm_data': household_result.get('osm_data')
         }
     
-    def analyze_location(self, address, time_minutes=10, profile="driving-car"):
+    def _uses_building_grid(self, dataset=None):
+        """Vrai si la grille des bâtiments suit la grille des cellules du jeu de données"""
+        if self.building_grid is None:
+            return False
+        tiled = self._tiled_dataset(dataset)
+        return tiled is None or tiled.uses_grid(self.building_grid.resolution)
+    
+    def grid_building_data(self, selection, polygon_etrs, dataset=None):
+        """
+        Comptages de bâtiments des cellules depuis la grille précalculée
+        
+        Returns:
+            dict: Comptages, ou None si la grille est absente, ne suit pas la
+                grille des cellules du jeu de données ou ne couvre pas toute
+                la zone (extrait OSM d'une autre région)
+        """
+        if not self._uses_building_grid(dataset) or not self.building_grid.covers(polygon_etrs):
+            return None
+        return self.building_grid.summarize(selection.cell_ids)
+    
+    def analyze_location(self, address, time_minutes=10, profile="driving-car", dataset=None,
+                         deadline=None, on_stage=None, coordinates=None):
         """
         Analyse complète d'une localisation
         
+        Les analyses concurrentes de même adresse normalisée et mêmes
+        paramètres attendent un seul calcul et en reçoivent chacune une copie.
+        Le calcul regroupé suit le budget du serveur; l'échéance de chaque
+        appelant ne borne que son attente (504 pour lui seul).
+        
         Args:
             address: Adresse à analyser
             time_minutes: Temps de trajet en minutes
             profile: Type de transport
+            dataset: Nom du jeu de données (défaut: grille JRC en mémoire)
+            deadline: Échéance de bout en bout (Deadline): transmise aux appels
+                externes et vérifiée entre les étapes
+            on_stage: Rappel on_stage(étape, résultats partiels) appelé à la fin de
+                chaque étape (ANALYSIS_STAGES); l'analyse n'est alors pas regroupée
+                avec les analyses identiques en cours
+            coordinates: (lon, lat) déjà géocodées (par le routeur multi-nœuds):
+                l'étape de géocodage est alors sautée
             
         Returns:
             dict: Résultats de l'analyse
         """
+        dataset = dataset or self.default_dataset
+        if on_stage is not None:
+            return self._analyze_location(address, time_minutes, profile, dataset, deadline, on_stage, coordinates)
+        key = ('analyze', normalize_address(address), time_minutes, profile, dataset)
+        try:
+            results, _ = self.flights.do(
+                key, self._analyze_location, address, time_minutes, profile, dataset,
+                self._shared_deadline(deadline), None, coordinates,
+                wait_timeout=deadline_remaining(deadline), copy_result=True, detach=deadline is not None
+            )
+        except TimeoutError:
+            return self._timeout_result()
+        # Adresse telle que saisie par cet appelant (la clé est normalisée)
+        if 'address' in results:
+            results['address'] = address
+        return results
+    
+    def _analyze_location(self, address, time_minutes, profile, dataset, deadline=None, on_stage=None,
+                          coordinates=None):
+        """Enchaîne les étapes de l'analyse (géocodage, isochrone, population, foyers)"""
+        try:
+            return self._run_analysis(address, time_minutes, profile, dataset, deadline, on_stage, coordinates)
+        except UpstreamUnavailableError as e:
+            return self._unavailable_result(e)
+        except TimeoutError as e:
+            print(f"⚠️ Analyse abandonnée: {e}")
+            return self._timeout_result()
+    
+    @staticmethod
+    def _unavailable_result(error):
+        print(f"⚠️ Service {error.upstream} saturé: {error}")
+        return {
+            "error": f"Service {error.upstream} momentanément saturé, réessayez plus tard",
+            "status": 503,
+            "retry_after": error.retry_after
+        }
+    
+    @staticmethod
+    def _timeout_result():
+        return {
+            "error": "Délai de traitement dépassé",
+            "status": 504
+        }
+    
+    def _run_analysis(self, address, time_minutes, profile, dataset, deadline=None, on_stage=None,
+                      coordinates=None):
+        """
+        Étapes de l'analyse (abandonnées dès que l'échéance est dépassée)
+        
+        Les étapes s'exécutent selon leurs dépendances: le pays est déterminé
+        pendant le géocodage, et les bâtiments (Overpass) sont récupérés
+        pendant l'agrégation des cellules. Sans bâtiments, l'estimation des
+        foyers reste statistique.
+        """
         print(f"\n🔍 Analyse de: {address}")
         print(f"⏱️  Zone de {time_minutes} minutes en {profile}")
         
-        # 1. Géocoder l'adresse
-        coords = self.geocode_address(address)
-        if not coords:
-            return {"error": "Impossible de géocoder l'adresse"}
-        
-        lon, lat = coords
-        print(f"📍 Coordonnées: {lat:.6f}, {lon:.6f}")
-        
-        # 2. Obtenir l'isochrone
-        isochrone = self.get_isochrone(lon, lat, time_minutes, profile)
-        if not isochrone:
-            return {"error": "Impossible d'obtenir l'isochrone"}
-        
-        print(f"🗺️  Isochrone obtenue")
+        graph = StageGraph(self.stage_pool)
+        if coordinates is not None:
+            graph.add('coordinates', lambda: tuple(coordinates))
+        else:
+            graph.add('coordinates', lambda: self._geocode_stage(address, deadline))
+        graph.add('country', lambda: self._guess_country_code(address), fallback='FR')
+        graph.add('isochrone', lambda coordinates: self._isochrone_stage(coordinates, time_minutes, profile, deadline),
+                  after=('coordinates',))
+        self._add_area_stages(graph, dataset, deadline)
         
-        # 3. Calculer la population
-        stats = self.calculate_population_in_area(isochrone)
+        try:
+            stages = graph.run(self._stage_events(on_stage))
+        except _StageError as e:
+            return {"error": str(e)}
+        print(f"⏱️  Étapes: {graph.timings}")
         
-        # 4. Estimer les foyers
-        # Déterminer le code pays basé sur l'adresse (approximation simple)
-        country_code = self._guess_country_code(address)
-        household_stats = self.estimate_households_in_area(isochrone, country_code)
+        lon, lat = stages['coordinates']
+        isochrone = stages['isochrone']
+        stats = stages['population'][2]
+        household_stats = stages['households_hybrid']
+        country_code = stages['country']
         
-        # 5. Résultats
+        # Résultats
         results = {
             'address': address,
             'coordinates': {'lat': lat, 'lon': lon},
             'time_minutes': time_minutes,
             'profile': profile,
+            'dataset': dataset,
             'isochrone_geometry': list(isochrone.exterior.coords),
             'population_stats': stats,
             'household_stats': household_stats,
-            'country_code': country_code
+            'country_code': country_code,
+            'degraded': self._degraded_stages(graph, stages)
         }
         
         print(f"👥 Population totale: {stats['total_population']:,} habitants")
@@ -291,6 +739,411 @@ class PopulationAnalyzer:
         
         return results
     
+    def _add_area_stages(self, graph, dataset, deadline=None, use_overpass=True):
+        """
+        Étapes communes à partir de la zone (étape 'isochrone'): population,
+        bâtiments et foyers
+        
+        Sans étape 'country', le pays est celui qui regroupe le plus
+        d'habitants parmi les cellules de la zone. Sans grille de bâtiments
+        et avec use_overpass=False, l'estimation des foyers reste statistique;
+        hors de l'emprise de la grille, elle est de plus signalée dégradée.
+        """
+        graph.add('population', lambda isochrone: self._population_stage(isochrone, dataset, deadline),
+                  after=('isochrone',))
+        if 'country' not in graph.stages:
+            graph.add('country', lambda population: self.dominant_country(population[0]),
+                      after=('population',), fallback='FR')
+        
+        # Bâtiments: grille précalculée (après la sélection des cellules),
+        # sinon Overpass sur la bounding box de la zone
+        if not self.household_estimator:
+            graph.add('buildings', lambda: None)
+        elif self._uses_building_grid(dataset):
+            graph.add('buildings', lambda isochrone, population: self._grid_buildings_stage(
+                isochrone, population, dataset, deadline, use_overpass), after=('isochrone', 'population'),
+                fallback=None)
+        elif use_overpass:
+            graph.add('buildings', lambda isochrone: self.household_estimator.get_buildings_from_osm(
+                isochrone.bounds, deadline=deadline), after=('isochrone',), fallback=None)
+        else:
+            graph.add('buildings', lambda: None)
+        
+        graph.add('households_statistical', lambda population, country: self._statistical_households(population[2], country),
+                  after=('population', 'country'))
+        graph.add('households_hybrid', self._households_stage,
+                  after=('population', 'country', 'households_statistical', 'buildings'))
+    
+    @staticmethod
+    def _degraded_stages(graph, stages):
+        """Étapes remplacées par leur repli, ou bâtiments indisponibles (résultat à ne pas mettre en cache)"""
+        degraded = set(graph.failed)
+        buildings = stages.get('buildings')
+        if buildings and buildings.get('error'):
+            degraded.add('buildings')
+        return sorted(degraded)
+    
+    @staticmethod
+    def _stage_events(on_stage):
+        """Rappel de fin d'étape du graphe traduisant les étapes en événements on_stage"""
+        done = {}
+        
+        def on_done(stage, result):
+            done[stage] = result
+            if stage == 'coordinates':
+                print(f"📍 Coordonnées: {result[1]:.6f}, {result[0]:.6f}")
+                if on_stage:
+                    on_stage(stage, {'coordinates': {'lat': result[1], 'lon': result[0]}})
+            elif stage == 'isochrone':
+                print(f"🗺️  Isochrone obtenue")
+                if on_stage:
+                    on_stage(stage, {'isochrone_geometry': list(result.exterior.coords)})
+            elif not on_stage:
+                return
+            elif stage == 'population':
+                on_stage(stage, {'population_stats': result[2]})
+            elif stage == 'households_statistical':
+                on_stage(stage, {'household_stats': result})
+            elif stage == 'households_hybrid':
+                on_stage(stage, {'household_stats': result, 'country_code': done['country']})
+        
+        return on_done
+    
+    def dominant_country(self, selection):
+        """Code pays regroupant le plus d'habitants parmi des cellules ('FR' sans pays connu)"""
+        known = selection.countries != ''
+        if not known.any():
+            return 'FR'
+        countries, inverse = np.unique(selection.countries[known], return_inverse=True)
+        totals = np.bincount(inverse, weights=selection.population[known])
+        return str(countries[int(np.argmax(totals))])
+    
+    def analyze_point(self, lon, lat, time_minutes=10, profile="driving-car", dataset=None, deadline=None):
+        """
+        Analyse à partir de coordonnées (sans géocodage)
+        
+        Args:
+            lon: Longitude
+            lat: Latitude
+            time_minutes: Temps de trajet en minutes
+            profile: Type de transport
+            dataset: Nom du jeu de données (défaut: grille JRC en mémoire)
+            deadline: Échéance de bout en bout (Deadline, optionnelle)
+            
+        Returns:
+            dict: Résultats de l'analyse (même forme qu'analyze_location, sans adresse)
+        """
+        dataset = dataset or self.default_dataset
+        print(f"\n🔍 Analyse du point: {lat:.6f}, {lon:.6f} ({time_minutes} min, {profile})")
+        
+        graph = StageGraph(self.stage_pool)
+        graph.add('isochrone', lambda: self._isochrone_stage((lon, lat), time_minutes, profile, deadline))
+        self._add_area_stages(graph, dataset, deadline)
+        try:
+            stages = graph.run(self._stage_events(None))
+        except _StageError as e:
+            return {"error": str(e)}
+        except UpstreamUnavailableError as e:
+            return self._unavailable_result(e)
+        except TimeoutError as e:
+            print(f"⚠️ Analyse abandonnée: {e}")
+            return self._timeout_result()
+        
+        return {
+            'address': None,
+            'coordinates': {'lat': lat, 'lon': lon},
+            'time_minutes': time_minutes,
+            'profile': profile,
+            'dataset': dataset,
+            'isochrone_geometry': list(stages['isochrone'].exterior.coords),
+            'population_stats': stages['population'][2],
+            'household_stats': stages['households_hybrid'],
+            'country_code': stages['country'],
+            'degraded': self._degraded_stages(graph, stages)
+        }
+    
+    def analyze_polygon(self, polygon_wgs84, dataset=None, country_code=None, deadline=None):
+        """
+        Population et foyers d'une zone fournie (sans géocodage, isochrone ni
+        appel Overpass: sans grille de bâtiments, foyers statistiques)
+        
+        Args:
+            polygon_wgs84: Polygon ou MultiPolygon WGS84 (trous compris)
+            dataset: Nom du jeu de données (défaut: grille JRC en mémoire)
+            country_code: Code pays des ratios de foyers (défaut: pays dominant de la zone)
+            deadline: Échéance de bout en bout (Deadline, optionnelle)
+            
+        Returns:
+            dict: Statistiques de population et de foyers
+        """
+        dataset = dataset or self.default_dataset
+        graph = StageGraph(self.stage_pool)
+        graph.add('isochrone', lambda: polygon_wgs84)
+        if country_code:
+            graph.add('country', lambda: country_code)
+        self._add_area_stages(graph, dataset, deadline, use_overpass=False)
+        try:
+            stages = graph.run()
+        except UpstreamUnavailableError as e:
+            return self._unavailable_result(e)
+        except TimeoutError as e:
+            print(f"⚠️ Analyse abandonnée: {e}")
+            return self._timeout_result()
+        
+        return {
+            'dataset': dataset,
+            'country_code': stages['country'],
+            'population_stats': stages['population'][2],
+            'household_stats': stages['households_hybrid']
+        }
+    
+    def cell_breakdown(self, polygon_wgs84, dataset=None):
+        """
+        Détail par cellule d'une zone
+        
+        Args:
+            polygon_wgs84: Polygon ou MultiPolygon WGS84
+            dataset: Nom du jeu de données (défaut: grille JRC en mémoire)
+            
+        Returns:
+            dict: Tableaux alignés cell_id, population, country, coverage
+                (part de la cellule dans la zone) et households
+        """
+        polygon_etrs = self.to_etrs(polygon_wgs84)
+        selection = self.select_cells(polygon_etrs, dataset)
+        tiled = self._tiled_dataset(dataset)
+        if tiled is not None:
+            coverage = tiled.coverage(selection.cell_ids, polygon_etrs)
+        else:
+            coverage = cell_coverage(selection.cell_ids, self.cell_resolution, polygon_etrs)
+        return {
+            'cell_id': selection.cell_ids,
+            'population': selection.population,
+            'country': selection.countries,
+            'coverage': coverage,
+            'households': self._cell_households(selection.population, selection.countries)
+        }
+    
+    def point_cell_breakdown(self, lon, lat, time_minutes=10, profile="driving-car", dataset=None,
+                             deadline=None):
+        """
+        Détail par cellule de l'isochrone d'un point (voir cell_breakdown)
+        
+        Returns:
+            dict: {'cells': tableaux par cellule}, ou erreur
+        """
+        try:
+            isochrone = self._isochrone_stage((lon, lat), time_minutes, profile, deadline)
+        except _StageError as e:
+            return {"error": str(e)}
+        except UpstreamUnavailableError as e:
+            return self._unavailable_result(e)
+        except TimeoutError as e:
+            print(f"⚠️ Analyse abandonnée: {e}")
+            return self._timeout_result()
+        return {'cells': self.cell_breakdown(isochrone, dataset)}
+    
+    def _geocode_stage(self, address, deadline=None):
+        """Étape de géocodage: (lon, lat)"""
+        if deadline:
+            deadline.check('géocodage')
+        coords = self.geocode_address(address, deadline)
+        if not coords:
+            if deadline:
+                deadline.check('géocodage')  # Échec dû à l'échéance: 504
+            raise _StageError("Impossible de géocoder l'adresse")
+        return coords
+    
+    def _isochrone_stage(self, coordinates, time_minutes, profile, deadline=None):
+        """Étape d'isochrone: Polygon WGS84"""
+        if deadline:
+            deadline.check('isochrone')
+        isochrone = self.get_isochrone(coordinates[0], coordinates[1], time_minutes, profile, deadline)
+        if not isochrone:
+            if deadline:
+                deadline.check('isochrone')
+            raise _StageError("Impossible d'obtenir l'isochrone")
+        return isochrone
+    
+    def _population_stage(self, isochrone, dataset, deadline=None):
+        """Étape de population (une seule sélection de cellules pour toutes les étapes)"""
+        if deadline:
+            deadline.check('population')
+        polygon_etrs = self.to_etrs(isochrone)
+        selection = self.select_cells(polygon_etrs, dataset)
+        return selection, polygon_etrs, self._population_stats(selection, polygon_etrs)
+    
+    def _grid_buildings_stage(self, isochrone, population, dataset, deadline=None, use_overpass=True):
+        """
+        Étape des bâtiments avec grille: hors de son emprise, Overpass sur la
+        bounding box, ou sans Overpass comptage vide en erreur (résultat dégradé)
+        """
+        building_data = self.grid_building_data(population[0], population[1], dataset)
+        if building_data is not None:
+            return building_data
+        print("⚠️ Zone hors de l'emprise de la grille des bâtiments")
+        if use_overpass:
+            return self.household_estimator.get_buildings_from_osm(isochrone.bounds, deadline=deadline)
+        return self.household_estimator._empty_buildings("Zone hors de l'emprise de la grille des bâtiments")
+    
+    def _households_stage(self, population, country, households_statistical, buildings):
+        """Étape des foyers ajustés par les bâtiments (statistique seule sans bâtiments)"""
+        if households_statistical['method'] in ('not_available', 'no_population'):
+            return households_statistical
+        return self._hybrid_households(population[2], country, buildings)
+    
+    def analyze_catchment_overlap(self, sites, time_minutes=10, profile="driving-car", dataset=None,
+                                  deadline=None):
+        """
+        Analyse le recouvrement des zones de chalandise de plusieurs sites
+        
+        Chaque zone est représentée par l'ensemble compressé des identifiants
+        des cellules retenues par select_cells (même sélection que
+        calculate_population_in_area); recouvrements, parts uniques et union
+        sont calculés par algèbre d'ensembles, sans nouvelle intersection
+        de polygones.
+        
+        Args:
+            sites: Liste de sites {'address': ...} ou {'lat': ..., 'lon': ...},
+                avec éventuellement 'time_minutes' et 'profile' propres
+            time_minutes: Temps de trajet par défaut
+            profile: Type de transport par défaut
+            dataset: Nom du jeu de données (défaut: grille JRC en mémoire)
+            deadline: Échéance de bout en bout (Deadline, optionnelle)
+            
+        Returns:
+            dict: Population et foyers par site, par paire, uniques et union
+        """
+        print(f"\n🔍 Recouvrement de {len(sites)} sites")
+        
+        # 1. Localiser les sites et obtenir leurs isochrones en parallèle
+        # (l'ordonnanceur regroupe les isochrones compatibles en un seul appel)
+        try:
+            with ThreadPoolExecutor(max_workers=min(len(sites), 8)) as pool:
+                resolved = list(pool.map(
+                    lambda site: self._resolve_site(site, time_minutes, profile, deadline), sites
+                ))
+            if deadline:
+                deadline.check('population')
+        except UpstreamUnavailableError as e:
+            return self._unavailable_result(e)
+        except TimeoutError as e:
+            print(f"⚠️ Recouvrement abandonné: {e}")
+            return self._timeout_result()
+        
+        for index, site in enumerate(resolved):
+            if 'error' in site:
+                return {"error": f"Site {index + 1}: {site['error']}"}
+        
+        # 2. Ensemble des cellules de chaque zone
+        selections = [self.select_cells(self.to_etrs(site['isochrone']), dataset) for site in resolved]
+        bitsets = [CellBitset.from_ids(selection.cell_ids) for selection in selections]
+        
+        # Table identifiant -> population/pays commune à tous les ensembles
+        all_ids = np.concatenate([selection.cell_ids for selection in selections])
+        lookup_ids, first = np.unique(all_ids, return_index=True)
+        lookup_population = np.concatenate([selection.population for selection in selections])[first]
+        lookup_countries = np.concatenate([selection.countries for selection in selections])[first]
+        # Foyers par cellule estimés une seule fois pour tous les ensembles
+        lookup_households = self._cell_households(lookup_population, lookup_countries)
+        
+        def summarize(bitset):
+            ids = bitset.to_ids()
+            positions = np.searchsorted(lookup_ids, ids)
+            return {
+                'population': int(lookup_population[positions].sum()),
+                'households': int(round(lookup_households[positions].sum())),
+                'cells_count': len(ids)
+            }
+        
+        # 3. Unions des autres sites (préfixes/suffixes) pour les parts uniques
+        count = len(bitsets)
+        prefix = [CellBitset()]
+        for bitset in bitsets[:-1]:
+            prefix.append(prefix[-1] | bitset)
+        suffix = [CellBitset()]
+        for bitset in reversed(bitsets[1:]):
+            suffix.append(suffix[-1] | bitset)
+        suffix.reverse()
+        
+        site_results = []
+        for index, (site, bitset) in enumerate(zip(resolved, bitsets)):
+            others = prefix[index] | suffix[index]
+            summary = summarize(bitset)
+            unique = summarize(bitset - others)
+            site_results.append({
+                'address': site.get('address'),
+                'coordinates': site['coordinates'],
+                'time_minutes': site['time_minutes'],
+                'profile': site['profile'],
+                'population': summary['population'],
+                'households': summary['households'],
+                'cells_count': summary['cells_count'],
+                'unique_population': unique['population'],
+                'unique_households': unique['households'],
+                'unique_cells_count': unique['cells_count']
+            })
+        
+        pairwise = []
+        for i in range(count):
+            for j in range(i + 1, count):
+                shared = summarize(bitsets[i] & bitsets[j])
+                pairwise.append({
+                    'sites': [i, j],
+                    'population': shared['population'],
+                    'households': shared['households'],
+                    'cells_count': shared['cells_count'],
+                    'share_of_first': round(shared['population'] / site_results[i]['population'], 4) if site_results[i]['population'] else 0,
+                    'share_of_second': round(shared['population'] / site_results[j]['population'], 4) if site_results[j]['population'] else 0
+                })
+        
+        union = prefix[-1] | bitsets[-1]
+        results = {
+            'dataset': dataset or self.default_dataset,
+            'sites': site_results,
+            'pairwise': pairwise,
+            'union': summarize(union)
+        }
+        
+        print(f"👥 Population totale (union): {results['union']['population']:,} habitants")
+        return results
+    
+    def _resolve_site(self, site, time_minutes, profile, deadline=None):
+        """Coordonnées et isochrone d'un site (adresse géocodée ou coordonnées)"""
+        site_time = site.get('time_minutes', time_minutes)
+        site_profile = site.get('profile', profile)
+        address = site.get('address')
+        if address:
+            coords = self.geocode_address(address, deadline)
+            if not coords:
+                return {"error": "Impossible de géocoder l'adresse"}
+            lon, lat = coords
+        else:
+            lon, lat = site['lon'], site['lat']
+        
+        if deadline:
+            deadline.check('isochrone')
+        isochrone = self.get_isochrone(lon, lat, site_time, site_profile, deadline)
+        if not isochrone:
+            return {"error": "Impossible d'obtenir l'isochrone"}
+        
+        return {
+            'address': address,
+            'coordinates': {'lat': lat, 'lon': lon},
+            'time_minutes': site_time,
+            'profile': site_profile,
+            'isochrone': isochrone
+        }
+    
+    def _cell_households(self, population, countries):
+        """Foyers estimés par cellule (ratio du pays de chaque cellule, non arrondis)"""
+        if not self.household_estimator:
+            return np.zeros(len(population), dtype=np.float64)
+        estimator = self.household_estimator
+        return estimator.estimate_households_batch(
+            population, estimator.encode_countries(countries), rounded=False
+        )['households']
+    
     def _guess_country_code(self, address):
         """
         Devine le code pays basé sur l'adresse (approximation simple)
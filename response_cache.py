@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Cache des réponses d'analyse
+Niveau mémoire (LRU) et niveau disque (un fichier JSON par entrée), avec
+ETags forts pour les requêtes conditionnelles
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from singleflight import normalize_address, normalize_coordinates
+
+
+def analysis_cache_key(time_minutes: int, profile: str, dataset_version: str,
+                       address: Optional[str] = None,
+                       coordinates: Optional[Tuple[float, float]] = None,
+                       **extra) -> str:
+    """
+    Clé normalisée d'une analyse
+
+    Args:
+        time_minutes: Temps de trajet
+        profile: Type de transport
+        dataset_version: Version des données de population (change à chaque
+            nouvelle ingestion, voir PopulationAnalyzer.dataset_version)
+        address: Adresse (normalisée: casse, espaces)
+        coordinates: (lon, lat), arrondies à 6 décimales
+        **extra: Autres paramètres qui modifient la réponse
+
+    Returns:
+        str: Empreinte SHA-256 de la clé
+    """
+    parts = {
+        'time_minutes': time_minutes,
+        'profile': profile,
+        'dataset': dataset_version
+    }
+    if address is not None:
+        parts['address'] = normalize_address(address)
+    if coordinates is not None:
+        parts['coordinates'] = normalize_coordinates(*coordinates)
+    parts.update(extra)
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, disk_dir: Optional[str] = None,
+                 ttl_seconds: int = 7 * 86400, max_disk_entries: int = 20000):
+        """
+        Initialise le cache
+
+        Args:
+            max_entries: Nombre d'entrées gardées en mémoire
+            disk_dir: Répertoire du niveau disque (None pour le désactiver)
+            ttl_seconds: Durée de validité d'une entrée
+            max_disk_entries: Nombre maximal de fichiers sur disque
+        """
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        """ETag fort (non quoté) d'un corps de réponse"""
+        return hashlib.sha256(body).hexdigest()[:32]
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Cherche une entrée (mémoire puis disque)
+
+        Returns:
+            tuple: (corps, etag) ou None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                body, etag, created = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.hits['memory'] += 1
+                    return body, etag
+                del self._memory[key]
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits['disk'] += 1
+            self._store_memory(key, entry)
+        body, etag, _ = entry
+        return body, etag
+
+    def put(self, key: str, body: bytes) -> str:
+        """Enregistre un corps de réponse et retourne son ETag"""
+        etag = self.make_etag(body)
+        entry = (body, etag, time.time())
+        with self._lock:
+            self._store_memory(key, entry)
+        self._write_disk(key, entry)
+        return etag
+
+    def _store_memory(self, key: str, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f'{key}.json')
+
+    def _read_disk(self, key: str, now: float):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            body, etag, created = record['body'].encode('utf-8'), str(record['etag']), float(record['created'])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Entrée illisible ou incomplète: absente du cache (réécrite au prochain calcul)
+            return None
+        if now - created > self.ttl_seconds:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return body, etag, created
+
+    def _write_disk(self, key: str, entry):
+        if not self.disk_dir:
+            return
+        body, etag, created = entry
+        record = {'etag': etag, 'created': created, 'body': body.decode('utf-8')}
+        try:
+            # Écriture atomique: fichier temporaire puis renommage
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            print(f"Erreur écriture cache disque: {e}")
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 100 == 0
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Supprime les fichiers les plus anciens au-delà de max_disk_entries"""
+        try:
+            paths = [
+                os.path.join(self.disk_dir, name)
+                for name in os.listdir(self.disk_dir) if name.endswith('.json')
+            ]
+            if len(paths) <= self.max_disk_entries:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - self.max_disk_entries]:
+                os.remove(path)
+        except OSError as e:
+            print(f"Erreur nettoyage cache disque: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'disk_enabled': bool(self.disk_dir),
+                'hits': dict(self.hits),
+                'misses': self.misses
+            }
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Routeur multi-nœuds par affinité régionale
+Envoie chaque requête au nœud propriétaire de la région de son point
+d'origine (hachage cohérent avec nœuds virtuels), pour que chaque nœud ne
+charge et ne garde en cache que les données de ses régions
+
+Usage:
+    ROUTER_NODES=http://127.0.0.1:8081,http://127.0.0.1:8082 python router.py
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+from flask import Flask, Response, jsonify, request
+from shapely import wkb
+from shapely.geometry import shape
+
+from hash_ring import HashRing, region_of
+from singleflight import normalize_address
+from config import ROUTER_CONFIG
+
+# En-têtes de connexion à ne pas transmettre
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host', 'content-length'
+}
+
+
+class Router:
+    def __init__(self, nodes: List[str], vnodes: int = 64, region_size_m: float = 100000,
+                 token: str = '', timeout: float = 60, geocode_cache_size: int = 10000):
+        """
+        Initialise le routeur
+
+        Args:
+            nodes: URL des nœuds API
+            vnodes: Positions par nœud sur l'anneau
+            region_size_m: Taille des régions (m, alignée sur les blocs régionaux)
+            token: Secret partagé avec les nœuds (X-Router-Token), requis pour
+                faire géocoder les adresses par les nœuds
+            timeout: Timeout des requêtes transmises (secondes)
+            geocode_cache_size: Nombre d'adresses géocodées gardées en mémoire
+        """
+        self.ring = HashRing(nodes, vnodes)
+        self.region_size_m = region_size_m
+        self.token = token
+        self.timeout = timeout
+        self.geocode_cache_size = geocode_cache_size
+        self._geocoded = OrderedDict()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.routed = {node: 0 for node in nodes}
+        self.failovers = 0
+
+    def geocode(self, address: str) -> Optional[Tuple[float, float]]:
+        """
+        Coordonnées (lon, lat) d'une adresse, en cache LRU (None si échec)
+
+        Le routeur n'appelle pas OpenRouteService lui-même: il demande le
+        géocodage (GET /geocode) au nœud associé à l'adresse sur l'anneau,
+        dont l'ordonnanceur applique le quota. Une même adresse est donc
+        toujours géocodée par le même nœud.
+        """
+        key = normalize_address(address)
+        with self._lock:
+            if key in self._geocoded:
+                self._geocoded.move_to_end(key)
+                return self._geocoded[key]
+        if not self.token:
+            return None
+
+        coordinates = None
+        for node in self.ring.nodes_for(f"address:{key}"):
+            try:
+                response = requests.get(
+                    f"{node.rstrip('/')}/geocode", params={'address': address},
+                    headers={'X-Router-Token': self.token}, timeout=10
+                )
+            except requests.RequestException:
+                with self._lock:
+                    self.failovers += 1
+                continue
+            if response.status_code == 200:
+                try:
+                    data = response.json()
+                    coordinates = float(data['lon']), float(data['lat'])
+                except (ValueError, KeyError, TypeError):
+                    pass
+            # Adresse introuvable ou nœud saturé: pas de nouvel essai ailleurs
+            break
+        if coordinates is None:
+            return None
+        lon, lat = coordinates
+        with self._lock:
+            self._geocoded[key] = (lon, lat)
+            if len(self._geocoded) > self.geocode_cache_size:
+                self._geocoded.popitem(last=False)
+        return lon, lat
+
+    def origin(self, path: str, data: Dict) -> Tuple[Optional[str], Optional[Tuple[float, float]]]:
+        """
+        Clé de routage et coordonnées résolues d'une requête
+
+        Returns:
+            tuple: (clé, (lon, lat) géocodées par le routeur ou None)
+        """
+        if path in ('analyze', 'analyze/stream', 'jobs') and isinstance(data.get('address'), str):
+            coordinates = self.geocode(data['address'])
+            if coordinates is None:
+                return f"address:{normalize_address(data['address'])}", None
+            return region_of(*coordinates, self.region_size_m), coordinates
+
+        if path == 'population/point':
+            try:
+                return region_of(float(data['lon']), float(data['lat']), self.region_size_m), None
+            except (KeyError, TypeError, ValueError):
+                return None, None
+
+        if path == 'population/polygon':
+            raw = data.get('geometry')
+            if raw is None:
+                raw = (data.get('geometries') or data.get('features') or [None])[0]
+            try:
+                if isinstance(raw, dict) and raw.get('type') == 'Feature':
+                    raw = raw['geometry']
+                geometry = wkb.loads(bytes.fromhex(raw)) if isinstance(raw, str) else shape(raw)
+                point = geometry.representative_point()
+                return region_of(point.x, point.y, self.region_size_m), None
+            except Exception:
+                return None, None
+
+        if path == 'catchments/overlap':
+            sites = data.get('sites') or [{}]
+            first = sites[0] if isinstance(sites[0], dict) else {}
+            if isinstance(first.get('address'), str):
+                coordinates = self.geocode(first['address'])
+                if coordinates is not None:
+                    return region_of(*coordinates, self.region_size_m), None
+            if all(isinstance(first.get(key), (int, float)) for key in ('lat', 'lon')):
+                return region_of(first['lon'], first['lat'], self.region_size_m), None
+        return None, None
+
+    def job_node(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def remember_job(self, job_id: str, node: str):
+        with self._lock:
+            self._jobs[job_id] = node
+            self._jobs.move_to_end(job_id)
+            if len(self._jobs) > self.geocode_cache_size:
+                self._jobs.popitem(last=False)
+
+    def forward(self, node: str, path: str, headers: Dict, body: bytes) -> requests.Response:
+        return requests.request(
+            request.method, f"{node.rstrip('/')}/{path}",
+            params=request.args, data=body, headers=headers,
+            stream=True, timeout=self.timeout, allow_redirects=False
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'nodes': list(self.ring.nodes),
+                'vnodes': self.ring.vnodes,
+                'region_size_m': self.region_size_m,
+                'routed': dict(self.routed),
+                'failovers': self.failovers,
+                'geocoded_addresses': len(self._geocoded),
+                'known_jobs': len(self._jobs)
+            }
+
+
+app = Flask(__name__)
+router = Router(
+    ROUTER_CONFIG['nodes'],
+    vnodes=ROUTER_CONFIG['vnodes'],
+    region_size_m=ROUTER_CONFIG['region_size_m'],
+    token=ROUTER_CONFIG['token'],
+    timeout=ROUTER_CONFIG['timeout_seconds']
+)
+
+
+@app.route('/router/stats')
+def router_stats():
+    """Statistiques du routeur"""
+    return jsonify(router.stats())
+
+
+@app.route('/', defaults={'path': ''}, methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+@app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+def route(path):
+    """Transmet la requête au nœud propriétaire de sa région (nœud suivant si injoignable)"""
+    if not router.ring.nodes:
+        return jsonify({'error': 'Aucun nœud configuré (ROUTER_NODES)'}), 503
+
+    body = request.get_data()
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+    key, coordinates = router.origin(path.rstrip('/'), data if isinstance(data, dict) else {})
+
+    headers = {name: value for name, value in request.headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+    if coordinates is not None:
+        headers['X-Resolved-Coordinates'] = f"{coordinates[0]},{coordinates[1]}"
+        headers['X-Router-Token'] = router.token
+
+    # Tâches: nœud qui a créé la tâche, sinon tous les nœuds dans l'ordre de l'anneau
+    candidates = list(router.ring.nodes_for(key or path))
+    if path.startswith('jobs/'):
+        owner = router.job_node(path[len('jobs/'):])
+        if owner in candidates:
+            candidates.remove(owner)
+            candidates.insert(0, owner)
+
+    upstream = None
+    for attempt, node in enumerate(candidates):
+        try:
+            upstream = router.forward(node, path, headers, body)
+        except requests.RequestException:
+            with router._lock:
+                router.failovers += 1
+            continue
+        if path.startswith('jobs/') and upstream.status_code == 404 and attempt < len(candidates) - 1:
+            upstream.close()
+            continue
+        break
+    else:
+        return jsonify({'error': 'Aucun nœud disponible'}), 502
+
+    with router._lock:
+        router.routed[node] = router.routed.get(node, 0) + 1
+    if path == 'jobs' and upstream.status_code in (200, 202):
+        location = upstream.headers.get('Location', '')
+        if location.startswith('/jobs/'):
+            router.remember_job(location[len('/jobs/'):], node)
+
+    response_headers = [(name, value) for name, value in upstream.raw.headers.items()
+                        if name.lower() not in HOP_BY_HOP_HEADERS]
+    response_headers.append(('X-Routed-To', node))
+    return Response(relay(upstream), status=upstream.status_code, headers=response_headers)
+
+
+def relay(upstream: requests.Response) -> Iterator[bytes]:
+    """Corps de la réponse du nœud, transmis tel quel (flux SSE/Arrow compris)"""
+    try:
+        yield from upstream.raw.stream(8192, decode_content=False)
+    finally:
+        upstream.close()
+
+
+if __name__ == '__main__':
+    port = int(os.getenv('ROUTER_PORT', 8080))
+    host = os.getenv('HOST', '0.0.0.0')
+    print(f"🌐 Routeur sur {host}:{port} → {', '.join(router.ring.nodes) or 'aucun nœud'}")
+    app.run(host=host, port=port, threaded=True)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Regroupement des appels identiques en cours (single-flight)
+Les requêtes concurrentes ayant la même clé attendent un seul calcul
+et partagent son résultat
+"""
+
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def normalize_address(address: str) -> str:
+    """Normalise une adresse pour en faire une clé (casse, espaces)"""
+    return ' '.join(address.lower().split())
+
+
+def normalize_coordinates(lon: float, lat: float, precision: int = 6) -> Tuple[float, float]:
+    """Arrondit des coordonnées (~10 cm à 6 décimales) pour en faire une clé"""
+    return round(float(lon), precision), round(float(lat), precision)
+
+
+class _Call:
+    """Calcul en cours et son résultat"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        """Initialise le registre des calculs en cours"""
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+        self.timed_out = 0
+
+    def do(self, key: Hashable, fn: Callable, *args,
+           wait_timeout: Optional[float] = None, copy_result: bool = False, detach: bool = False,
+           **kwargs) -> Tuple[Any, bool]:
+        """
+        Exécute fn une seule fois pour tous les appelants concurrents de même clé
+
+        Args:
+            key: Clé normalisée du calcul
+            fn: Fonction à exécuter
+            *args, **kwargs: Arguments de fn
+            wait_timeout: Attente maximale du calcul d'un autre appelant (secondes)
+            copy_result: Si le résultat est partagé, chaque appelant (le premier
+                compris) en reçoit une copie profonde et l'original n'est plus
+                modifié, pour les résultats que les appelants modifient
+            detach: Le calcul s'exécute dans son propre thread et le premier
+                appelant l'attend comme les autres (au plus wait_timeout): chaque
+                appelant abandonne à sa propre échéance sans interrompre le calcul
+
+        Returns:
+            tuple: (résultat, partagé) — partagé vaut True si le résultat
+            provient du calcul d'un autre appelant
+
+        Raises:
+            TimeoutError: Le calcul partagé n'est pas terminé dans wait_timeout
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                self.executed += 1
+            else:
+                call.waiters += 1
+                leader = False
+                self.coalesced += 1
+
+        if leader and detach:
+            threading.Thread(target=self._run, args=(key, call, fn, args, kwargs),
+                             name='singleflight', daemon=True).start()
+        elif leader:
+            self._run(key, call, fn, args, kwargs)
+            if call.error is not None:
+                raise call.error
+            shared = call.waiters > 0
+            return (copy.deepcopy(call.result) if copy_result and shared else call.result), shared
+
+        if not call.done.wait(wait_timeout):
+            with self._lock:
+                self.timed_out += 1
+            raise TimeoutError("Calcul partagé non terminé avant l'échéance")
+        if call.error is not None:
+            raise call.error
+        # Détaché, d'autres appelants peuvent encore se joindre: le premier reçoit aussi une copie
+        return (copy.deepcopy(call.result) if copy_result else call.result), not leader or call.waiters > 0
+
+    def _run(self, key: Hashable, call: _Call, fn: Callable, args, kwargs):
+        """Exécute le calcul et libère ses appelants"""
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict:
+        """Compteurs d'exécutions et d'appels regroupés"""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'timed_out': self.timed_out
+            }
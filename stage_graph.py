@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Exécution d'étapes selon leurs dépendances
+Chaque étape démarre dès que celles dont elle dépend sont terminées: les
+étapes indépendantes s'exécutent en parallèle, et une étape facultative
+en échec est remplacée par sa valeur de repli
+"""
+
+import time
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Marqueur d'une étape sans valeur de repli (son échec interrompt l'exécution)
+REQUIRED = object()
+
+
+class _Stage:
+    def __init__(self, name: str, fn: Callable, after: Iterable[str], fallback: Any):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        self.fallback = fallback
+
+
+class StageGraph:
+    def __init__(self, executor: Executor):
+        """
+        Initialise un graphe d'étapes
+
+        Args:
+            executor: Pool partagé exécutant les étapes
+        """
+        self.executor = executor
+        self.stages = {}
+        self.timings = {}
+        self.failed = {}
+
+    def add(self, name: str, fn: Callable, after: Iterable[str] = (), fallback: Any = REQUIRED):
+        """
+        Ajoute une étape
+
+        Args:
+            name: Nom de l'étape (clé de son résultat)
+            fn: Fonction appelée avec les résultats des dépendances en
+                arguments nommés (fn(**{dépendance: résultat}))
+            after: Étapes dont celle-ci dépend (déjà ajoutées)
+            fallback: Résultat utilisé si l'étape échoue; sans repli, l'échec
+                interrompt l'exécution et l'exception est propagée
+        """
+        for dependency in after:
+            if dependency not in self.stages:
+                raise ValueError(f"Étape inconnue: {dependency}")
+        self.stages[name] = _Stage(name, fn, after, fallback)
+
+    def run(self, on_done: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        Exécute toutes les étapes
+
+        Args:
+            on_done: Rappel on_done(étape, résultat) à la fin de chaque étape
+
+        Returns:
+            dict: Résultat de chaque étape
+
+        Raises:
+            Exception: Celle de la première étape obligatoire en échec (les
+                étapes pas encore démarrées sont annulées)
+        """
+        results = {}
+        waiting = dict(self.stages)
+        running = {}
+        try:
+            while waiting or running:
+                for name in [name for name, stage in waiting.items()
+                             if all(dependency in results for dependency in stage.after)]:
+                    stage = waiting.pop(name)
+                    kwargs = {dependency: results[dependency] for dependency in stage.after}
+                    running[self.executor.submit(self._timed, stage, kwargs)] = stage
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        results[stage.name] = future.result()
+                    except Exception as e:
+                        if stage.fallback is REQUIRED:
+                            raise
+                        print(f"⚠️ Étape {stage.name} en échec, valeur de repli: {e}")
+                        self.failed[stage.name] = str(e)
+                        results[stage.name] = stage.fallback
+                    if on_done is not None:
+                        on_done(stage.name, results[stage.name])
+        finally:
+            for future in running:
+                future.cancel()
+        return results
+
+    def _timed(self, stage: _Stage, kwargs: Dict[str, Any]):
+        start = time.monotonic()
+        try:
+            return stage.fn(**kwargs)
+        finally:
+            self.timings[stage.name] = round(time.monotonic() - start, 3)
@@ -0,0 +1,143 @@
+"""Configuration commune des tests (modules à la racine du dépôt)"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pyproj
+import pytest
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Pas de cache disque des réponses ni de répertoires de données pendant les tests
+os.environ.setdefault('CACHE_DIR', '')
+
+
+def analysis_results(address='Paris', coordinates=(2.35, 48.85), time_minutes=10, profile='driving-car',
+                     dataset='JRC_GRID_2018', degraded=()):
+    """Résultats d'analyze_location de forme réelle"""
+    stats = {'total_population': 1000, 'population_density': 100.0, 'area_km2': 10.0, 'number_of_cells': 12}
+    return {
+        'address': address, 'coordinates': {'lat': coordinates[1], 'lon': coordinates[0]},
+        'time_minutes': time_minutes, 'profile': profile, 'dataset': dataset, 'country_code': 'FR',
+        'isochrone_geometry': [(2.3, 48.8), (2.4, 48.8), (2.4, 48.9), (2.3, 48.8)],
+        'population_stats': stats,
+        'household_stats': {'total_households': 450, 'household_density': 45.0, 'household_ratio': 2.2,
+                            'method': 'statistical_ratio', 'population_stats': stats, 'osm_data': None},
+        'degraded': list(degraded)
+    }
+
+
+class FakeAnalyzer:
+    """
+    Analyseur sans données ni appels externes, pour les tests des routes
+
+    result impose le résultat des analyses (ex: une erreur); gate, s'il est
+    défini, retient chaque analyse jusqu'à gate.set() ou l'échéance (504).
+    """
+    default_dataset = 'JRC_GRID_2018'
+    cell_resolution = 1000.0
+
+    def __init__(self):
+        self.datasets = {}
+        self.versions = {}
+        self.result = None
+        self.gate = None
+        self.started = threading.Event()
+        self.calls = []
+        self._to_etrs = pyproj.Transformer.from_crs('EPSG:4326', 'EPSG:3035', always_xy=True)
+
+    def available_datasets(self):
+        return [self.default_dataset] + sorted(self.datasets)
+
+    def dataset_resolution(self, dataset=None):
+        return self.cell_resolution
+
+    def dataset_version(self, dataset=None):
+        dataset = dataset or self.default_dataset
+        return self.versions.get(dataset, dataset)
+
+    def to_etrs(self, geometry):
+        return shapely.transform(geometry, lambda coords: np.column_stack(self._to_etrs.transform(*coords.T)))
+
+    def _wait(self, deadline):
+        self.started.set()
+        if self.gate is not None and not self.gate.wait(deadline.remaining() if deadline else 5):
+            return {'error': 'Délai de traitement dépassé', 'status': 504}
+        return None
+
+    def analyze_location(self, address, time_minutes=10, profile='driving-car', dataset=None, deadline=None,
+                         on_stage=None, coordinates=None):
+        self.calls.append(('analyze_location', address))
+        results = self.result or analysis_results(address, coordinates or (2.35, 48.85), time_minutes, profile,
+                                                  dataset or self.default_dataset)
+        if on_stage is not None and 'error' not in results:
+            on_stage('coordinates', {'coordinates': results['coordinates']})
+            on_stage('isochrone', {'isochrone_geometry': results['isochrone_geometry']})
+            on_stage('population', {'population_stats': results['population_stats']})
+        timeout = self._wait(deadline)
+        if timeout:
+            return timeout
+        if on_stage is not None and 'error' not in results:
+            on_stage('households_statistical', {'household_stats': results['household_stats']})
+            on_stage('households_hybrid', {'household_stats': results['household_stats'], 'country_code': 'FR'})
+        return results
+
+    def analyze_point(self, lon, lat, time_minutes=10, profile='driving-car', dataset=None, deadline=None):
+        self.calls.append(('analyze_point', (lon, lat)))
+        return self._wait(deadline) or self.result or analysis_results(
+            None, (lon, lat), time_minutes, profile, dataset or self.default_dataset
+        )
+
+    def analyze_polygon(self, polygon_wgs84, dataset=None, country_code=None, deadline=None):
+        self.calls.append(('analyze_polygon', polygon_wgs84))
+        if self.result:
+            return self.result
+        results = analysis_results(dataset=dataset or self.default_dataset)
+        area_km2 = self.to_etrs(polygon_wgs84).area / 1e6
+        return {
+            'dataset': results['dataset'], 'country_code': country_code or 'FR',
+            'population_stats': {**results['population_stats'], 'area_km2': area_km2},
+            'household_stats': results['household_stats'], 'degraded': []
+        }
+
+    def cell_breakdown(self, polygon_wgs84, dataset=None):
+        self.calls.append(('cell_breakdown', polygon_wgs84))
+        return {
+            'cell_id': np.array([(2800 << 32) | 3700, (2800 << 32) | 3701], dtype=np.int64),
+            'population': np.array([120.0, 30.5]),
+            'country': np.array(['FR', 'BE']),
+            'coverage': np.array([1.0, 0.25]),
+            'households': np.array([54.5, 13.9])
+        }
+
+    def point_cell_breakdown(self, lon, lat, time_minutes=10, profile='driving-car', dataset=None, deadline=None):
+        self.calls.append(('point_cell_breakdown', (lon, lat)))
+        return self.result or {'cells': self.cell_breakdown(None, dataset)}
+
+
+@pytest.fixture
+def fake_analyzer(monkeypatch):
+    """Remplace l'analyseur, le cache, l'admission et les tâches de l'API par des instances de test"""
+    import api
+    from admission import AdmissionController
+    from jobs import JobManager
+    from population_analyzer import ANALYSIS_STAGES
+    from response_cache import ResponseCache
+
+    analyzer = FakeAnalyzer()
+    monkeypatch.setattr(api, 'analyzer', analyzer)
+    monkeypatch.setattr(api, 'response_cache', ResponseCache(max_entries=16))
+    monkeypatch.setattr(api, 'admission', AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.1))
+    monkeypatch.setattr(api, 'job_manager', JobManager(ANALYSIS_STAGES, max_workers=1))
+    yield analyzer
+    if analyzer.gate is not None:
+        analyzer.gate.set()
+
+
+@pytest.fixture
+def client(fake_analyzer):
+    import api
+    return api.app.test_client()
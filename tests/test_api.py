@@ -0,0 +1,263 @@
+import json
+import threading
+import time
+
+import pytest
+import shapely
+import shapely.geometry
+
+import api
+from admission import AdmissionController
+from conftest import analysis_results
+
+
+def ndjson_events(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_emits_stages_in_order_then_result(client):
+    response = client.get('/analyze/stream?address=Paris&format=ndjson')
+    assert response.status_code == 200 and response.headers['X-Cache'] == 'MISS'
+    events = ndjson_events(response)
+    assert [event['event'] for event in events] == [
+        'coordinates', 'isochrone', 'population', 'households_statistical', 'households_hybrid', 'result'
+    ]
+    assert events[-1]['data']['population']['total'] == 1000
+
+    # Résultat en cache: un seul événement
+    cached = client.get('/analyze/stream?address=Paris&format=ndjson')
+    assert cached.headers['X-Cache'] == 'HIT'
+    assert [event['event'] for event in ndjson_events(cached)] == ['result']
+
+
+def test_stream_ends_with_error_event(client, fake_analyzer):
+    fake_analyzer.result = {'error': "Impossible d'obtenir l'isochrone", 'status': 502}
+    events = ndjson_events(client.get('/analyze/stream?address=Paris&format=ndjson'))
+    assert events == [{'event': 'error', 'data': {'error': "Impossible d'obtenir l'isochrone", 'status': 502}}]
+
+
+def test_stream_failure_before_admission_is_a_json_error(client, monkeypatch):
+    class BrokenAdmission:
+        def admit(self, deadline):
+            raise RuntimeError('panne')
+
+    monkeypatch.setattr(api, 'admission', BrokenAdmission())
+    response = client.get('/analyze/stream?address=Paris')
+    assert response.status_code == 500
+    assert response.get_json()['error'] == 'Erreur serveur: panne'
+
+
+def test_stream_closes_after_the_deadline(client, fake_analyzer, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_GRACE_SECONDS', 0)
+    fake_analyzer.gate = threading.Event()
+    # L'analyse factice ignore l'échéance: le flux se clôt tout de même
+    monkeypatch.setattr(fake_analyzer, '_wait', lambda deadline: fake_analyzer.gate.wait(5) and None)
+
+    response = client.get('/analyze/stream?address=Paris&format=ndjson', headers={'X-Request-Timeout': '0.2'})
+    events = ndjson_events(response)
+    assert [event['event'] for event in events] == ['coordinates', 'isochrone', 'population', 'error']
+    assert events[-1]['data']['status'] == 504
+
+
+def hold_one_analysis(client, fake_analyzer):
+    """Lance une analyse retenue par fake_analyzer.gate et attend qu'elle occupe sa place"""
+    fake_analyzer.gate = threading.Event()
+    thread = threading.Thread(target=client.get, args=('/analyze?address=Lyon',))
+    thread.start()
+    assert fake_analyzer.started.wait(2)
+    return thread
+
+
+def test_full_queue_is_refused_with_429(client, fake_analyzer, monkeypatch):
+    monkeypatch.setattr(api, 'admission', AdmissionController(max_concurrent=1, max_queue=0))
+    thread = hold_one_analysis(client, fake_analyzer)
+
+    response = client.get('/analyze?address=Paris')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+    fake_analyzer.gate.set()
+    thread.join(2)
+    assert client.get('/analyze?address=Paris').status_code == 200
+
+
+def test_queue_timeout_is_refused_with_503(client, fake_analyzer):
+    thread = hold_one_analysis(client, fake_analyzer)
+    response = client.post('/analyze', json={'address': 'Paris'})
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    fake_analyzer.gate.set()
+    thread.join(2)
+
+
+def test_deadline_gives_504(client, fake_analyzer):
+    fake_analyzer.gate = threading.Event()
+    response = client.get('/analyze?address=Paris', headers={'X-Request-Timeout': '0.1'})
+    assert response.status_code == 504
+    assert response.get_json() == {'error': 'Délai de traitement dépassé'}
+
+
+def test_saturated_upstream_gives_503_with_retry_after(client, fake_analyzer):
+    fake_analyzer.result = {'error': 'Service ors_geocode momentanément saturé', 'status': 503, 'retry_after': 4.2}
+    response = client.get('/analyze?address=Paris')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_degraded_analysis_is_answered_but_not_cached(client, fake_analyzer):
+    fake_analyzer.result = analysis_results(degraded=['buildings'])
+    response = client.get('/analyze?address=Paris')
+    assert response.status_code == 200
+    assert response.headers['X-Cache'] == 'BYPASS' and response.headers['Cache-Control'] == 'no-store'
+    assert response.get_json()['data']['degraded'] == ['buildings']
+
+    # Étape de nouveau disponible: l'analyse est refaite puis mise en cache
+    fake_analyzer.result = None
+    response = client.get('/analyze?address=Paris')
+    assert response.headers['X-Cache'] == 'MISS' and 'degraded' not in response.get_json()['data']
+    assert client.get('/analyze?address=Paris').headers['X-Cache'] == 'HIT'
+    assert len(fake_analyzer.calls) == 2
+
+
+SQUARE = {'type': 'Polygon', 'coordinates': [[[2.3, 48.8], [2.4, 48.8], [2.4, 48.9], [2.3, 48.9], [2.3, 48.8]]]}
+
+
+@pytest.mark.parametrize('body, message', [
+    (None, 'Données JSON requises'),
+    ({'lat': '48.8', 'lon': 2.3}, 'lat et lon numériques requis'),
+    ({'lat': True, 'lon': 2.3}, 'lat et lon numériques requis'),
+    ({'lat': 95, 'lon': 2.3}, 'Coordonnées hors limites'),
+    ({'lat': 48.8, 'lon': 2.3, 'time_minutes': 90}, 'Temps doit être un entier entre 1 et 60 minutes'),
+    ({'lat': 48.8, 'lon': 2.3, 'dataset': 'GHS'}, "Jeu de données inconnu. Utilisez: ['JRC_GRID_2018']"),
+])
+def test_point_validation(client, fake_analyzer, body, message):
+    response = client.post('/population/point', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': message}
+    assert fake_analyzer.calls == []
+
+
+def test_point_analysis_is_cached_on_rounded_coordinates(client, fake_analyzer):
+    response = client.post('/population/point', json={'lat': 48.8566, 'lon': 2.3522})
+    assert response.status_code == 200 and response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['data']['coordinates'] == {'lat': 48.8566, 'lon': 2.3522}
+    again = client.post('/population/point', json={'lat': 48.85660001, 'lon': 2.3522})
+    assert again.headers['X-Cache'] == 'HIT'
+    assert fake_analyzer.calls == [('analyze_point', (2.3522, 48.8566))]
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'geometry': 'zz'}, 'Géométrie illisible (GeoJSON ou WKB hexadécimal attendu)'),
+    ({'geometry': {'type': 'Point', 'coordinates': [2.3, 48.8]}}, 'Polygon ou MultiPolygon requis'),
+    ({'geometry': {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]]}},
+     'Géométrie invalide (auto-intersection ou anneau mal formé)'),
+    ({'geometry': {'type': 'Polygon', 'coordinates': [[[0, 0], [200, 0], [200, 1], [0, 0]]]}},
+     'Coordonnées hors limites (WGS84 lon/lat attendu)'),
+    ({'geometry': SQUARE, 'country_code': 'FRA'}, 'Code pays invalide (2 lettres)'),
+    ({'geometries': []}, 'Entre 1 et 50 zones requises'),
+    ({'geometries': [SQUARE, {'type': 'Point', 'coordinates': [2.3, 48.8]}]}, 'Zone 2: Polygon ou MultiPolygon requis'),
+    ('"zone"', 'Objet JSON ou liste de zones requis'),
+])
+def test_polygon_validation(client, fake_analyzer, body, message):
+    response = client.post('/population/polygon', data=json.dumps(body), content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': message}
+    assert fake_analyzer.calls == []
+
+
+def test_polygon_too_large_is_refused(client):
+    huge = {'type': 'Polygon', 'coordinates': [[[-5, 42], [8, 42], [8, 51], [-5, 51], [-5, 42]]]}
+    response = client.post('/population/polygon', json={'geometry': huge})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Zone trop grande')
+
+
+def test_polygon_forms_analyze_without_upstream_calls(client, fake_analyzer):
+    single = client.post('/population/polygon', json={'geometry': {'type': 'Feature', 'geometry': SQUARE}})
+    assert single.status_code == 200
+    assert single.get_json()['data']['population']['area_km2'] == pytest.approx(81.6, rel=0.05)
+
+    listed = client.post('/population/polygon?country_code=BE', json=[SQUARE, SQUARE])
+    assert [zone['country_code'] for zone in listed.get_json()['data']] == ['BE', 'BE']
+
+    collection = {'type': 'FeatureCollection', 'features': [{'type': 'Feature', 'geometry': SQUARE}]}
+    assert len(client.post('/population/polygon', json=collection).get_json()['data']) == 1
+
+    wkb_body = shapely.to_wkb(shapely.geometry.shape(SQUARE))
+    binary = client.post('/population/polygon', data=wkb_body, content_type='application/octet-stream')
+    assert binary.status_code == 200 and binary.get_json()['data']['dataset'] == 'JRC_GRID_2018'
+
+    assert {name for name, _ in fake_analyzer.calls} == {'analyze_polygon'}
+
+
+def read_arrow(response):
+    pa = pytest.importorskip('pyarrow')
+    assert response.status_code == 200 and response.mimetype == api.ARROW_STREAM_MIMETYPE
+    return pa.ipc.open_stream(response.get_data()).read_all()
+
+
+def test_polygon_arrow_export_has_one_batch_per_zone(client, fake_analyzer):
+    table = read_arrow(client.post('/population/polygon?format=arrow', json=[SQUARE, SQUARE]))
+    assert table.schema.metadata[b'dataset'] == b'JRC_GRID_2018'
+    assert table.schema.metadata[b'resolution_m'] == b'1000.0'
+    assert table.column('zone').to_pylist() == [0, 0, 1, 1]
+    assert table.column('cell_id').to_pylist()[:2] == [(2800 << 32) | 3700, (2800 << 32) | 3701]
+    assert table.column('country').to_pylist()[:2] == ['FR', 'BE']
+    assert table.column('coverage').to_pylist()[:2] == [1.0, 0.25]
+
+
+def test_point_arrow_export_skips_the_response_cache(client, fake_analyzer):
+    table = read_arrow(client.post('/population/point?format=arrow', json={'lat': 48.85, 'lon': 2.35}))
+    assert table.num_rows == 2
+    assert fake_analyzer.calls[0] == ('point_cell_breakdown', (2.35, 48.85))
+    assert api.response_cache.stats()['memory_entries'] == 0
+
+
+def test_arrow_export_errors(client, fake_analyzer, monkeypatch):
+    assert client.post('/population/point?format=csv', json={'lat': 48.85, 'lon': 2.35}).status_code == 400
+    fake_analyzer.result = {'error': "Impossible d'obtenir l'isochrone", 'status': 502}
+    assert client.post('/population/point?format=arrow', json={'lat': 48.85, 'lon': 2.35}).status_code == 502
+    monkeypatch.setattr(api, 'PYARROW_AVAILABLE', False)
+    response = client.post('/population/polygon?format=arrow', json={'geometry': SQUARE})
+    assert response.status_code == 501
+
+
+def poll_job(client, location, timeout=2):
+    limit = time.monotonic() + timeout
+    while time.monotonic() < limit:
+        data = client.get(location).get_json()
+        if data['status'] in ('done', 'failed'):
+            return data
+        time.sleep(0.01)
+    raise AssertionError('tâche non terminée')
+
+
+def test_job_lifecycle(client, fake_analyzer):
+    fake_analyzer.gate = threading.Event()
+    created = client.post('/jobs', json={'address': 'Paris', 'time_minutes': 15})
+    assert created.status_code == 202
+    location = created.headers['Location']
+    assert location == f"/jobs/{created.get_json()['job_id']}"
+    assert client.get(location).get_json()['status'] in ('queued', 'running')
+
+    # Même analyse relancée: rattachée à la tâche en cours
+    again = client.post('/jobs', json={'address': ' PARIS', 'time_minutes': 15})
+    assert again.status_code == 202 and again.headers['Location'] == location
+
+    fake_analyzer.gate.set()
+    data = poll_job(client, location)
+    assert data['status'] == 'done' and data['progress'] == 1.0
+    assert data['result']['population']['total'] == 1000
+    assert client.post('/jobs', json={'address': 'Paris', 'time_minutes': 15}).status_code == 200
+    assert client.get('/analyze?address=Paris&time_minutes=15').headers['X-Cache'] == 'HIT'
+    assert len(fake_analyzer.calls) == 1
+
+
+def test_failed_job_and_unknown_job(client, fake_analyzer):
+    fake_analyzer.result = {'error': "Impossible de géocoder l'adresse", 'status': 404}
+    location = client.post('/jobs', json={'address': 'Nulle part'}).headers['Location']
+    data = poll_job(client, location)
+    assert data['status'] == 'failed' and data['error'] == "Impossible de géocoder l'adresse"
+
+    assert client.get('/jobs/inconnue').status_code == 404
+    assert client.post('/jobs', json={'time_minutes': 10}).get_json() == {'error': 'Adresse requise'}
@@ -0,0 +1,71 @@
+"""Tests de l'analyse en masse (lecture des entrées, écriture JSONL/Parquet)"""
+
+import json
+
+import pytest
+
+import batch_analyze as ba
+
+
+class _StubAnalyzer:
+    """Analyseur minimal: aucun géocodage ne réussit"""
+    default_dataset = 'JRC_GRID_2018'
+    household_estimator = None
+
+    def available_datasets(self):
+        return [self.default_dataset]
+
+    def geocode_address(self, address, deadline=None):
+        return None
+
+
+def _run(tmp_path, records, writer_class, output):
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+    checkpoint = {'input': 'in', 'format': 'test', 'records_done': 0, 'errors': 0, 'output_state': None}
+    runner = ba.BatchRunner(_StubAnalyzer(), writer_class(str(output)), checkpoint_path, checkpoint,
+                            io_workers=2, flush_every=2)
+    return runner.run(iter(records))
+
+
+def test_conform_row_nulls_values_outside_schema():
+    row = {name: None for name, _ in ba.RESULT_COLUMNS}
+    row.update(id='1', time_minutes='abc', lat=True, lon=2, profile=3)
+    ba.conform_row(row)
+    assert row['time_minutes'] is None and row['lat'] is None and row['profile'] is None
+    assert row['lon'] == 2.0
+    assert row['error'] == 'Valeurs invalides: lat, time_minutes, profile'
+
+
+def test_csv_record_with_bad_type_is_an_error_row(tmp_path):
+    path = tmp_path / 'in.csv'
+    path.write_text('id,address,time_minutes\na,Paris,abc\nb,Lyon,10\n', encoding='utf-8')
+    records = list(ba.read_records(str(path)))
+    assert records[0]['time_minutes'] == 'abc'
+
+    output = tmp_path / 'out.jsonl'
+    checkpoint = _run(tmp_path, records, ba.JsonlWriter, output)
+    rows = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert [row['id'] for row in rows] == ['a', 'b']
+    assert rows[0]['time_minutes'] is None and rows[0]['error'] == 'Temps invalide'
+    assert rows[1]['error'] == "Impossible de géocoder l'adresse"
+    assert checkpoint['records_done'] == 2
+
+
+def test_parquet_output_survives_malformed_records(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    records = [
+        {'id': 'a', 'address': 'Paris', 'time_minutes': 'abc'},
+        {'id': 'b', 'address': 12, 'profile': ['x']},
+        {'_invalid': 'Ligne JSON invalide'},
+        {'id': 'd', 'lat': 'nord', 'lon': 2.3},
+        {'id': 'e', 'address': 'Lyon', 'dataset': {'nom': 'x'}},
+    ]
+    output = tmp_path / 'out.parquet'
+    checkpoint = _run(tmp_path, records, ba.ParquetWriter, output)
+
+    rows = pq.read_table(str(output)).to_pylist()
+    assert [row['id'] for row in rows] == ['a', 'b', '2', 'd', 'e']
+    assert all(row['error'] for row in rows)
+    assert rows[0]['time_minutes'] is None
+    assert rows[1]['address'] is None and rows[1]['profile'] is None
+    assert checkpoint['records_done'] == 5 and checkpoint['errors'] == 5
@@ -0,0 +1,29 @@
+import numpy as np
+import shapely
+
+from building_grid import BuildingGrid
+from cell_aggregation import cell_ids_from_origins
+
+RESOLUTION = 1000.0
+
+
+def write_grid(path, coverage=None):
+    cell_ids = np.sort(cell_ids_from_origins(np.array([3_700_000.0, 3_705_000.0]),
+                                             np.array([2_800_000.0, 2_803_000.0]), RESOLUTION))
+    arrays = {'coverage': coverage} if coverage is not None else {}
+    np.savez(path, cell_ids=cell_ids, residential=np.array([3, 4], dtype=np.uint32),
+             total=np.array([5, 6], dtype=np.uint32), resolution=np.float64(RESOLUTION), **arrays)
+    return str(path)
+
+
+def test_coverage_from_extract_extent(tmp_path):
+    ring = np.array(shapely.box(3_600_000, 2_700_000, 3_800_000, 2_900_000).exterior.coords)
+    grid = BuildingGrid(write_grid(tmp_path / 'grid.npz', ring))
+    assert grid.covers(shapely.box(3_650_000, 2_750_000, 3_660_000, 2_760_000))
+    assert not grid.covers(shapely.box(3_790_000, 2_750_000, 3_810_000, 2_760_000))
+
+
+def test_grid_without_extent_covers_its_cells(tmp_path):
+    grid = BuildingGrid(write_grid(tmp_path / 'grid.npz'))
+    assert grid.covers(shapely.box(3_700_000, 2_800_000, 3_706_000, 2_804_000))
+    assert not grid.covers(shapely.box(3_699_000, 2_800_000, 3_701_000, 2_801_000))
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from cell_bitset import CellBitset
+
+
+def square_ids(row, col, size):
+    rows, cols = np.meshgrid(np.arange(row, row + size), np.arange(col, col + size), indexing='ij')
+    return (rows.ravel().astype(np.int64) << 32) | cols.ravel()
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def random_ids(rng, count):
+    rows = rng.integers(1400, 5400, count, dtype=np.int64)
+    cols = rng.integers(2500, 7500, count, dtype=np.int64)
+    return (rows << 32) | cols
+
+
+def test_round_trip(rng):
+    ids = np.concatenate([random_ids(rng, 5000), square_ids(2800, 3700, 120)])
+    bitset = CellBitset.from_ids(np.concatenate([ids, ids[:100]]))
+    assert np.array_equal(bitset.to_ids(), np.unique(ids))
+    assert len(bitset) == len(np.unique(ids))
+    assert len(CellBitset.from_ids([]).to_ids()) == 0
+
+
+def test_compact_zone_uses_bitmaps():
+    # Zone de 100 x 100 km: quelques blocs 2D denses, stockés en bitmap
+    ids = square_ids(2800, 3700, 100)
+    bitset = CellBitset.from_ids(ids)
+    assert len(bitset.containers) <= 4
+    assert any(container.dtype == np.uint64 for container in bitset.containers.values())
+    assert bitset.nbytes < ids.nbytes / 4
+
+
+def test_set_algebra_matches_numpy(rng):
+    left_ids = np.concatenate([random_ids(rng, 3000), square_ids(2800, 3700, 90)])
+    right_ids = np.concatenate([random_ids(rng, 3000), square_ids(2850, 3750, 90), left_ids[:500]])
+    left, right = CellBitset.from_ids(left_ids), CellBitset.from_ids(right_ids)
+
+    assert np.array_equal((left & right).to_ids(), np.intersect1d(left_ids, right_ids))
+    assert np.array_equal((left | right).to_ids(), np.union1d(left_ids, right_ids))
+    assert np.array_equal((left - right).to_ids(), np.setdiff1d(left_ids, right_ids))
+    assert len(left & CellBitset()) == 0
@@ -0,0 +1,150 @@
+"""Tests du stockage tuilé (ingestion et sélection comparées à la grille en mémoire)"""
+
+import os
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+import dataset_store
+from cell_aggregation import cell_ids_from_origins
+from dataset_store import TiledDataset, ingest_raster, ingest_vector, default_tile_size
+
+RESOLUTION = 1000.0
+ORIGIN_X, ORIGIN_Y = 3_700_000.0, 2_800_000.0
+SIZE = 30
+
+
+@pytest.fixture(scope='module')
+def grid():
+    """Grille de 30x30 cellules de 1 km, populations aléatoires (un quart vides)"""
+    rng = np.random.default_rng(33)
+    population = rng.integers(1, 500, SIZE * SIZE).astype(np.float64)
+    population[rng.random(SIZE * SIZE) < 0.25] = 0
+    cols, rows = np.meshgrid(np.arange(SIZE), np.arange(SIZE))
+    min_x = ORIGIN_X + cols.ravel() * RESOLUTION
+    min_y = ORIGIN_Y + rows.ravel() * RESOLUTION
+    return gpd.GeoDataFrame(
+        {'TOT_P_2018': population, 'CNTR_ID': np.where(cols.ravel() < SIZE // 2, 'FR', 'BE')},
+        geometry=shapely.box(min_x, min_y, min_x + RESOLUTION, min_y + RESOLUTION),
+        crs='EPSG:3035'
+    )
+
+
+@pytest.fixture(scope='module')
+def vector_store(grid, tmp_path_factory):
+    directory = tmp_path_factory.mktemp('vector')
+    source = str(directory / 'grid.gpkg')
+    grid.to_file(source, driver='GPKG')
+    store_dir = str(directory / 'store')
+    ingest_vector(source, store_dir, 'TEST', 'TOT_P_2018', tile_size_cells=8, chunk_rows=200)
+    return store_dir
+
+
+ZONES = [
+    shapely.Point(ORIGIN_X + 15_000, ORIGIN_Y + 15_000).buffer(9_000),
+    shapely.box(ORIGIN_X - 5_000, ORIGIN_Y - 5_000, ORIGIN_X + 40_000, ORIGIN_Y + 40_000),
+    shapely.Polygon(
+        [(ORIGIN_X, ORIGIN_Y), (ORIGIN_X + 29_000, ORIGIN_Y + 2_000), (ORIGIN_X + 4_500, ORIGIN_Y + 27_300)],
+        holes=[[(ORIGIN_X + 5_000, ORIGIN_Y + 5_000), (ORIGIN_X + 9_000, ORIGIN_Y + 5_000),
+                (ORIGIN_X + 5_000, ORIGIN_Y + 9_000)]]
+    ),
+]
+
+
+def _expected(grid, zone, populated_only=False):
+    """Sélection de référence sur la grille en mémoire"""
+    mask = grid.geometry.intersects(zone).to_numpy()
+    if populated_only:
+        mask = mask & (grid['TOT_P_2018'].to_numpy() > 0)
+    bounds = grid.geometry.bounds[mask]
+    ids = cell_ids_from_origins(bounds['minx'], bounds['miny'], RESOLUTION)
+    order = np.argsort(ids)
+    return ids[order], grid['TOT_P_2018'].to_numpy()[mask][order], grid['CNTR_ID'].to_numpy()[mask][order]
+
+
+@pytest.mark.parametrize('zone', ZONES)
+def test_vector_select_matches_in_memory_grid(grid, vector_store, zone):
+    dataset = TiledDataset(vector_store)
+    selection = dataset.select(zone)
+    order = np.argsort(selection.cell_ids)
+    ids, population, countries = _expected(grid, zone)
+    assert selection.cell_ids[order].tolist() == ids.tolist()
+    np.testing.assert_allclose(selection.population[order], population)
+    assert selection.countries[order].tolist() == countries.tolist()
+
+
+def test_manifest_summarizes_tiles(grid, vector_store):
+    dataset = TiledDataset(vector_store)
+    assert dataset.manifest['tile_size_cells'] == 8
+    assert dataset.manifest['total_cells'] == len(grid)
+    assert dataset.manifest['total_population'] == pytest.approx(grid['TOT_P_2018'].sum())
+
+
+@pytest.mark.parametrize('zone', ZONES)
+def test_raster_select_matches_in_memory_grid(grid, tmp_path, zone):
+    rasterio = pytest.importorskip('rasterio')
+    from rasterio.transform import from_origin
+
+    values = grid['TOT_P_2018'].to_numpy().reshape(SIZE, SIZE)[::-1].astype(np.float32)
+    source = str(tmp_path / 'pop.tif')
+    with rasterio.open(source, 'w', driver='GTiff', width=SIZE, height=SIZE, count=1, dtype='float32',
+                       crs='EPSG:3035', transform=from_origin(ORIGIN_X, ORIGIN_Y + SIZE * RESOLUTION,
+                                                             RESOLUTION, RESOLUTION)) as dst:
+        dst.write(values, 1)
+    store_dir = str(tmp_path / 'store')
+    ingest_raster(source, store_dir, 'RASTER', tile_size_cells=7)
+
+    selection = TiledDataset(store_dir).select(zone)
+    order = np.argsort(selection.cell_ids)
+    ids, population, _ = _expected(grid, zone, populated_only=True)
+    assert selection.cell_ids[order].tolist() == ids.tolist()
+    np.testing.assert_allclose(selection.population[order], population)
+
+
+def test_default_tile_size_fits_the_cache():
+    assert default_tile_size(1000) == 100
+    for resolution in (1000, 100, 10):
+        for cache_bytes in (64 * 1024 * 1024, dataset_store.DEFAULT_CACHE_BYTES):
+            size = default_tile_size(resolution, cache_bytes)
+            tile_bytes = size * size * dataset_store.BYTES_PER_CELL
+            assert size * resolution <= dataset_store.DEFAULT_TILE_SPAN_M
+            assert dataset_store.TILES_PER_CACHE * tile_bytes <= cache_bytes
+
+
+def test_workers_are_capped_by_the_budget(vector_store):
+    largest = max(tile['cells'] for tile in TiledDataset(vector_store).tiles) * dataset_store.BYTES_PER_CELL
+    assert TiledDataset(vector_store, cache_bytes=2 * largest, max_workers=8).max_workers == 2
+    assert TiledDataset(vector_store, cache_bytes=1024, max_workers=8).max_workers == 1
+
+
+def test_stale_part_files_are_cleared(grid, tmp_path):
+    source = str(tmp_path / 'grid.gpkg')
+    grid.to_file(source, driver='GPKG')
+    store_dir = tmp_path / 'store'
+    (store_dir / dataset_store.TILES_DIR).mkdir(parents=True)
+    np.savez(str(store_dir / dataset_store.TILES_DIR / '0_0.part7.npz'),
+             cell_ids=np.array([1], dtype=np.int64), population=np.array([1e6]), countries=np.array(['XX']))
+
+    manifest = ingest_vector(source, str(store_dir), 'TEST', 'TOT_P_2018', tile_size_cells=8)
+    assert manifest['total_population'] == pytest.approx(grid['TOT_P_2018'].sum())
+    assert not [name for name in os.listdir(store_dir / dataset_store.TILES_DIR) if '.part' in name]
+
+
+def test_tile_larger_than_budget_is_not_cached(grid, vector_store):
+    dataset = TiledDataset(vector_store, cache_bytes=1024)
+    selection = dataset.select(ZONES[0])
+    assert len(selection.cell_ids) > 0
+    stats = dataset.stats()
+    assert stats['cached_tiles'] == 0 and stats['uncached_loads'] == stats['tile_loads'] > 0
+
+
+def test_data_version_changes_on_reingest(grid, vector_store, monkeypatch):
+    before = TiledDataset(vector_store).data_version
+    source = os.path.join(vector_store, 'grid.gpkg')
+    grid.to_file(source, driver='GPKG')
+    monkeypatch.setattr(dataset_store.time, 'strftime', lambda fmt: '2099-01-01T00:00:00')
+    ingest_vector(source, vector_store, 'TEST', 'TOT_P_2018', tile_size_cells=8)
+    after = TiledDataset(vector_store).data_version
+    assert before != after and after.startswith('TEST:')
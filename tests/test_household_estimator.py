@@ -0,0 +1,55 @@
+"""Tests de l'estimateur de foyers (estimations scalaire et vectorisée)"""
+
+import numpy as np
+import pytest
+
+from household_estimator import HouseholdEstimator, HOUSEHOLD_METHODS
+
+
+@pytest.fixture(scope='module')
+def estimator():
+    return HouseholdEstimator()
+
+
+def test_encode_countries_maps_unknown_to_default_ratio(estimator):
+    codes = estimator.encode_countries(['FR', 'ZZ', '', 'DE'])
+    ratios = estimator.ratio_table[codes]
+    assert ratios.tolist() == [2.2, estimator.default_ratio, estimator.default_ratio, 2.0]
+
+
+def test_batch_matches_scalar_estimation(estimator):
+    rng = np.random.default_rng(44)
+    count = 20000
+    population = rng.integers(0, 200000, count)
+    population[::5] = 0
+    countries = np.array(list(estimator.household_ratios) + ['ZZ', ''])[
+        rng.integers(0, len(estimator.household_ratios) + 2, count)]
+    buildings = rng.integers(0, 5000, count)
+    buildings[::3] = 0
+
+    batch = estimator.estimate_households_batch(population, estimator.encode_countries(countries), buildings)
+    for index in range(count):
+        scalar = estimator.estimate_households_advanced(
+            int(population[index]), str(countries[index]),
+            building_data={'residential_buildings': int(buildings[index])}
+        )
+        assert batch['households'][index] == scalar['total_households']
+        assert batch['ratio'][index] == scalar['household_ratio']
+        assert HOUSEHOLD_METHODS[batch['method'][index]] == scalar['method']
+
+
+def test_batch_without_buildings_is_statistical(estimator):
+    population = np.array([100000, 0, 4])
+    codes = estimator.encode_countries(['FR', 'FR', 'DE'])
+    batch = estimator.estimate_households_batch(population, codes)
+    expected = [estimator.estimate_households_from_population(int(value), country)
+                for value, country in zip(population, ['FR', 'FR', 'DE'])]
+    assert batch['households'].tolist() == expected
+    assert {HOUSEHOLD_METHODS[method] for method in batch['method']} == {'statistical_ratio'}
+
+
+def test_unrounded_batch_keeps_fractional_households(estimator):
+    batch = estimator.estimate_households_batch(
+        np.array([3.0, 0.0]), estimator.encode_countries(['DE', 'DE']), rounded=False
+    )
+    assert batch['households'].tolist() == [1.5, 0.0]
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from admission import OverloadedError
+from jobs import JobError, JobManager
+
+STAGES = ('first', 'second')
+
+
+def two_stages(value, on_stage):
+    on_stage('first')
+    on_stage('second')
+    return value
+
+
+def wait_finished(job, timeout=2):
+    limit = time.monotonic() + timeout
+    while not job.is_finished and time.monotonic() < limit:
+        time.sleep(0.01)
+    assert job.is_finished
+
+
+def test_job_runs_and_reports_progress():
+    manager = JobManager(STAGES)
+    job, created = manager.submit('a', two_stages, 42)
+    wait_finished(job)
+    data = job.to_dict()
+    assert created and data['status'] == 'done' and data['result'] == 42
+    assert data['progress'] == 1.0
+
+
+def test_same_id_attaches_and_failed_job_is_rerun():
+    manager = JobManager(STAGES)
+    gate = threading.Event()
+
+    def blocked(on_stage):
+        gate.wait(2)
+        raise JobError('raté', 502)
+
+    job, _ = manager.submit('a', blocked)
+    again, created = manager.submit('a', blocked)
+    assert again is job and not created
+    gate.set()
+    wait_finished(job)
+    assert job.to_dict()['error'] == 'raté' and job.error_status == 502
+
+    rerun, created = manager.submit('a', two_stages, 1)
+    assert created and rerun is not job
+
+
+def test_too_many_pending_jobs_are_refused():
+    manager = JobManager(STAGES, max_workers=1, max_pending=1)
+    gate = threading.Event()
+    manager.submit('a', lambda on_stage: gate.wait(2))
+    with pytest.raises(OverloadedError):
+        manager.submit('b', two_stages, 1)
+    gate.set()
+
+
+def test_finished_jobs_are_capped_lru():
+    manager = JobManager(STAGES, max_finished=3)
+    for job_id in 'abc':
+        manager.add_finished(job_id, job_id)
+    assert manager.get('a') is not None  # 'a' devient la plus récemment consultée
+    manager.add_finished('d', 'd')
+
+    assert manager.get('b') is None
+    assert [job_id for job_id in 'acd' if manager.get(job_id) is not None] == ['a', 'c', 'd']
+    assert manager.stats()['jobs'] == 3
+
+
+def test_finished_jobs_expire_after_ttl():
+    manager = JobManager(STAGES, ttl_seconds=60)
+    job = manager.add_finished('a', 1)
+    job.finished -= 120
+    assert manager.get('a') is None
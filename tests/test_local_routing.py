@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from local_routing import ROAD_CLASSES, LocalRouter, RoutingBudgetError
+from upstream_scheduler import Deadline, RequestTimeoutError
+
+SPACING = 100.0
+ORIGIN_X, ORIGIN_Y = 3_800_000.0, 2_800_000.0
+
+
+def write_grid_graph(path, size, oneway_edges=()):
+    """Grille size x size de rues résidentielles espacées de SPACING m"""
+    sources, targets = [], []
+    for row in range(size):
+        for col in range(size):
+            node = row * size + col
+            if col + 1 < size:
+                sources.append(node)
+                targets.append(node + 1)
+            if row + 1 < size:
+                sources.append(node)
+                targets.append(node + size)
+    sources, targets = np.array(sources), np.array(targets)
+    oneway = np.array([(s, t) in oneway_edges for s, t in zip(sources, targets)])
+
+    edge_sources = np.concatenate([sources, targets])
+    edge_targets = np.concatenate([targets, sources])
+    order = np.argsort(edge_sources, kind='stable')
+    indptr = np.zeros(size * size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_sources, minlength=size * size), out=indptr[1:])
+    count = len(edge_sources)
+    cols, rows = np.meshgrid(np.arange(size), np.arange(size))
+    np.savez_compressed(
+        path,
+        indptr=indptr,
+        indices=edge_targets[order].astype(np.int32),
+        length=np.full(count, SPACING, dtype=np.float32),
+        road_class=np.full(count, ROAD_CLASSES.index('residential'), dtype=np.uint8),
+        against_oneway=np.concatenate([np.zeros(len(oneway), dtype=bool), oneway])[order],
+        x=(ORIGIN_X + cols.ravel() * SPACING).astype(np.float32),
+        y=(ORIGIN_Y + rows.ravel() * SPACING).astype(np.float32),
+        road_classes=np.array(ROAD_CLASSES)
+    )
+    return str(path)
+
+
+def test_bounded_dijkstra_respects_time_limit(tmp_path):
+    size = 30
+    router = LocalRouter(write_grid_graph(tmp_path / 'graph.npz', size))
+    weights = router._profile_weights('foot-walking')
+    seconds_per_edge = SPACING / (5 / 3.6)
+
+    reached = router._bounded_dijkstra(0, weights, limit=10 * seconds_per_edge + 1)
+
+    rows, cols = np.divmod(np.arange(size * size), size)
+    expected = np.flatnonzero(rows + cols <= 10)
+    assert np.array_equal(np.sort(reached), expected)
+
+
+def test_bounded_dijkstra_oneway_only_for_cars(tmp_path):
+    # Nœuds 0-1-2 en ligne, 1 -> 0 interdit en voiture
+    router = LocalRouter(write_grid_graph(tmp_path / 'graph.npz', 3, oneway_edges={(0, 1)}))
+    limit = 1e6
+
+    car = router._bounded_dijkstra(1, router._profile_weights('driving-car'), limit)
+    walk = router._bounded_dijkstra(1, router._profile_weights('foot-walking'), limit)
+    assert 0 in car and 0 in walk
+
+    # Depuis 1, la voiture rejoint 0 par le détour 1 -> 4 -> 3 -> 0
+    car_weights = router._profile_weights('driving-car')
+    direct = SPACING / (25 / 3.6)
+    assert 0 not in router._bounded_dijkstra(1, car_weights, 1.5 * direct)
+    assert 0 in router._bounded_dijkstra(1, router._profile_weights('foot-walking'), 1.5 * SPACING / (5 / 3.6))
+
+
+def test_bounded_dijkstra_node_budget(tmp_path):
+    router = LocalRouter(write_grid_graph(tmp_path / 'graph.npz', 20), max_python_nodes=50)
+    with pytest.raises(RoutingBudgetError):
+        router._bounded_dijkstra(0, router._profile_weights('foot-walking'), limit=1e9)
+
+
+def test_bounded_dijkstra_checks_deadline(tmp_path):
+    router = LocalRouter(write_grid_graph(tmp_path / 'graph.npz', 80))
+    with pytest.raises(RequestTimeoutError):
+        router._bounded_dijkstra(0, router._profile_weights('foot-walking'), limit=1e9, deadline=Deadline(0))
+
+
+def write_parallel_edges_graph(path):
+    """Nœuds 0 et 1 reliés par deux arêtes parallèles (100 m et 300 m) dans chaque sens"""
+    count = 4
+    np.savez_compressed(
+        path,
+        indptr=np.array([0, 2, 4], dtype=np.int64),
+        indices=np.array([1, 1, 0, 0], dtype=np.int32),
+        length=np.array([300, 100, 100, 300], dtype=np.float32),
+        road_class=np.full(count, ROAD_CLASSES.index('residential'), dtype=np.uint8),
+        against_oneway=np.zeros(count, dtype=bool),
+        x=np.array([ORIGIN_X, ORIGIN_X + 100], dtype=np.float32),
+        y=np.array([ORIGIN_Y, ORIGIN_Y], dtype=np.float32),
+        road_classes=np.array(ROAD_CLASSES)
+    )
+    return str(path)
+
+
+def test_parallel_edges_use_the_fastest(tmp_path):
+    router = LocalRouter(write_parallel_edges_graph(tmp_path / 'graph.npz'))
+    weights = router._profile_weights('foot-walking')
+    fastest = SPACING / (5 / 3.6)
+    assert 1 in router._bounded_dijkstra(0, weights, limit=1.1 * fastest)
+    assert 1 not in router._bounded_dijkstra(0, weights, limit=0.9 * fastest)
+
+
+def test_parallel_edges_backends_agree(tmp_path):
+    csgraph = pytest.importorskip('scipy.sparse.csgraph')
+    router = LocalRouter(write_parallel_edges_graph(tmp_path / 'graph.npz'))
+    weights = router._profile_weights('foot-walking')
+    for limit in (0.9 * SPACING / (5 / 3.6), 1.1 * SPACING / (5 / 3.6)):
+        times = csgraph.dijkstra(router._matrices['foot-walking'], directed=True, indices=0, limit=limit)
+        assert np.array_equal(np.flatnonzero(np.isfinite(times)),
+                              np.sort(router._bounded_dijkstra(0, weights, limit)))
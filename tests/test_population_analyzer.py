@@ -0,0 +1,94 @@
+import threading
+import time
+
+import numpy as np
+import pyproj
+from shapely.geometry import box
+
+import population_analyzer
+from building_grid import BuildingGrid
+from cell_aggregation import CellSelection
+from household_estimator import HouseholdEstimator
+from population_analyzer import PopulationAnalyzer
+from singleflight import SingleFlight
+from upstream_scheduler import Deadline
+
+
+def test_shared_analysis_outlives_the_leader_deadline(monkeypatch):
+    monkeypatch.setitem(population_analyzer.ADMISSION_CONFIG, 'request_budget_seconds', 30)
+    analyzer = PopulationAnalyzer.__new__(PopulationAnalyzer)
+    analyzer.flights = SingleFlight()
+    analyzer.default_dataset = 'JRC_GRID_2018'
+    budgets = []
+
+    def analyze(address, time_minutes, profile, dataset, deadline=None, on_stage=None, coordinates=None):
+        budgets.append(deadline.remaining())
+        time.sleep(0.3)
+        return {'address': address, 'population': 42}
+
+    monkeypatch.setattr(analyzer, '_analyze_location', analyze)
+    results = {}
+
+    def call(name, address, budget):
+        results[name] = analyzer.analyze_location(address, deadline=Deadline(budget))
+
+    # Le premier appelant (échéance courte) lance le calcul, le second s'y joint
+    short = threading.Thread(target=call, args=('short', 'Paris', 0.1))
+    short.start()
+    time.sleep(0.02)
+    long = threading.Thread(target=call, args=('long', ' PARIS', 5))
+    long.start()
+    short.join(2)
+    long.join(2)
+
+    assert results['short']['status'] == 504
+    assert results['long'] == {'address': ' PARIS', 'population': 42}
+    assert len(budgets) == 1 and budgets[0] > 5
+
+
+class RecordingEstimator:
+    _empty_buildings = staticmethod(HouseholdEstimator._empty_buildings)
+
+    def __init__(self):
+        self.bboxes = []
+
+    def get_buildings_from_osm(self, bbox, timeout=25, deadline=None):
+        self.bboxes.append(bbox)
+        return {'residential_buildings': 7, 'total_buildings': 9, 'building_types': {}, 'residential_ratio': 7 / 9}
+
+
+def grid_analyzer(tmp_path):
+    analyzer = PopulationAnalyzer.__new__(PopulationAnalyzer)
+    analyzer.transformer_to_etrs = pyproj.Transformer.from_crs('EPSG:4326', 'EPSG:3035', always_xy=True)
+    analyzer.default_dataset = 'JRC_GRID_2018'
+    analyzer.shards = None
+    analyzer.datasets = {}
+    analyzer.household_estimator = RecordingEstimator()
+    # Extrait couvrant ~2.0-2.8° E, 48.5-49.1° N
+    x, y = analyzer.transformer_to_etrs.transform([2.0, 2.8, 2.8, 2.0], [48.5, 48.5, 49.1, 49.1])
+    path = tmp_path / 'grid.npz'
+    np.savez(path, cell_ids=np.array([(2_880 << 32) | 3_760], dtype=np.int64),
+             residential=np.array([3], dtype=np.uint32), total=np.array([4], dtype=np.uint32),
+             resolution=np.float64(1000), coverage=np.column_stack([x, y]))
+    analyzer.building_grid = BuildingGrid(str(path))
+    return analyzer
+
+
+def stage_args(analyzer, isochrone):
+    selection = CellSelection(np.array([(2_880 << 32) | 3_760], dtype=np.int64), np.array([10.0]), np.array(['FR']))
+    return isochrone, (selection, analyzer.to_etrs(isochrone), None), None
+
+
+def test_buildings_outside_the_grid_extent_use_overpass_or_are_degraded(tmp_path):
+    analyzer = grid_analyzer(tmp_path)
+    inside = box(2.3, 48.8, 2.4, 48.9)
+    outside = box(4.3, 50.8, 4.4, 50.9)
+
+    assert analyzer._grid_buildings_stage(*stage_args(analyzer, inside))['source'] == 'grid'
+    assert analyzer.household_estimator.bboxes == []
+
+    assert analyzer._grid_buildings_stage(*stage_args(analyzer, outside))['residential_buildings'] == 7
+    assert analyzer.household_estimator.bboxes == [outside.bounds]
+
+    empty = analyzer._grid_buildings_stage(*stage_args(analyzer, outside), use_overpass=False)
+    assert empty['residential_buildings'] == 0 and 'emprise' in empty['error']
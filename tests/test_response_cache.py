@@ -0,0 +1,89 @@
+import json
+import time
+
+import pytest
+
+import api
+from conftest import analysis_results
+from response_cache import ResponseCache, analysis_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ResponseCache(max_entries=4, disk_dir=str(tmp_path))
+    monkeypatch.setattr(api, 'response_cache', cache)
+    return cache
+
+
+def test_cache_key_normalizes_address():
+    assert analysis_cache_key(10, 'driving-car', 'v1', address='  Paris,  France ') == \
+        analysis_cache_key(10, 'driving-car', 'v1', address='paris, france')
+    assert analysis_cache_key(10, 'driving-car', 'v1', address='Paris') != \
+        analysis_cache_key(10, 'driving-car', 'v2', address='Paris')
+
+
+def test_memory_and_disk_round_trip(cache, tmp_path):
+    etag = cache.put('key', b'{"a": 1}\n')
+    assert cache.get('key') == (b'{"a": 1}\n', etag)
+
+    # Nouveau processus: seul le niveau disque subsiste
+    restarted = ResponseCache(disk_dir=str(tmp_path))
+    assert restarted.get('key') == (b'{"a": 1}\n', etag)
+    assert restarted.hits == {'memory': 0, 'disk': 1}
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = ResponseCache(disk_dir=str(tmp_path), ttl_seconds=60)
+    cache.put('key', b'{}')
+    cache._memory['key'] = cache._memory['key'][:2] + (time.time() - 120,)
+    record = json.loads((tmp_path / 'key.json').read_text())
+    record['created'] -= 120
+    (tmp_path / 'key.json').write_text(json.dumps(record))
+
+    assert cache.get('key') is None
+    assert not (tmp_path / 'key.json').exists()
+
+
+def test_etag_and_not_modified(cache):
+    with api.app.test_request_context('/analyze'):
+        response = api.analysis_json_response('key', analysis_results())
+        etag = response.headers['ETag']
+        assert response.status_code == 200
+        assert response.headers['X-Cache'] == 'MISS'
+        assert json.loads(response.get_data())['data']['households']['total'] == 450
+
+    body, stored_etag = cache.get('key')
+    assert etag == f'"{stored_etag}"'
+    with api.app.test_request_context('/analyze', headers={'If-None-Match': etag}):
+        response = api.cached_json_response(body, stored_etag, 'HIT')
+        assert response.status_code == 304
+        assert response.get_data() == b''
+    with api.app.test_request_context('/analyze', headers={'If-None-Match': '"other"'}):
+        assert api.cached_json_response(body, stored_etag, 'HIT').status_code == 200
+
+
+def test_degraded_results_are_not_cached(cache):
+    with api.app.test_request_context('/analyze'):
+        response = api.analysis_json_response('key', analysis_results(degraded=['buildings']))
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert json.loads(response.get_data())['data']['degraded'] == ['buildings']
+    assert cache.get('key') is None
+
+
+@pytest.mark.parametrize('content', ['{"etag": "x", "created": 1}', '[]', '{"etag": "x", "created": "?", "body": ""}',
+                                     '{"etag": "x", "created": 1, "body": 3}', '{"body'])
+def test_corrupt_disk_entry_is_a_miss(tmp_path, content):
+    (tmp_path / 'key.json').write_text(content)
+    assert ResponseCache(disk_dir=str(tmp_path)).get('key') is None
+
+
+def test_new_dataset_version_misses_the_cache(client, fake_analyzer):
+    first = client.get('/analyze?address=Paris')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert client.get('/analyze?address=Paris').headers['X-Cache'] == 'HIT'
+
+    fake_analyzer.versions['JRC_GRID_2018'] = 'JRC_GRID_2018:v2'
+    assert client.get('/analyze?address=Paris').headers['X-Cache'] == 'MISS'
+    assert len(fake_analyzer.calls) == 2
@@ -0,0 +1,100 @@
+from collections import Counter
+
+import requests
+
+import router as router_module
+from hash_ring import HashRing, region_key, region_of
+from router import Router
+
+KEYS = [f"{x}_{y}" for x in range(20, 80) for y in range(10, 60)]
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    before = HashRing(['a', 'b', 'c'])
+    after = HashRing(['a', 'b', 'c', 'd'])
+    moved = [key for key in KEYS if before.node_for(key) != after.node_for(key)]
+
+    assert all(after.node_for(key) == 'd' for key in moved)
+    assert 0.1 < len(moved) / len(KEYS) < 0.4
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    owners = {key: ring.node_for(key) for key in KEYS}
+    ring.remove('b')
+    for key in KEYS:
+        if owners[key] != 'b':
+            assert ring.node_for(key) == owners[key]
+        else:
+            assert ring.node_for(key) != 'b'
+
+
+def test_keys_are_spread_and_failover_order_is_distinct():
+    ring = HashRing(['a', 'b', 'c'])
+    counts = Counter(ring.node_for(key) for key in KEYS)
+    assert min(counts.values()) > len(KEYS) / 6
+    order = list(ring.nodes_for('37_28'))
+    assert sorted(order) == ['a', 'b', 'c'] and order[0] == ring.node_for('37_28')
+
+
+def test_region_of_matches_etrs_squares():
+    assert region_of(2.35, 48.85, 100000) == '37_28'
+    assert region_key(3_799_999, 2_800_000, 100000) == '37_28'
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+def test_geocode_asks_the_address_node_and_caches(monkeypatch):
+    calls = []
+
+    def fake_get(url, params=None, headers=None, timeout=None):
+        calls.append((url, headers.get('X-Router-Token')))
+        return FakeResponse(200, {'lon': 2.35, 'lat': 48.85})
+
+    monkeypatch.setattr(router_module.requests, 'get', fake_get)
+    router = Router(['http://n1', 'http://n2', 'http://n3'], token='secret')
+
+    assert router.geocode('Paris, France') == (2.35, 48.85)
+    assert router.geocode('  paris,  FRANCE ') == (2.35, 48.85)
+    owner = router.ring.node_for('address:paris, france')
+    assert calls == [(f'{owner}/geocode', 'secret')]
+
+
+def test_geocode_fails_over_unreachable_nodes_only(monkeypatch):
+    calls = []
+
+    def fake_get(url, params=None, headers=None, timeout=None):
+        calls.append(url)
+        if len(calls) == 1:
+            raise requests.ConnectionError('down')
+        return FakeResponse(404, {'error': 'introuvable'})
+
+    monkeypatch.setattr(router_module.requests, 'get', fake_get)
+    router = Router(['http://n1', 'http://n2', 'http://n3'], token='secret')
+
+    assert router.geocode('Nulle part') is None
+    assert len(calls) == 2 and router.failovers == 1
+
+
+def test_geocode_without_token_does_not_call_anything(monkeypatch):
+    monkeypatch.setattr(router_module.requests, 'get', lambda *args, **kwargs: 1 / 0)
+    router = Router(['http://n1'])
+    assert router.geocode('Paris') is None
+    key, coordinates = router.origin('analyze', {'address': 'Paris'})
+    assert key == 'address:paris' and coordinates is None
+
+
+def test_node_geocode_requires_router_token(monkeypatch):
+    import api
+    monkeypatch.setitem(api.ROUTER_CONFIG, 'token', 'secret')
+    client = api.app.test_client()
+    assert client.get('/geocode?address=Paris').status_code == 403
+    assert client.get('/geocode?address=Paris', headers={'X-Router-Token': 'bad'}).status_code == 403
+    assert client.get('/geocode', headers={'X-Router-Token': 'secret'}).status_code == 400
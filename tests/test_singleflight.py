@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight, normalize_address
+
+
+def run_concurrently(flights, fn, callers, **kwargs):
+    """Lance callers appels de même clé pendant que le premier calcule"""
+    results, errors = [None] * callers, [None] * callers
+
+    def call(index):
+        try:
+            results[index] = flights.do('key', fn, **kwargs)
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def slow(value, delay=0.2):
+    def fn():
+        time.sleep(delay)
+        return value
+    return fn
+
+
+def test_concurrent_calls_run_once():
+    flights = SingleFlight()
+    executions = []
+
+    def fn():
+        executions.append(1)
+        time.sleep(0.2)
+        return 42
+
+    results, errors = run_concurrently(flights, fn, 5)
+    assert errors == [None] * 5
+    assert [result for result, _ in results] == [42] * 5
+    assert all(shared for _, shared in results)
+    assert len(executions) == 1
+    assert flights.stats() == {'in_flight': 0, 'executed': 1, 'coalesced': 4, 'timed_out': 0}
+
+
+def test_copy_result_gives_every_caller_its_own_copy():
+    flights = SingleFlight()
+    original = {'values': [1, 2, 3]}
+    results, _ = run_concurrently(flights, slow(original), 4, copy_result=True)
+
+    copies = [result for result, _ in results]
+    assert len({id(result) for result in copies} | {id(original)}) == 5
+    copies[0]['values'].append(4)
+    assert original == {'values': [1, 2, 3]}
+    assert all(result == {'values': [1, 2, 3]} for result in copies[1:])
+
+
+def test_unshared_result_is_not_copied():
+    flights = SingleFlight()
+    original = {'a': 1}
+    result, shared = flights.do('key', lambda: original, copy_result=True)
+    assert result is original and not shared
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    def fn():
+        time.sleep(0.2)
+        raise ValueError('boom')
+
+    _, errors = run_concurrently(flights, fn, 3)
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_waiter_gives_up_after_wait_timeout():
+    flights = SingleFlight()
+    leader = threading.Thread(target=flights.do, args=('key', slow(1, delay=0.5)))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError):
+        flights.do('key', slow(2), wait_timeout=0.05)
+    leader.join()
+    assert flights.stats()['timed_out'] == 1
+
+
+def test_normalize_address():
+    assert normalize_address('  10 Rue de  Rivoli,\tPARIS ') == '10 rue de rivoli, paris'
+
+
+def test_detached_leader_gives_up_without_stopping_the_computation():
+    flights = SingleFlight()
+    with pytest.raises(TimeoutError):
+        flights.do('key', slow({'a': 1}, delay=0.3), wait_timeout=0.05, detach=True, copy_result=True)
+    # Le calcul continue: un appelant plus patient reçoit son résultat
+    result, shared = flights.do('key', slow({'a': 2}), wait_timeout=2, detach=True, copy_result=True)
+    assert result == {'a': 1} and shared
+    assert flights.stats()['executed'] == 1
@@ -0,0 +1,65 @@
+import math
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from rasterio.io import MemoryFile
+from rasterio.transform import from_origin
+
+from tile_pyramid import DENSITY_CLASSES, DENSITY_PALETTE, PyramidNotReadyError, TilePyramid
+
+
+def png_indices(data):
+    """Indices de palette d'un PNG produit par _encode_png"""
+    offset, idat, width = 8, b'', None
+    while offset < len(data):
+        length, tag = struct.unpack('>I4s', data[offset:offset + 8])
+        payload = data[offset + 8:offset + 8 + length]
+        if tag == b'IHDR':
+            width = struct.unpack('>I', payload[:4])[0]
+        elif tag == b'IDAT':
+            idat += payload
+        offset += 12 + length
+    rows = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(-1, width + 1)
+    return rows[:, 1:]
+
+
+def test_every_density_class_is_visible():
+    assert len(DENSITY_PALETTE) == len(DENSITY_CLASSES) + 2
+    density = np.zeros((256, 256), dtype=np.float32)
+    samples = [0, 0.2, 5, 20, 75, 150, 300, 700, 1500, 3000, 7000, 20000]
+    density[0, :len(samples)] = samples
+
+    indices = png_indices(TilePyramid._encode_png(density))[0, :len(samples)]
+    assert indices.tolist() == list(range(len(DENSITY_PALETTE)))
+
+
+@pytest.fixture
+def raster():
+    # 400 x 400 km autour de Paris à 1 km, 100 hab par cellule
+    data = np.full((400, 400), 100, dtype=np.float32)
+    with MemoryFile() as memfile:
+        with memfile.open(driver='GTiff', width=400, height=400, count=1, dtype='float32',
+                          crs='EPSG:3035', transform=from_origin(3_560_000, 3_090_000, 1000, 1000)) as dataset:
+            dataset.write(data, 1)
+        with memfile.open() as dataset:
+            yield dataset
+
+
+def tile_of(lon, lat, z):
+    n = 1 << z
+    return z, int((lon + 180) / 360 * n), int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+
+
+def test_reduced_levels_wait_for_the_background_build(raster):
+    pyramid = TilePyramid(raster, levels=4)
+    with pytest.raises(PyramidNotReadyError):
+        pyramid.get_tile(*tile_of(2.35, 48.85, 4))
+    # Le niveau 0 est disponible sans attendre
+    assert pyramid.render_density(*tile_of(2.35, 48.85, 12)).max() == pytest.approx(100)
+
+    pyramid.build_async().join(10)
+    assert pyramid.ready
+    density = pyramid.render_density(*tile_of(2.35, 48.85, 4))
+    assert density.max() == pytest.approx(100)
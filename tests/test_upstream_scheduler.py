@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+import upstream_scheduler
+from upstream_scheduler import (PRIORITY_BATCH, PRIORITY_INTERACTIVE, DeadlineExceededError,
+                                UpstreamError, UpstreamScheduler)
+
+
+class BlockingHandler:
+    """Handler qui garde le premier appel jusqu'à gate.set() et note chaque appel"""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self, merge_key, payloads, timeout):
+        self.calls.append((merge_key, list(payloads)))
+        self.started.set()
+        self.gate.wait(5)
+        return [f"{merge_key}:{payload}" for payload in payloads]
+
+
+def test_compatible_calls_are_merged():
+    handler = BlockingHandler()
+    scheduler = UpstreamScheduler()
+    scheduler.register('svc', handler, max_batch=3)
+
+    first = scheduler.submit('svc', 0, merge_key='a')
+    assert handler.started.wait(2)
+    futures = [scheduler.submit('svc', index, merge_key='a') for index in range(1, 5)]
+    other = scheduler.submit('svc', 9, merge_key='b')
+    handler.gate.set()
+
+    assert first.result(2) == 'a:0'
+    assert [future.result(2) for future in futures] == ['a:1', 'a:2', 'a:3', 'a:4']
+    assert other.result(2) == 'b:9'
+    assert [len(payloads) for _, payloads in handler.calls] == [1, 3, 1, 1]
+    assert scheduler.stats()['svc']['merged'] == 2
+
+
+def test_interactive_calls_overtake_batch_calls():
+    handler = BlockingHandler()
+    scheduler = UpstreamScheduler()
+    scheduler.register('svc', handler)
+
+    scheduler.submit('svc', 'first')
+    assert handler.started.wait(2)
+    batch = scheduler.submit('svc', 'batch', priority=PRIORITY_BATCH)
+    interactive = scheduler.submit('svc', 'interactive', priority=PRIORITY_INTERACTIVE)
+    handler.gate.set()
+
+    interactive.result(2)
+    batch.result(2)
+    assert [payloads[0] for _, payloads in handler.calls] == ['first', 'interactive', 'batch']
+
+
+def test_interactive_call_overtakes_batch_call_waiting_for_tokens():
+    calls = []
+    scheduler = UpstreamScheduler()
+    scheduler.register('svc', lambda key, payloads, timeout: calls.extend(payloads) or payloads,
+                       limits=[(1, 0.4)])
+
+    scheduler.call('svc', 'first', priority=PRIORITY_BATCH)
+    batch = scheduler.submit('svc', 'batch', priority=PRIORITY_BATCH)
+    time.sleep(0.1)
+    interactive = scheduler.submit('svc', 'interactive', priority=PRIORITY_INTERACTIVE)
+
+    interactive.result(2)
+    batch.result(2)
+    assert calls == ['first', 'interactive', 'batch']
+
+
+def test_short_handler_result_raises():
+    scheduler = UpstreamScheduler()
+    scheduler.register('svc', lambda key, payloads, timeout: [])
+    with pytest.raises(UpstreamError, match='incomplète'):
+        scheduler.call('svc', 'x')
+
+
+def test_call_gives_up_after_deadline(monkeypatch):
+    monkeypatch.setattr(upstream_scheduler, 'RESULT_GRACE_SECONDS', 0.1)
+    gate = threading.Event()
+    scheduler = UpstreamScheduler()
+    scheduler.register('svc', lambda key, payloads, timeout: gate.wait(5) and payloads)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError):
+        scheduler.call('svc', 'x', deadline=time.monotonic() + 0.2)
+    assert time.monotonic() - started < 2
+    gate.set()
+
+
+def test_queued_call_expires_when_tokens_arrive_too_late():
+    scheduler = UpstreamScheduler()
+    scheduler.register('svc', lambda key, payloads, timeout: payloads, limits=[(1, 60)])
+    scheduler.call('svc', 'first')
+    with pytest.raises(DeadlineExceededError):
+        scheduler.call('svc', 'second', deadline=time.monotonic() + 1)
+    assert scheduler.stats()['svc']['expired'] == 1
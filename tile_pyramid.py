@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Pyramide multi-résolution de densité de population
+Construit des niveaux réduits à partir du raster JRC_1K_POP_2018 et génère
+des tuiles XYZ (Web Mercator) en PNG ou en grille binaire compacte
+"""
+
+import hashlib
+import math
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import numpy as np
+import pyproj
+from rasterio.windows import Window
+
+# Taille d'une tuile en pixels
+TILE_SIZE = 256
+
+# Demi-étendue du monde en Web Mercator (mètres)
+WEB_MERCATOR_HALF_WORLD = 20037508.342789244
+
+# Formats de tuiles supportés
+TILE_FORMATS = {
+    'png': 'image/png',
+    'bin': 'application/octet-stream'
+}
+
+# Bornes des classes de densité (hab/km²) et palette associée (du jaune au
+# rouge foncé): indice 0 transparent (pas de population), indice 1 pour les
+# densités non nulles sous la première borne, puis une classe par borne
+DENSITY_CLASSES = np.array([1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000], dtype=np.float32)
+DENSITY_PALETTE = [
+    (0, 0, 0),          # 0: transparent (pas de population)
+    (255, 255, 229),    # ]0, 1[
+    (255, 255, 204),
+    (255, 237, 160),
+    (254, 217, 118),
+    (254, 178, 76),
+    (253, 141, 60),
+    (252, 78, 42),
+    (227, 26, 28),
+    (189, 0, 38),
+    (128, 0, 38),
+    (84, 0, 30),        # >= 10000
+]
+DENSITY_ALPHA = [0] + [200] * (len(DENSITY_PALETTE) - 1)
+
+
+class PyramidNotReadyError(Exception):
+    """Le niveau réduit nécessaire à la tuile est encore en construction"""
+
+
+class TileCache:
+    """Cache LRU de tuiles encodées, partagé entre les threads du serveur"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class TilePyramid:
+    def __init__(self, raster, levels: int = 8, cache_size: int = 2048,
+                 dataset_version: str = 'JRC_GRID_2018'):
+        """
+        Initialise la pyramide de densité
+
+        Args:
+            raster: Dataset rasterio ouvert (JRC_1K_POP_2018.tif, EPSG:3035)
+            levels: Nombre de niveaux (facteurs de réduction 1, 2, 4, ...)
+            cache_size: Nombre maximal de tuiles gardées en cache
+            dataset_version: Version des données, intégrée aux ETags
+        """
+        self.raster = raster
+        self.levels = max(1, levels)
+        self.dataset_version = dataset_version
+        self.cache = TileCache(cache_size)
+
+        # Géoréférencement du niveau 0 (raster nord en haut, pixels carrés)
+        self.origin_x = raster.transform.c
+        self.origin_y = raster.transform.f
+        self.resolution = raster.transform.a
+        self.cell_area_km2 = (self.resolution / 1000) ** 2
+
+        # Niveaux réduits: facteur -> densité moyenne (hab/km²)
+        self._grids = {}
+        self._raster_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+        self.transformer_to_etrs = pyproj.Transformer.from_crs(
+            "EPSG:3857", "EPSG:3035", always_xy=True
+        )
+
+    def build(self):
+        """
+        Précalcule les niveaux réduits de la pyramide
+
+        Le niveau 1 (facteur 2) est obtenu par bandes à partir du raster
+        pleine résolution pour borner la mémoire, les niveaux suivants par
+        moyenne 2x2 du niveau précédent. Le niveau 0 reste sur disque et
+        est lu par fenêtre.
+        """
+        with self._build_lock:
+            if self._grids or self.levels < 2:
+                return
+            grid = self._reduce_raster_by_strips()
+            factor = 2
+            self._grids[factor] = grid
+            for _ in range(2, self.levels):
+                grid = self._downsample(grid)
+                factor *= 2
+                self._grids[factor] = grid
+        print(f"✓ Pyramide de tuiles construite ({len(self._grids) + 1} niveaux)")
+
+    def build_async(self) -> threading.Thread:
+        """
+        Construit les niveaux réduits en arrière-plan
+
+        Le serveur démarre sans attendre: d'ici la fin de la construction,
+        les tuiles servies au niveau 0 sont disponibles et les autres lèvent
+        PyramidNotReadyError.
+        """
+        def run():
+            try:
+                self.build()
+            except Exception as e:
+                print(f"Erreur construction pyramide de tuiles: {e}")
+
+        thread = threading.Thread(target=run, name='tile-pyramid', daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def ready(self) -> bool:
+        """Vrai si tous les niveaux réduits sont construits"""
+        return len(self._grids) + 1 >= self.levels
+
+    def _reduce_raster_by_strips(self, strip_rows: int = 512) -> np.ndarray:
+        """Réduit le raster d'un facteur 2 par bandes de lignes"""
+        height, width = self.raster.height, self.raster.width
+        out = np.zeros(((height + 1) // 2, (width + 1) // 2), dtype=np.float32)
+        for row_start in range(0, height, strip_rows):
+            rows = min(strip_rows, height - row_start)
+            with self._raster_lock:
+                strip = self.raster.read(1, window=Window(0, row_start, width, rows), masked=True)
+            strip = self._to_density(strip)
+            reduced = self._downsample(strip)
+            out_row = row_start // 2
+            out[out_row:out_row + reduced.shape[0], :reduced.shape[1]] = reduced
+        return out
+
+    def _to_density(self, values) -> np.ndarray:
+        """Convertit des valeurs de cellules en densité (hab/km²), nodata à 0"""
+        density = np.ma.filled(values.astype(np.float32), 0)
+        density[~np.isfinite(density) | (density < 0)] = 0
+        return density / self.cell_area_km2
+
+    @staticmethod
+    def _downsample(grid: np.ndarray) -> np.ndarray:
+        """Moyenne 2x2 (les bords impairs sont complétés par des zéros)"""
+        height, width = grid.shape
+        padded = np.zeros((height + height % 2, width + width % 2), dtype=np.float32)
+        padded[:height, :width] = grid
+        return padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).mean(axis=(1, 3))
+
+    @staticmethod
+    def is_valid_tile(z: int, x: int, y: int, max_zoom: int) -> bool:
+        """Vérifie qu'une tuile XYZ existe au zoom demandé"""
+        if z < 0 or z > max_zoom:
+            return False
+        n = 1 << z
+        return 0 <= x < n and 0 <= y < n
+
+    def get_tile(self, z: int, x: int, y: int, fmt: str = 'png') -> Tuple[bytes, str]:
+        """
+        Retourne une tuile encodée et son ETag (via le cache LRU)
+
+        Args:
+            z, x, y: Coordonnées XYZ de la tuile
+            fmt: 'png' (rendu coloré) ou 'bin' (float32 little-endian, hab/km²)
+
+        Returns:
+            tuple: (contenu, etag non quoté)
+        """
+        key = (z, x, y, fmt)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+
+        density = self.render_density(z, x, y)
+        if fmt == 'png':
+            data = self._encode_png(density)
+        else:
+            data = density.astype('<f4').tobytes()
+
+        digest = hashlib.sha1(data).hexdigest()[:20]
+        etag = f'{self.dataset_version}-{fmt}-{digest}'
+        entry = (data, etag)
+        self.cache.put(key, entry)
+        return entry
+
+    def render_density(self, z: int, x: int, y: int) -> np.ndarray:
+        """
+        Calcule la grille de densité (TILE_SIZE x TILE_SIZE) d'une tuile
+
+        Returns:
+            np.ndarray: Densité en hab/km² (0 hors couverture)
+
+        Raises:
+            PyramidNotReadyError: Le niveau réduit adapté n'est pas encore construit
+        """
+        tile_span = 2 * WEB_MERCATOR_HALF_WORLD / (1 << z)
+        pixel_size = tile_span / TILE_SIZE
+        min_x = -WEB_MERCATOR_HALF_WORLD + x * tile_span
+        max_y = WEB_MERCATOR_HALF_WORLD - y * tile_span
+
+        # Centres des pixels en Web Mercator puis en ETRS89 LAEA
+        offsets = (np.arange(TILE_SIZE) + 0.5) * pixel_size
+        merc_x, merc_y = np.meshgrid(min_x + offsets, max_y - offsets)
+        etrs_x, etrs_y = self.transformer_to_etrs.transform(merc_x, merc_y)
+
+        # Résolution au sol d'un pixel (la projection Mercator dilate les distances)
+        center_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 0.5) / (1 << z)))))
+        ground_pixel = pixel_size * math.cos(math.radians(center_lat))
+        factor = self._select_factor(ground_pixel)
+        if factor > 1 and factor not in self._grids:
+            raise PyramidNotReadyError(f"Niveau de facteur {factor} en construction")
+
+        level_resolution = self.resolution * factor
+        with np.errstate(invalid='ignore'):
+            cols = np.floor((etrs_x - self.origin_x) / level_resolution)
+            rows = np.floor((self.origin_y - etrs_y) / level_resolution)
+        valid = np.isfinite(cols) & np.isfinite(rows)
+
+        density = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.float32)
+        if factor == 1:
+            height, width = self.raster.height, self.raster.width
+        else:
+            height, width = self._grids[factor].shape
+        valid &= (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height)
+        if not valid.any():
+            return density
+
+        cols = cols[valid].astype(np.int64)
+        rows = rows[valid].astype(np.int64)
+        if factor == 1:
+            density[valid] = self._read_base(rows, cols)
+        else:
+            density[valid] = self._grids[factor][rows, cols]
+        return density
+
+    def _select_factor(self, ground_pixel: float) -> int:
+        """Choisit le niveau le plus grossier dont la résolution reste sous celle du pixel"""
+        factor = 1
+        max_factor = 1 << (self.levels - 1)
+        while factor * 2 <= max_factor and self.resolution * factor * 2 <= ground_pixel:
+            factor *= 2
+        return factor
+
+    def _read_base(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Lit au niveau 0 la fenêtre du raster couvrant les pixels demandés"""
+        row_min, row_max = int(rows.min()), int(rows.max())
+        col_min, col_max = int(cols.min()), int(cols.max())
+        window = Window(col_min, row_min, col_max - col_min + 1, row_max - row_min + 1)
+        with self._raster_lock:
+            values = self.raster.read(1, window=window, masked=True)
+        values = self._to_density(values)
+        return values[rows - row_min, cols - col_min]
+
+    @staticmethod
+    def _encode_png(density: np.ndarray) -> bytes:
+        """Encode une grille de densité en PNG palettisé avec transparence"""
+        indices = (np.searchsorted(DENSITY_CLASSES, density, side='right') + 1).astype(np.uint8)
+        indices[density <= 0] = 0
+
+        def chunk(tag: bytes, payload: bytes) -> bytes:
+            return (struct.pack('>I', len(payload)) + tag + payload +
+                    struct.pack('>I', zlib.crc32(tag + payload) & 0xffffffff))
+
+        height, width = indices.shape
+        header = struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)
+        palette = bytes(channel for color in DENSITY_PALETTE for channel in color)
+        alpha = bytes(DENSITY_ALPHA)
+        # Chaque ligne est précédée de l'octet de filtre 0 (aucun)
+        raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), indices]).tobytes()
+
+        return (b'\x89PNG\r\n\x1a\n' +
+                chunk(b'IHDR', header) +
+                chunk(b'PLTE', palette) +
+                chunk(b'tRNS', alpha) +
+                chunk(b'IDAT', zlib.compress(raw, 6)) +
+                chunk(b'IEND', b''))
+
+    def stats(self) -> Dict:
+        """Statistiques de la pyramide et du cache"""
+        return {
+            'levels': len(self._grids) + 1,
+            'ready': self.ready,
+            'factors': [1] + sorted(self._grids),
+            'cache': self.cache.stats()
+        }
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Ordonnanceur des appels aux services externes (OpenRouteService, Overpass)
+Seaux à jetons par service, classes de priorité, files bornées avec
+échéances et regroupement des requêtes compatibles en un seul appel
+"""
+
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Classes de priorité (la plus petite valeur passe en premier)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+# Délai accordé à un appel en cours au-delà de son échéance avant d'abandonner l'attente
+RESULT_GRACE_SECONDS = 5
+
+_current_priority = contextvars.ContextVar('upstream_priority', default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def upstream_priority(priority: int):
+    """Fixe la priorité des appels externes émis dans le bloc (ex: traitements batch)"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> int:
+    """Priorité courante des appels externes"""
+    return _current_priority.get()
+
+
+class UpstreamError(Exception):
+    """Échec d'un appel à un service externe"""
+
+    def __init__(self, message: str, upstream: str = None, retry_after: float = None):
+        super().__init__(message)
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class UpstreamUnavailableError(UpstreamError):
+    """Service momentanément saturé: l'appelant peut réessayer plus tard"""
+
+
+class RateLimitedError(UpstreamUnavailableError):
+    """Le service a refusé l'appel pour dépassement de quota (HTTP 429)"""
+
+
+class QueueFullError(UpstreamUnavailableError):
+    """La file d'attente du service est pleine"""
+
+
+class DeadlineExceededError(UpstreamUnavailableError):
+    """L'échéance de l'appel est dépassée avant son exécution"""
+
+
+class RequestTimeoutError(TimeoutError):
+    """L'échéance de bout en bout d'une requête est dépassée"""
+
+    def __init__(self, message: str, stage: str = None):
+        super().__init__(message)
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(self, budget_seconds: float):
+        """
+        Échéance de bout en bout d'une requête (horloge monotone)
+
+        Args:
+            budget_seconds: Temps alloué à la requête à partir de maintenant
+        """
+        self.budget_seconds = budget_seconds
+        self.at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        """Temps restant en secondes (0 si dépassée)"""
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+    def check(self, stage: str):
+        """Lève RequestTimeoutError si l'échéance est dépassée"""
+        if self.expired():
+            raise RequestTimeoutError(f"Échéance dépassée (étape {stage})", stage)
+
+
+def deadline_at(deadline: Optional[Deadline]) -> Optional[float]:
+    """Échéance absolue (time.monotonic()) à transmettre à l'ordonnanceur"""
+    return deadline.at if deadline is not None else None
+
+
+def deadline_remaining(deadline: Optional[Deadline]) -> Optional[float]:
+    """Temps d'attente maximal (None si pas d'échéance)"""
+    return deadline.remaining() if deadline is not None else None
+
+
+def limits_from_config(config: Dict) -> List[Tuple[float, float]]:
+    """Convertit une configuration {'per_minute', 'per_day'} en quotas"""
+    limits = []
+    if config.get('per_minute'):
+        limits.append((config['per_minute'], 60))
+    if config.get('per_day'):
+        limits.append((config['per_day'], 86400))
+    return limits
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Lit l'en-tête Retry-After (en secondes) d'une réponse HTTP"""
+    value = headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, period_seconds: float):
+        """
+        Seau à jetons
+
+        Args:
+            capacity: Nombre d'appels autorisés par période
+            period_seconds: Durée de la période (60 pour un quota par minute...)
+        """
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Délai avant qu'un jeton soit disponible (0 si disponible)"""
+        self._refill(now)
+        token_wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(token_wait, self.paused_until - now, 0.0)
+
+    def consume(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float, now: float):
+        """Suspend les appels pendant seconds (après un refus du service)"""
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+class _Job:
+    """Appel en attente dans la file d'un service"""
+
+    def __init__(self, payload, merge_key, priority: int, deadline: float, sequence: int):
+        self.payload = payload
+        self.merge_key = merge_key
+        self.priority = priority
+        self.deadline = deadline
+        self.sequence = sequence
+        self.future = Future()
+        self.mergeable = True
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class _Upstream:
+    """File, quotas et workers d'un service externe"""
+
+    def __init__(self, name: str, handler: Callable, limits: Sequence[Tuple[float, float]],
+                 concurrency: int, max_batch: int, max_queue: int):
+        self.name = name
+        self.handler = handler
+        self.buckets = [TokenBucket(count, period) for count, period in limits]
+        self.concurrency = concurrency
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.queue = []
+        self.condition = threading.Condition()
+        self.completed = 0
+        self.merged = 0
+        self.rejected = 0
+        self.expired = 0
+        self.rate_limited = 0
+
+
+class UpstreamScheduler:
+    def __init__(self, default_timeout: float = 30):
+        """
+        Initialise l'ordonnanceur
+
+        Args:
+            default_timeout: Échéance par défaut d'un appel (secondes)
+        """
+        self.default_timeout = default_timeout
+        self._upstreams = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, handler: Callable,
+                 limits: Sequence[Tuple[float, float]] = (),
+                 concurrency: int = 1, max_batch: int = 1, max_queue: int = 50):
+        """
+        Déclare un service externe
+
+        Args:
+            name: Nom du service (ex: 'ors_isochrones')
+            handler: Fonction handler(merge_key, payloads, timeout) -> liste de
+                résultats (un par payload). Elle lève RateLimitedError sur un
+                refus de quota et UpstreamError sur les autres échecs.
+            limits: Quotas (nombre d'appels, période en secondes)
+            concurrency: Nombre d'appels simultanés vers le service
+            max_batch: Nombre maximal de payloads regroupés en un appel
+            max_queue: Taille maximale de la file d'attente
+        """
+        with self._lock:
+            if name in self._upstreams:
+                return
+            upstream = _Upstream(name, handler, limits, concurrency, max_batch, max_queue)
+            self._upstreams[name] = upstream
+        for index in range(concurrency):
+            worker = threading.Thread(
+                target=self._worker, args=(upstream,),
+                name=f'upstream-{name}-{index}', daemon=True
+            )
+            worker.start()
+
+    def call(self, name: str, payload: Any, merge_key: Hashable = None,
+             priority: Optional[int] = None, deadline: Optional[float] = None) -> Any:
+        """
+        Soumet un appel et attend son résultat
+
+        Args:
+            name: Nom du service
+            payload: Paramètres de l'appel transmis au handler
+            merge_key: Les appels en attente de même clé peuvent être regroupés
+            priority: Classe de priorité (par défaut celle du contexte)
+            deadline: Échéance absolue (time.monotonic())
+
+        Returns:
+            Résultat du handler pour ce payload
+
+        Raises:
+            UpstreamError: Quota, file pleine, échéance dépassée ou échec du service
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.default_timeout
+        future = self.submit(name, payload, merge_key, priority, deadline)
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()) + RESULT_GRACE_SECONDS)
+        except FutureTimeoutError:
+            raise DeadlineExceededError(f"Pas de réponse {name} avant l'échéance", name) from None
+
+    def submit(self, name: str, payload: Any, merge_key: Hashable = None,
+               priority: Optional[int] = None, deadline: Optional[float] = None) -> Future:
+        """Soumet un appel et retourne son Future (voir call)"""
+        upstream = self._upstreams[name]
+        if priority is None:
+            priority = current_priority()
+        if deadline is None:
+            deadline = time.monotonic() + self.default_timeout
+
+        job = _Job(payload, merge_key, priority, deadline, next(self._sequence))
+        with upstream.condition:
+            if len(upstream.queue) >= upstream.max_queue:
+                # Délester l'appel le moins prioritaire si le nouveau passe avant lui
+                victim = max(upstream.queue)
+                if not job < victim:
+                    upstream.rejected += 1
+                    raise QueueFullError(f"File {name} pleine", name, retry_after=self._retry_hint(upstream))
+                upstream.queue.remove(victim)
+                heapq.heapify(upstream.queue)
+                upstream.rejected += 1
+                victim.future.set_exception(
+                    QueueFullError(f"File {name} pleine (délestage)", name, retry_after=self._retry_hint(upstream))
+                )
+            heapq.heappush(upstream.queue, job)
+            upstream.condition.notify()
+        return job.future
+
+    def _retry_hint(self, upstream: _Upstream) -> float:
+        """Estimation du délai avant qu'une place se libère"""
+        now = time.monotonic()
+        wait = max([bucket.wait_time(now) for bucket in upstream.buckets] + [1.0])
+        return round(wait, 1)
+
+    def _worker(self, upstream: _Upstream):
+        """Boucle d'un worker: attend les jetons, prend l'appel le plus prioritaire, l'exécute"""
+        while True:
+            job = self._next_job(upstream)
+            batch = [job]
+            if job.mergeable and job.merge_key is not None and upstream.max_batch > 1:
+                batch += self._take_compatible(upstream, job)
+            self._run(upstream, batch)
+
+    def _next_job(self, upstream: _Upstream) -> _Job:
+        """
+        Attend les jetons de tous les quotas du service puis retire l'appel le
+        plus prioritaire de la file
+
+        Le jeton est pris avant de choisir l'appel: un appel interactif arrivé
+        pendant l'attente passe devant les appels batch déjà en file. Les
+        appels dont l'échéance tombe avant le prochain jeton échouent.
+        """
+        with upstream.condition:
+            while True:
+                while not upstream.queue:
+                    upstream.condition.wait()
+                now = time.monotonic()
+                wait = max([bucket.wait_time(now) for bucket in upstream.buckets] + [0.0])
+                self._expire(upstream, now, wait)
+                if not upstream.queue:
+                    continue
+                if wait == 0:
+                    for bucket in upstream.buckets:
+                        bucket.consume()
+                    return heapq.heappop(upstream.queue)
+                upstream.condition.wait(min(wait, 1.0))
+
+    def _expire(self, upstream: _Upstream, now: float, wait: float):
+        """Fait échouer les appels en file qui ne peuvent plus partir avant leur échéance (verrou tenu)"""
+        late = [job for job in upstream.queue if job.deadline <= now + wait]
+        if not late:
+            return
+        upstream.queue = [job for job in upstream.queue if job.deadline > now + wait]
+        heapq.heapify(upstream.queue)
+        upstream.expired += len(late)
+        for job in late:
+            if job.deadline <= now:
+                error = DeadlineExceededError(f"Échéance dépassée en file {upstream.name}", upstream.name)
+            else:
+                error = DeadlineExceededError(
+                    f"Quota {upstream.name} insuffisant avant l'échéance", upstream.name, retry_after=round(wait, 1)
+                )
+            job.future.set_exception(error)
+
+    def _take_compatible(self, upstream: _Upstream, job: _Job) -> List[_Job]:
+        """Retire de la file les appels regroupables avec job"""
+        now = time.monotonic()
+        with upstream.condition:
+            compatible = [
+                other for other in sorted(upstream.queue)
+                if other.mergeable and other.merge_key == job.merge_key and other.deadline > now
+            ][:upstream.max_batch - 1]
+            if compatible:
+                taken = set(map(id, compatible))
+                upstream.queue = [other for other in upstream.queue if id(other) not in taken]
+                heapq.heapify(upstream.queue)
+                upstream.merged += len(compatible)
+        return compatible
+
+    def _run(self, upstream: _Upstream, batch: List[_Job]):
+        """Exécute un appel (éventuellement regroupé) et distribue les résultats"""
+        timeout = max(0.1, min(job.deadline for job in batch) - time.monotonic())
+        try:
+            results = upstream.handler(batch[0].merge_key, [job.payload for job in batch], timeout)
+        except RateLimitedError as e:
+            # Refus de quota: suspendre le service et remettre les appels en file
+            retry_after = e.retry_after or 60
+            logger.warning(f"⚠️ Quota {upstream.name} atteint, pause de {retry_after:.1f}s")
+            with upstream.condition:
+                upstream.rate_limited += 1
+                now = time.monotonic()
+                for bucket in upstream.buckets:
+                    bucket.pause(retry_after, now)
+                for job in batch:
+                    heapq.heappush(upstream.queue, job)
+                upstream.condition.notify_all()
+            return
+        except UpstreamError as e:
+            if len(batch) > 1:
+                # Un appel regroupé peut échouer à cause d'un seul payload: rejouer séparément
+                with upstream.condition:
+                    for job in batch:
+                        job.mergeable = False
+                        heapq.heappush(upstream.queue, job)
+                    upstream.condition.notify_all()
+                return
+            e.upstream = e.upstream or upstream.name
+            batch[0].future.set_exception(e)
+            return
+        except Exception as e:
+            for job in batch:
+                job.future.set_exception(UpstreamError(str(e), upstream.name))
+            return
+
+        results = list(results or [])
+        with upstream.condition:
+            upstream.completed += min(len(results), len(batch))
+        for job, result in zip(batch, results):
+            job.future.set_result(result)
+        # Un handler qui renvoie moins de résultats que d'appels ne doit bloquer personne
+        for job in batch[len(results):]:
+            job.future.set_exception(UpstreamError(
+                f"Réponse {upstream.name} incomplète ({len(results)} résultats pour {len(batch)} appels)",
+                upstream.name
+            ))
+
+    def stats(self) -> Dict:
+        """État des files et quotas par service"""
+        now = time.monotonic()
+        stats = {}
+        for name, upstream in self._upstreams.items():
+            with upstream.condition:
+                stats[name] = {
+                    'queued': len(upstream.queue),
+                    'completed': upstream.completed,
+                    'merged': upstream.merged,
+                    'rejected': upstream.rejected,
+                    'expired': upstream.expired,
+                    'rate_limited': upstream.rate_limited,
+                    'tokens': [round(bucket.tokens, 1) for bucket in upstream.buckets],
+                    'paused_for': round(max([b.paused_until - now for b in upstream.buckets] + [0.0]), 1)
+                }
+        return stats